@@ -7,9 +7,16 @@ from starlette import status
 from starlette.responses import HTMLResponse
 
 from v1.config.config import CORS_ALLOWED_ORIGIN
+from v1.jobs.utils import job_scheduler
 from v1.routes import router
+from v1.shared.encoding import CompressionMiddleware, DecompressionMiddleware
+from v1.shared.profiling import ProfilingMiddleware
+from v1.shared.resilience import DeadlineMiddleware
+from v1.shared.routing import coordinator_pool
 from v1.shared.initialize import initialize_application
 from v1.shared.shared import logger
+from v1.shared.tenant_pool import tenant_pool
+from v1.stats.utils import graph_stats
 
 
 # from dotenv import load_dotenv
@@ -30,6 +37,10 @@ async def lifecycle(app: FastAPI):
 	logger.info("Entering lifecycle")
 
 	initialize_application()
+	tenant_pool.refill_in_background()
+	coordinator_pool.start_health_checks()
+	graph_stats.reconcile_in_background()
+	job_scheduler.sweep_in_background()
 
 	yield
 	logger.info("Application stopped.")
@@ -49,6 +60,10 @@ cors = CORSMiddleware(
 app.add_middleware(
 	middleware_class=CORSMiddleware, allow_origins=origins, allow_credentials=True,
 	allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(middleware_class=DecompressionMiddleware)
+app.add_middleware(middleware_class=CompressionMiddleware)
+app.add_middleware(middleware_class=DeadlineMiddleware)
+app.add_middleware(middleware_class=ProfilingMiddleware)
 
 
 @app.get("/")
@@ -0,0 +1,96 @@
+"""
+Local stand-in for an ArangoDB coordinator with injectable faults.
+
+Answers just enough of the HTTP API for python-arango clients: `/_api/version`, `/_api/cursor`
+and the availability endpoint probed by `CoordinatorPool.check`. Faults are switched through
+`mode` while the server runs:
+
+- "ok": answer right away,
+- "stall": answer after `stall` seconds,
+- "503": answer every request with 503 Service Unavailable,
+- "refuse": not listening anymore, connections are refused (see `stop`).
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Tuple
+
+VERSION = {"server": "arango", "version": "3.11.0", "license": "community"}
+
+
+class StandIn:
+	def __init__(self, mode: str = "ok", stall: float = 3.0):
+		self.mode = mode
+		self.stall = stall
+		self.hits: List[Tuple[str, str]] = []
+		self._lock = threading.Lock()
+		self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+		self._server.daemon_threads = True
+		self.port = self._server.server_address[1]
+		self._thread = threading.Thread(
+			target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+		self._thread.start()
+
+	@property
+	def url(self) -> str:
+		return f"http://127.0.0.1:{self.port}"
+
+	def count(self, path: str) -> int:
+		"""
+		:return: Number of requests received for paths starting with `path`.
+		"""
+		with self._lock:
+			return sum(1 for _, hit in self.hits if hit.startswith(path))
+
+	def stop(self) -> None:
+		"""
+		Close the listening socket, further connections to `url` are refused.
+		"""
+		if self.mode == "refuse":
+			return
+		self.mode = "refuse"
+		self._server.shutdown()
+		self._server.server_close()
+
+	def _handler(self):
+		standin = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def log_message(self, *args) -> None:
+				pass
+
+			def _answer(self) -> None:
+				with standin._lock:
+					standin.hits.append((self.command, self.path))
+				self.rfile.read(int(self.headers.get("content-length") or 0))
+				if standin.mode == "stall":
+					time.sleep(standin.stall)
+				if standin.mode == "503":
+					code, body = 503, {
+						"error"       : True, "code": 503, "errorNum": 503,
+						"errorMessage": "service unavailable"
+					}
+				elif "/_api/cursor" in self.path:
+					code, body = 201, {
+						"result": [standin.port], "hasMore": False, "cached": False,
+						"error" : False, "code": 201
+					}
+				elif "/_api/version" in self.path:
+					code, body = 200, VERSION
+				else:
+					code, body = 200, {"error": False, "code": 200, "mode": "default"}
+				payload = json.dumps(body).encode()
+				try:
+					self.send_response(code)
+					self.send_header("Content-Type", "application/json")
+					self.send_header("Content-Length", str(len(payload)))
+					self.end_headers()
+					self.wfile.write(payload)
+				except OSError:
+					# The client gave up, e.g. after its timeout.
+					pass
+
+			do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _answer
+
+		return Handler
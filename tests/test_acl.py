@@ -0,0 +1,52 @@
+from unittest import mock
+
+from v1.objects.nodes.models import BulkPatchItem, NodePatch
+from v1.objects.nodes.utils import bulk_patch_nodes, patch_node, upsert_node
+from v1.tenants.utils import RESTORE_DOCUMENTS_AQL, TenantRestorer
+
+PATCH = {"name": "renamed", "acl": []}
+
+
+def _db(*rows):
+	db = mock.Mock()
+	db.aql.execute.return_value = iter(rows)
+	return db
+
+
+def test_patch_of_a_user_bound_by_acls_drops_acl():
+	db = _db({"_rev": "1"})
+	patch_node(db, "Objects", "1", PATCH, None, ["Users/1"])
+	assert db.aql.execute.call_args.kwargs["bind_vars"]["patch"] == {"name": "renamed"}
+
+
+def test_patch_of_an_administrator_keeps_acl():
+	db = _db({"_rev": "1"})
+	patch_node(db, "Objects", "1", PATCH, None, None)
+	assert db.aql.execute.call_args.kwargs["bind_vars"]["patch"] == PATCH
+
+
+def test_upsert_of_a_user_bound_by_acls_drops_acl():
+	db = _db({"new": {"_rev": "1"}, "created": False})
+	upsert_node(db, "Objects", "1", PATCH, None, ["Users/1"])
+	assert db.aql.execute.call_args.kwargs["bind_vars"]["patch"] == {"name": "renamed"}
+
+
+def test_bulk_patch_of_a_user_bound_by_acls_drops_acl():
+	db = _db([{"key": "1", "rev": "2", "status": "updated"}])
+	bulk_patch_nodes(
+		db, [BulkPatchItem(collection="Objects", key="1", patch=NodePatch(**PATCH))], ["Users/1"])
+	items = db.aql.execute.call_args.kwargs["bind_vars"]["items"]
+	assert items[0]["patch"] == {"name": "renamed"}
+
+
+def test_restore_of_a_user_bound_by_acls_skips_hidden_documents():
+	db = _db({"created": 1, "updated": 0, "errors": 0, "skipped": 1})
+	db.collections.return_value = []
+	restorer = TenantRestorer(db, ["Users/1"])
+	try:
+		assert restorer._import("Objects", [{"_key": "1"}, {"_key": "2"}])["skipped"] == 1
+	finally:
+		restorer.abort()
+	assert db.aql.execute.call_args.args[0] == RESTORE_DOCUMENTS_AQL
+	assert db.aql.execute.call_args.kwargs["bind_vars"]["principals"] == ["Users/1"]
+	db.collection.return_value.import_bulk.assert_not_called()
@@ -0,0 +1,27 @@
+from v1.analytics.utils import RollupCache
+
+KEY = ("tenant", "Objects", "rw", None, "created", "day", None, ())
+
+
+def test_store_after_invalidation_is_dropped():
+	cache = RollupCache()
+	generation = cache.generation("tenant", "Objects")
+	cache.invalidate("tenant", "Objects")
+	cache.store(KEY, {0: []}, generation)
+	assert cache.lookup(KEY, [0]) == {}
+
+
+def test_tenant_invalidation_drops_stores_of_every_collection():
+	cache = RollupCache()
+	generation = cache.generation("tenant", "Objects")
+	cache.invalidate("tenant")
+	cache.store(KEY, {0: []}, generation)
+	assert cache.lookup(KEY, [0]) == {}
+
+
+def test_store_without_invalidation_is_kept():
+	cache = RollupCache()
+	generation = cache.generation("tenant", "Objects")
+	cache.invalidate("tenant", "Edges")
+	cache.store(KEY, {0: []}, generation)
+	assert cache.lookup(KEY, [0]) == {0: []}
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+
+from v1.shared.coalesce import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+	calls = []
+	release = threading.Event()
+
+	def fetch():
+		calls.append(1)
+		release.wait(1)
+		return "value"
+
+	async def main():
+		flight = SingleFlight(cache_ttl=0)
+		callers = [asyncio.create_task(flight.do("key", fetch)) for _ in range(3)]
+		await asyncio.sleep(0.05)
+		release.set()
+		return await asyncio.gather(*callers)
+
+	assert asyncio.run(main()) == ["value"] * 3
+	assert len(calls) == 1
+
+
+def test_cancelled_leader_does_not_fail_followers():
+	release = threading.Event()
+
+	def fetch():
+		release.wait(1)
+		return "value"
+
+	async def main():
+		flight = SingleFlight(cache_ttl=0)
+		leader = asyncio.create_task(flight.do("key", fetch))
+		await asyncio.sleep(0.05)
+		follower = asyncio.create_task(flight.do("key", fetch))
+		await asyncio.sleep(0.05)
+		leader.cancel()
+		await asyncio.sleep(0.05)
+		release.set()
+		return leader.cancelled(), await follower
+
+	assert asyncio.run(main()) == (True, "value")
+
+
+def test_failures_are_shared_and_not_cached():
+	attempts = []
+
+	def fetch():
+		attempts.append(1)
+		raise ValueError("down")
+
+	async def main():
+		flight = SingleFlight(cache_ttl=60)
+		results = await asyncio.gather(
+			flight.do("key", fetch), flight.do("key", fetch), return_exceptions=True)
+		assert all(isinstance(result, ValueError) for result in results)
+		await asyncio.gather(flight.do("key", fetch), return_exceptions=True)
+
+	asyncio.run(main())
+	assert len(attempts) == 2
@@ -0,0 +1,25 @@
+import msgpack
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+
+app = FastAPI(default_response_class=NegotiatedResponse)
+app.router.route_class = NegotiatedRoute
+
+
+@app.get("/value")
+async def value():
+	return {"value": 1}
+
+
+client = TestClient(app)
+
+
+def test_negotiated_responses_vary_on_accept():
+	json_response = client.get("/value")
+	packed_response = client.get("/value", headers={"Accept": "application/msgpack"})
+	assert json_response.json() == {"value": 1}
+	assert msgpack.unpackb(packed_response.content) == {"value": 1}
+	for response in (json_response, packed_response):
+		assert "accept" in [item.strip().lower() for item in response.headers["vary"].split(",")]
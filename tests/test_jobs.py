@@ -0,0 +1,43 @@
+import time
+from unittest import mock
+
+import pytest
+from fastapi import HTTPException
+
+from v1.jobs.utils import FAIL_ORPHANS_AQL, JOB_LEASE, JobScheduler
+
+
+def _scheduler(document):
+	scheduler = JobScheduler(workers=1)
+	scheduler._jobs_db = mock.Mock()
+	scheduler._jobs_db.collection.return_value.get.return_value = document
+	return scheduler
+
+
+def _job(**fields):
+	return {
+		"_key"    : "job", "database": "tenant", "kind": "dump", "status": "running",
+		"owner"   : "user", "created": time.time(), "heartbeat": time.time(), **fields,
+	}
+
+
+def test_jobs_of_other_tenants_are_not_found():
+	with pytest.raises(HTTPException) as error:
+		_scheduler(_job(database="other")).get("tenant", "job")
+	assert error.value.status_code == 404
+
+
+def test_job_with_stale_heartbeat_is_failed():
+	scheduler = _scheduler(_job(heartbeat=time.time() - JOB_LEASE - 1))
+	scheduler.get("tenant", "job")
+	query = scheduler._jobs_db.aql.execute.call_args
+	assert query.args[0] == FAIL_ORPHANS_AQL
+	assert query.kwargs["bind_vars"]["database"] == "tenant"
+
+
+def test_job_with_recent_heartbeat_is_left_alone():
+	scheduler = _scheduler(_job())
+	job = scheduler.get("tenant", "job")
+	scheduler._jobs_db.aql.execute.assert_not_called()
+	assert job["status"] == "running"
+	assert "heartbeat" not in job and "database" not in job
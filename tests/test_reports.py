@@ -0,0 +1,42 @@
+import asyncio
+from unittest import mock
+
+import pytest
+from arango.exceptions import AQLQueryValidateError
+from fastapi import HTTPException
+
+from v1.reports.models import FanOutQuery
+from v1.reports.utils import ensure_read_only, fan_out
+
+
+def _validate_error(code: int) -> AQLQueryValidateError:
+	error = AQLQueryValidateError(mock.Mock(), mock.Mock())
+	error.error_code = code
+	return error
+
+
+def test_parse_errors_are_invalid_queries():
+	db = mock.Mock()
+	db.aql.validate.side_effect = _validate_error(1501)
+	with pytest.raises(HTTPException) as error:
+		ensure_read_only(db, "FOR")
+	assert error.value.status_code == 422
+
+
+def test_other_errors_are_not_invalid_queries():
+	db = mock.Mock()
+	db.aql.validate.side_effect = _validate_error(1228)
+	with pytest.raises(AQLQueryValidateError):
+		ensure_read_only(db, "FOR doc IN Objects RETURN doc")
+
+
+def test_fan_out_filters_rows_by_principals():
+	db = mock.Mock()
+	db.aql.validate.return_value = {"ast": [{"type": "root", "subNodes": []}]}
+	db.aql.execute.return_value = iter([])
+	asyncio.run(fan_out(
+		lambda name: db, ["tenant"], FanOutQuery(query="FOR doc IN Objects RETURN doc"),
+		lambda connected: ["Users/1"]))
+	query = db.aql.execute.call_args.args[0]
+	assert query.startswith("FOR row IN (FOR doc IN Objects RETURN doc) FILTER")
+	assert db.aql.execute.call_args.kwargs["bind_vars"]["principals"] == ["Users/1"]
@@ -0,0 +1,201 @@
+import asyncio
+import time
+from unittest import mock
+
+import pytest
+from arango import ArangoClient
+
+from tests.standin import StandIn
+from v1.reports.models import FanOutQuery
+from v1.reports.utils import fan_out
+from v1.shared import resilience
+from v1.shared.resilience import CircuitBreakers, DatabaseUnavailable, Deadline, \
+	DeadlineExceeded, ResilientHTTPClient, RetryBudget, request_deadline
+from v1.shared.routing import CoordinatorPool, PoolHostResolver
+
+VERSION_PATH = "/_db/_system/_api/version"
+CURSOR_PATH = "/_db/_system/_api/cursor"
+
+
+@pytest.fixture
+def standins():
+	servers = [StandIn(stall=1.0), StandIn(stall=1.0)]
+	yield servers
+	for server in servers:
+		server.stop()
+
+
+@pytest.fixture
+def deadline():
+	def set_deadline(seconds: float) -> None:
+		tokens.append(request_deadline.set(Deadline(at=time.monotonic() + seconds)))
+
+	tokens = []
+	yield set_deadline
+	for token in reversed(tokens):
+		request_deadline.reset(token)
+
+
+def _db(servers, budget: RetryBudget | None = None, breakers: CircuitBreakers | None = None,
+		hedge_after_ms: float = 0):
+	pool = CoordinatorPool(
+		[server.url for server in servers], strategy="round_robin", eject_after=100,
+		check_interval=0)
+	client = ArangoClient(
+		hosts=pool.hosts, host_resolver=PoolHostResolver(pool), http_client=ResilientHTTPClient(
+			pool, budget=budget or RetryBudget(), breakers=breakers or CircuitBreakers(),
+			hedge_after_ms=hedge_after_ms, request_timeout=5))
+	return client.db("_system", username="root", password="")
+
+
+def _drained() -> RetryBudget:
+	budget = RetryBudget(ratio=0, minimum_per_second=0)
+	while budget.withdraw():
+		pass
+	return budget
+
+
+def test_stalled_read_fails_with_deadline(standins, deadline):
+	standins[0].mode = standins[1].mode = "stall"
+	deadline(0.3)
+	start = time.monotonic()
+	with pytest.raises(DeadlineExceeded):
+		_db(standins).version()
+	assert time.monotonic() - start < 0.9
+
+
+def test_read_answered_503_is_retried_on_another_coordinator(standins):
+	standins[0].mode = "503"
+	assert _db(standins).version() == "3.11.0"
+	assert standins[0].count(VERSION_PATH) == 1
+	assert standins[1].count(VERSION_PATH) == 1
+
+
+def test_write_answered_503_is_not_retried(standins):
+	standins[0].mode = "503"
+	with pytest.raises(DatabaseUnavailable):
+		_db(standins).aql.execute("INSERT {} INTO Objects")
+	assert standins[0].count(CURSOR_PATH) == 1
+	assert standins[1].count(CURSOR_PATH) == 0
+
+
+def test_read_only_query_answered_503_is_retried(standins):
+	standins[0].mode = "503"
+	assert list(_db(standins).aql.execute("FOR doc IN Objects RETURN doc")) == [standins[1].port]
+
+
+def test_refused_write_is_retried(standins):
+	standins[0].stop()
+	cursor = _db(standins).aql.execute("INSERT {} INTO Objects")
+	assert list(cursor) == [standins[1].port]
+
+
+def test_all_coordinators_refusing_fails_with_503(standins):
+	for server in standins:
+		server.stop()
+	with pytest.raises(DatabaseUnavailable):
+		_db(standins).version()
+
+
+def test_retry_budget_refills_by_ratio():
+	budget = _drained()
+	budget.ratio = 0.5
+	budget.deposit()
+	assert not budget.withdraw()
+	budget.deposit()
+	assert budget.withdraw()
+
+
+def test_exhausted_retry_budget_stops_retries(standins):
+	standins[0].mode = "503"
+	with pytest.raises(DatabaseUnavailable):
+		_db(standins, budget=_drained()).version()
+	assert standins[1].count(VERSION_PATH) == 0
+
+
+def test_breaker_opens_and_fails_fast(standins):
+	standins[0].mode = "503"
+	db = _db(standins[:1], budget=_drained(), breakers=CircuitBreakers(failures=2, reset=5))
+	for _ in range(2):
+		with pytest.raises(DatabaseUnavailable):
+			db.version()
+	with pytest.raises(DatabaseUnavailable) as error:
+		db.version()
+	assert standins[0].count(VERSION_PATH) == 2
+	assert int(error.value.headers["Retry-After"]) >= 1
+
+
+def test_half_open_breaker_closes_after_successful_probe(standins):
+	standins[0].mode = "503"
+	breakers = CircuitBreakers(failures=1, reset=0.2)
+	db = _db(standins[:1], budget=_drained(), breakers=breakers)
+	with pytest.raises(DatabaseUnavailable):
+		db.version()
+	time.sleep(0.25)
+	standins[0].mode = "ok"
+	assert db.version() == "3.11.0"
+	assert db.version() == "3.11.0"
+	assert standins[0].count(VERSION_PATH) == 3
+
+
+def test_half_open_breaker_reopens_after_failed_probe(standins):
+	standins[0].mode = "503"
+	db = _db(standins[:1], budget=_drained(), breakers=CircuitBreakers(failures=1, reset=0.2))
+	with pytest.raises(DatabaseUnavailable):
+		db.version()
+	time.sleep(0.25)
+	with pytest.raises(DatabaseUnavailable):
+		db.version()
+	with pytest.raises(DatabaseUnavailable):
+		db.version()
+	assert standins[0].count(VERSION_PATH) == 2
+
+
+def test_slow_read_is_hedged_to_another_coordinator(standins):
+	standins[0].mode = "stall"
+	start = time.monotonic()
+	assert _db(standins, hedge_after_ms=100).version() == "3.11.0"
+	assert time.monotonic() - start < 0.8
+	assert standins[0].count(VERSION_PATH) == 1
+	assert standins[1].count(VERSION_PATH) == 1
+
+
+def test_writes_are_not_hedged(standins):
+	standins[0].mode = "stall"
+	cursor = _db(standins, hedge_after_ms=100).aql.execute("INSERT {} INTO Objects")
+	assert list(cursor) == [standins[0].port]
+	assert standins[1].count(CURSOR_PATH) == 0
+
+
+def test_no_backoff_or_hedging_on_the_event_loop(standins):
+	standins[0].mode = "503"
+	db = _db(standins, hedge_after_ms=100)
+
+	async def on_loop():
+		return db.version()
+
+	with mock.patch.object(resilience.time, "sleep") as sleep:
+		assert asyncio.run(on_loop()) == "3.11.0"
+		sleep.assert_not_called()
+		assert db.version() == "3.11.0"
+		sleep.assert_called_once()
+
+
+def test_fan_out_reports_unavailable_databases():
+	def connect(name: str):
+		db = mock.Mock()
+		db.aql.validate.return_value = {"ast": [{"type": "root", "subNodes": []}]}
+		if name == "down":
+			db.aql.execute.side_effect = DatabaseUnavailable()
+		elif name == "slow":
+			db.aql.execute.side_effect = DeadlineExceeded()
+		else:
+			db.aql.execute.return_value = iter([{"value": 1}])
+		return db
+
+	result = asyncio.run(fan_out(
+		connect, ["down", "slow", "up"], FanOutQuery(query="FOR doc IN Objects RETURN doc")))
+	assert result.databases["down"].status == "unavailable"
+	assert result.databases["slow"].status == "timeout"
+	assert result.databases["up"].status == "ok"
+	assert result.rows == [{"value": 1, "_database": "up"}]
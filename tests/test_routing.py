@@ -0,0 +1,123 @@
+import pytest
+from arango import ArangoClient
+
+from tests.standin import StandIn
+from v1.shared.routing import CoordinatorPool, PoolHostResolver, RoutingHTTPClient
+
+
+@pytest.fixture
+def standins():
+	servers = [StandIn(), StandIn()]
+	yield servers
+	for server in servers:
+		server.stop()
+
+
+def _pool(hosts, strategy="round_robin", eject_after=2) -> CoordinatorPool:
+	return CoordinatorPool(hosts, strategy=strategy, eject_after=eject_after, check_interval=0)
+
+
+def _db(pool: CoordinatorPool):
+	client = ArangoClient(
+		hosts=pool.hosts, host_resolver=PoolHostResolver(pool),
+		http_client=RoutingHTTPClient(pool))
+	return client.db("_system", username="root", password="")
+
+
+def test_round_robin_cycles_through_coordinators():
+	pool = _pool(["http://a", "http://b", "http://c"])
+	assert [pool.pick() for _ in range(6)] == [0, 1, 2, 0, 1, 2]
+
+
+def test_round_robin_skips_excluded_coordinators():
+	pool = _pool(["http://a", "http://b", "http://c"])
+	assert {pool.pick(exclude={1}) for _ in range(4)} == {0, 2}
+
+
+def test_least_outstanding_prefers_idle_coordinator():
+	pool = _pool(["http://a", "http://b", "http://c"], strategy="least_outstanding")
+	pool.begin(0)
+	pool.begin(0)
+	pool.begin(1)
+	assert [pool.pick() for _ in range(3)] == [2, 2, 2]
+	pool.end(0, True)
+	pool.end(0, True)
+	# Ties are rotated instead of always picking the first coordinator.
+	assert {pool.pick() for _ in range(3)} == {0, 2}
+
+
+def test_ejects_after_consecutive_failures():
+	pool = _pool(["http://a", "http://b"])
+	for _ in range(2):
+		pool.begin(0)
+		pool.end(0, False)
+	assert not pool.coordinators[0].healthy
+	assert {pool.pick() for _ in range(4)} == {1}
+
+
+def test_success_resets_failure_count():
+	pool = _pool(["http://a", "http://b"])
+	pool.begin(0)
+	pool.end(0, False)
+	pool.begin(0)
+	pool.end(0, True)
+	pool.begin(0)
+	pool.end(0, False)
+	assert pool.coordinators[0].healthy
+
+
+def test_ejected_coordinators_are_used_when_none_is_left():
+	pool = _pool(["http://a", "http://b"], eject_after=1)
+	for index in (0, 1):
+		pool.begin(index)
+		pool.end(index, False)
+	assert {pool.pick() for _ in range(4)} == {0, 1}
+
+
+def test_health_check_readmits_answering_coordinator(standins):
+	pool = _pool([server.url for server in standins])
+	pool.coordinators[0].healthy = False
+	pool.coordinators[0].failures = 5
+	pool.check()
+	assert pool.coordinators[0].healthy
+	assert pool.coordinators[0].failures == 0
+	assert standins[0].count("/_admin/server/availability") == 1
+
+
+def test_health_check_ejects_unavailable_coordinator(standins):
+	standins[0].mode = "503"
+	standins[1].stop()
+	pool = _pool([server.url for server in standins])
+	pool.check()
+	pool.check()
+	assert not pool.coordinators[0].healthy
+	assert not pool.coordinators[1].healthy
+
+
+def test_fails_over_on_503(standins):
+	standins[0].mode = "503"
+	pool = _pool([server.url for server in standins])
+	assert _db(pool).version() == "3.11.0"
+	assert standins[0].count("/_db/_system/_api/version") == 1
+	assert standins[1].count("/_db/_system/_api/version") == 1
+	assert pool.coordinators[0].failures == 1
+	assert pool.coordinators[1].failures == 0
+	assert all(coordinator.outstanding == 0 for coordinator in pool.coordinators)
+
+
+def test_fails_over_on_refused_connection(standins):
+	standins[0].stop()
+	pool = _pool([server.url for server in standins])
+	assert _db(pool).version() == "3.11.0"
+	assert standins[1].count("/_db/_system/_api/version") == 1
+	assert pool.coordinators[0].failures == 1
+
+
+def test_refused_coordinator_is_ejected_and_avoided(standins):
+	standins[0].stop()
+	pool = _pool([server.url for server in standins])
+	db = _db(pool)
+	for _ in range(4):
+		assert db.version() == "3.11.0"
+	assert not pool.coordinators[0].healthy
+	assert standins[1].count("/_db/_system/_api/version") == 4
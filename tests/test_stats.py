@@ -0,0 +1,47 @@
+from collections import Counter
+from unittest import mock
+
+from v1.stats.utils import GraphStatistics, TenantStatistics
+
+
+def _statistics(vertices: int) -> TenantStatistics:
+	return TenantStatistics("tenant", Counter(Objects=vertices), Counter(), Counter())
+
+
+def test_changes_seen_by_the_scan_are_not_replayed():
+	statistics = _statistics(10)
+	statistics.begin_reconcile()
+	statistics.apply({"Objects": 1})
+	scanned = _statistics(11)
+	scanned.counted_at["Objects"] = statistics.journal_position()
+	statistics.apply({"Objects": 1})
+	statistics.finish_reconcile(scanned)
+	assert statistics.vertices["Objects"] == 12
+
+
+def test_degrees_are_replayed_from_their_edge_collection_scan():
+	statistics = _statistics(0)
+	statistics.begin_reconcile()
+	statistics.apply(degrees=[("LINKS", "Objects/1", 1)])
+	scanned = TenantStatistics("tenant", Counter(), Counter(), Counter({"Objects/1": 1}))
+	scanned.degrees_at["LINKS"] = statistics.journal_position()
+	statistics.apply(degrees=[("LINKS", "Objects/1", 1), ("OTHER", "Objects/1", 1)])
+	statistics.finish_reconcile(scanned)
+	assert statistics.degrees["Objects/1"] == 3
+
+
+def test_first_request_answers_a_placeholder_and_loads_in_the_background():
+	stats = GraphStatistics(reconcile_interval=0)
+	with mock.patch.object(stats, "reconcile_in_background") as start:
+		placeholder = stats.get("tenant")
+		start.assert_called_once()
+	assert not placeholder.loaded
+	db = mock.Mock()
+	db.name = "tenant"
+	db.collections.return_value = [{"name": "Objects", "system": False, "type": "document"}]
+	db.collection.return_value.count.return_value = 3
+	with mock.patch("v1.stats.utils.get_sys_client") as client:
+		client.return_value.db.return_value = db
+		stats.reconcile()
+	assert stats.get("tenant") is placeholder
+	assert placeholder.loaded and placeholder.snapshot()["vertices"] == {"Objects": 3}
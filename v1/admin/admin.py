@@ -0,0 +1,41 @@
+from typing import Annotated, Any, Dict, List
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+from starlette import status
+
+from v1.auth.utils import get_current_admin_user
+from v1.shared.profiling import RequestProfile, profile_store
+
+admin_router = APIRouter(
+	prefix="/admin", tags=["Administration"], dependencies=[Depends(get_current_admin_user)])
+
+
+def _get_profile(profile_id: str) -> RequestProfile:
+	profile = profile_store.get(profile_id)
+	if profile is None:
+		raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profile not found")
+	return profile
+
+
+@admin_router.get("/profiles", description="List captured request profiles, newest first")
+async def list_profiles() -> List[Dict[str, Any]]:
+	return [profile.summary() for profile in profile_store.list()]
+
+
+@admin_router.get(
+	"/profiles/{profile_id}", description="Fetch a captured profile with its ArangoDB timeline")
+async def get_profile(profile_id: str) -> Dict[str, Any]:
+	profile = _get_profile(profile_id)
+	return {
+		**profile.summary(), "arango_timeline": [vars(call) for call in profile.arango_calls],
+		"stacks": [{"stack": stack, "samples": count} for stack, count in
+				   profile.samples.most_common()]
+	}
+
+
+@admin_router.get(
+	"/profiles/{profile_id}/flamegraph", response_class=PlainTextResponse,
+	description="Fetch a captured profile as collapsed stacks for flamegraph.pl or speedscope")
+async def get_profile_flamegraph(profile_id: str) -> str:
+	return _get_profile(profile_id).collapsed()
@@ -0,0 +1,32 @@
+from typing import Annotated, List
+
+from arango.database import StandardDatabase
+from fastapi import APIRouter, Body, Depends
+from starlette.concurrency import run_in_threadpool
+
+from v1.analytics.models import AggregationQuery, AggregationResult
+from v1.analytics.utils import aggregate
+from v1.auth.utils import get_current_active_user, get_current_active_user_db
+from v1.models.models import User
+from v1.shared.acl import get_principals
+from v1.shared.catalog import require_collection
+from v1.shared.coalesce import permission_scope
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+
+analytics_router = APIRouter(
+	prefix="/analytics", tags=["Analytics"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
+
+
+@analytics_router.post(
+	"/aggregate", response_model=AggregationResult,
+	description="Aggregate events, activities and orders into minute, hour, day or week buckets "
+				"with count, sum, avg, min, max and percentile metrics, optionally grouped by an "
+				"attribute. Closed buckets are served from a rollup cache.")
+async def aggregate_buckets(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+							current_user: Annotated[User, Depends(get_current_active_user)],
+							principals: Annotated[List[str] | None, Depends(get_principals)],
+							query: Annotated[AggregationQuery, Body()]):
+	await require_collection(db, query.collection)
+	scope = await permission_scope(current_user.username, db.name, query.collection)
+	return await run_in_threadpool(aggregate, db, query, scope, principals)
@@ -0,0 +1,45 @@
+from datetime import datetime
+from typing import Any, Dict, List, Literal
+
+from pydantic import BaseModel, Field, model_validator
+
+Interval = Literal["minute", "hour", "day", "week"]
+
+
+class Metric(BaseModel):
+	op: Literal["count", "sum", "avg", "min", "max", "percentile"]
+	field: str | None = Field(None, description="Attribute path, not needed for `count`.")
+	percentile: float | None = Field(None, gt=0, le=100, description="Only for `percentile`.")
+
+	@model_validator(mode="after")
+	def check_arguments(self):
+		if self.op != "count" and self.field is None:
+			raise ValueError(f"Metric {self.op} requires a field")
+		if (self.op == "percentile") != (self.percentile is not None):
+			raise ValueError("percentile must be given for, and only for, the percentile metric")
+		return self
+
+
+class AggregationQuery(BaseModel):
+	collection: Literal["Events", "Activities", "SalesOrders", "PurchaseOrders", "WorkOrders"]
+	date_field: str = Field(
+		..., description="Attribute path of the timestamp, ISO 8601 strings or epoch millis.")
+	interval: Interval = "day"
+	start: datetime
+	end: datetime | None = Field(None, description="Defaults to now.")
+	group_by: str | None = Field(None, description="Attribute path to group buckets by.")
+	metrics: Dict[str, Metric] = Field(
+		default_factory=lambda: {"count": Metric(op="count")}, min_length=1)
+
+
+class TimeBucket(BaseModel):
+	start: datetime
+	group: Any = None
+	metrics: Dict[str, float | int | None]
+
+
+class AggregationResult(BaseModel):
+	interval: Interval
+	buckets: List[TimeBucket]
+	cached_buckets: int = Field(..., description="Closed buckets served from the rollup cache.")
+	computed_buckets: int
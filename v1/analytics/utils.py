@@ -0,0 +1,244 @@
+"""
+Time-bucketed aggregations computed with AQL `COLLECT`, and a cache of closed buckets.
+
+Buckets are aligned to UTC, weeks start on Monday. A bucket is closed once its end lies in the
+past; closed buckets are kept per series (tenant, permission, object-level grants, collection,
+date field, interval, grouping and metrics), so repeated dashboard queries only compute the
+buckets not seen before, typically the newest, still open one. Writes through the API invalidate
+the series of the written collection; writes bypassing the API are picked up after
+`ROLLUP_CACHE_TTL`.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Hashable, List, Tuple
+
+from arango.database import StandardDatabase
+from fastapi import HTTPException
+from starlette import status
+
+from v1.analytics.models import AggregationQuery, AggregationResult, Metric, TimeBucket
+from v1.config.config import ANALYTICS_MAX_BUCKETS, ROLLUP_CACHE_SERIES, ROLLUP_CACHE_TTL
+from v1.shared.acl import acl_filter
+
+ATTRIBUTE_PATH_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
+INTERVAL_MS = {"minute": 60_000, "hour": 3_600_000, "day": 86_400_000, "week": 604_800_000}
+# 1970-01-05, the first Monday after the epoch.
+WEEK_ORIGIN_MS = 345_600_000
+AGGREGATE_FUNCTIONS = {"sum": "SUM", "avg": "AVG", "min": "MIN", "max": "MAX"}
+
+
+def attribute_path(path: str) -> List[str]:
+	"""
+	:raise HTTPException: 422 if the path isn't a dotted sequence of attribute names.
+	:return: The path as used by array attribute bind parameters.
+	"""
+	if not ATTRIBUTE_PATH_PATTERN.match(path):
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+			detail=f"Invalid attribute path: {path}")
+	return path.split(".")
+
+
+def bucket_floor(timestamp_ms: int, interval: str) -> int:
+	size = INTERVAL_MS[interval]
+	origin = WEEK_ORIGIN_MS if interval == "week" else 0
+	return origin + (timestamp_ms - origin) // size * size
+
+
+def _to_ms(value: datetime) -> int:
+	if value.tzinfo is None:
+		value = value.replace(tzinfo=timezone.utc)
+	return int(value.timestamp() * 1000)
+
+
+def build_aggregation_query(query: AggregationQuery, start_ms: int, end_ms: int,
+							principals: List[str] | None = None) -> Tuple[str, Dict[str, Any]]:
+	"""
+	Build one AQL query computing all metrics per bucket (and group) within [start, end). Plain
+	aggregates use `COLLECT ... AGGREGATE`; percentiles need the bucket's values and switch the
+	query to `COLLECT ... INTO`.
+
+	:param principals: Principals of the caller, documents they can't see are skipped.
+	:return: The query and its bind variables. Rows have the form
+		`{bucket, group, metrics: [...]}` with metrics in the order of `query.metrics`.
+	"""
+	size = INTERVAL_MS[query.interval]
+	bind_vars: Dict[str, Any] = {
+		"@collection": query.collection, "date_field": attribute_path(query.date_field),
+		"start"      : start_ms, "end": end_ms, "size": size,
+		"origin"     : WEEK_ORIGIN_MS if query.interval == "week" else 0,
+		"principals" : principals,
+	}
+	keys = ["bucket = @origin + FLOOR((ts - @origin) / @size) * @size"]
+	if query.group_by is not None:
+		bind_vars["group_by"] = attribute_path(query.group_by)
+		keys.append("grp = doc.@group_by")
+	group = "grp" if query.group_by is not None else "null"
+
+	metrics: List[Metric] = list(query.metrics.values())
+	for i, metric in enumerate(metrics):
+		if metric.field is not None:
+			bind_vars[f"f{i}"] = attribute_path(metric.field)
+		if metric.percentile is not None:
+			bind_vars[f"p{i}"] = metric.percentile
+
+	if any(metric.op == "percentile" for metric in metrics):
+		values = ", ".join(
+			f"v{i}: doc.@f{i}" for i, metric in enumerate(metrics) if metric.field is not None)
+		collect = f"COLLECT {', '.join(keys)} INTO g = {{{values}}}"
+		expressions = []
+		for i, metric in enumerate(metrics):
+			if metric.op == "count":
+				expressions.append("LENGTH(g)")
+			elif metric.op == "percentile":
+				expressions.append(f'PERCENTILE(g[*].v{i}, @p{i}, "interpolation")')
+			else:
+				expressions.append(f"{AGGREGATE_FUNCTIONS[metric.op]}(g[*].v{i})")
+	else:
+		aggregates = []
+		for i, metric in enumerate(metrics):
+			if metric.op == "count":
+				aggregates.append(f"m{i} = LENGTH(1)")
+			else:
+				aggregates.append(f"m{i} = {AGGREGATE_FUNCTIONS[metric.op]}(doc.@f{i})")
+		collect = f"COLLECT {', '.join(keys)} AGGREGATE {', '.join(aggregates)}"
+		expressions = [f"m{i}" for i in range(len(metrics))]
+
+	aql = f"""
+	FOR doc IN @@collection
+		LET ts = DATE_TIMESTAMP(doc.@date_field)
+		FILTER ts != null AND ts >= @start AND ts < @end AND {acl_filter("doc")}
+		{collect}
+		RETURN {{bucket, group: {group}, metrics: [{", ".join(expressions)}]}}
+	"""
+	return aql, bind_vars
+
+
+@dataclass
+class _Series:
+	created: float = field(default_factory=time.monotonic)
+	buckets: Dict[int, List[Dict[str, Any]]] = field(default_factory=dict)
+
+
+class RollupCache:
+	"""
+	Least recently used series of closed buckets. Each series maps a bucket's start to its
+	rows, an empty list marks a closed bucket without data.
+
+	Invalidations bump a generation per tenant and per collection. A computation captures the
+	generation before querying and stores its buckets only if it is unchanged, so buckets
+	computed before a write can't be stored after the write invalidated them.
+	"""
+
+	def __init__(self, max_series: int = ROLLUP_CACHE_SERIES, ttl: float = ROLLUP_CACHE_TTL):
+		self.max_series = max_series
+		self.ttl = ttl
+		self._series: OrderedDict[Hashable, _Series] = OrderedDict()
+		self._generations: Dict[Tuple[str, str | None], int] = defaultdict(int)
+		self._lock = threading.Lock()
+
+	def generation(self, database: str, collection: str) -> Tuple[int, int]:
+		with self._lock:
+			return self._generation(database, collection)
+
+	def _generation(self, database: str, collection: str) -> Tuple[int, int]:
+		return self._generations[(database, None)], self._generations[(database, collection)]
+
+	def lookup(self, key: Hashable, starts: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+		with self._lock:
+			series = self._series.get(key)
+			if series is None:
+				return {}
+			if time.monotonic() - series.created > self.ttl:
+				del self._series[key]
+				return {}
+			self._series.move_to_end(key)
+			return {start: series.buckets[start] for start in starts if start in series.buckets}
+
+	def store(self, key: Hashable, buckets: Dict[int, List[Dict[str, Any]]],
+			  generation: Tuple[int, int] | None = None) -> None:
+		"""
+		:param generation: Generation of the key's collection the buckets were computed at, as
+			returned by `generation`. Nothing is stored if the collection was invalidated since.
+		"""
+		with self._lock:
+			if generation is not None and generation != self._generation(key[0], key[1]):
+				return
+			series = self._series.get(key)
+			if series is None:
+				series = self._series[key] = _Series()
+			series.buckets.update(buckets)
+			self._series.move_to_end(key)
+			while len(self._series) > self.max_series:
+				self._series.popitem(last=False)
+
+	def invalidate(self, database: str, collection: str | None = None) -> None:
+		"""
+		Drop the series of a tenant's collection, or of the whole tenant. Keys are expected to
+		start with the database and collection name.
+		"""
+		with self._lock:
+			self._generations[(database, collection)] += 1
+			for key in [key for key in self._series if key[0] == database and (
+					collection is None or key[1] == collection)]:
+				del self._series[key]
+
+
+rollup_cache = RollupCache()
+
+
+def aggregate(db: StandardDatabase, query: AggregationQuery, scope: str,
+			  principals: List[str] | None = None) -> AggregationResult:
+	"""
+	Compute the buckets of a query, serving closed buckets from the rollup cache. The bucket
+	range is widened to whole buckets, so the buckets containing `start` and `end` are complete.
+
+	:param scope: The caller's permission level, part of the cache key.
+	:param principals: The caller's object-level grants, part of the cache key.
+	"""
+	size = INTERVAL_MS[query.interval]
+	now_ms = int(time.time() * 1000)
+	start_ms = bucket_floor(_to_ms(query.start), query.interval)
+	end_ms = bucket_floor(_to_ms(query.end) - 1 if query.end else now_ms, query.interval) + size
+	starts = list(range(start_ms, end_ms, size))
+	if not starts:
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="end must be after start")
+	if len(starts) > ANALYTICS_MAX_BUCKETS:
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+			detail=f"Query spans {len(starts)} buckets, at most {ANALYTICS_MAX_BUCKETS} are "
+				   f"allowed. Choose a coarser interval or a shorter range.")
+
+	grants = None if principals is None else frozenset(principals)
+	key = (db.name, query.collection, scope, grants, query.date_field, query.interval,
+		   query.group_by, tuple((name, metric.op, metric.field, metric.percentile) for
+								 name, metric in query.metrics.items()))
+	cached = rollup_cache.lookup(key, starts)
+	missing = [start for start in starts if start not in cached]
+	computed: Dict[int, List[Dict[str, Any]]] = {}
+	if missing:
+		generation = rollup_cache.generation(db.name, query.collection)
+		aql, bind_vars = build_aggregation_query(query, missing[0], end_ms, principals)
+		computed = defaultdict(list)
+		for row in db.aql.execute(aql, bind_vars=bind_vars):
+			computed[int(row["bucket"])].append(row)
+		closed = {start: computed.get(start, []) for start in starts if
+				  start >= missing[0] and start + size <= now_ms}
+		rollup_cache.store(key, closed, generation)
+
+	names = list(query.metrics)
+	buckets = []
+	for start in starts:
+		rows = cached[start] if start in cached else computed.get(start, [])
+		for row in rows:
+			buckets.append(TimeBucket(
+				start=datetime.fromtimestamp(start / 1000, tz=timezone.utc), group=row["group"],
+				metrics=dict(zip(names, row["metrics"]))))
+	return AggregationResult(
+		interval=query.interval, buckets=buckets, cached_buckets=len(cached),
+		computed_buckets=len(starts) - len(cached))
@@ -32,19 +32,24 @@ API-Router:
 
 from typing import Annotated, Dict
 
+from arango.exceptions import ArangoServerError, UserCreateError
 from fastapi import APIRouter, Body, Depends, HTTPException, Response
 from fastapi import status
 from fastapi.security import OAuth2PasswordRequestForm
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 
 from v1.config.config import ARANGO_ROOT_PW, CORS_ALLOWED_ORIGIN, DOMAIN
 from v1.models.models import UserRegister
 from .utils import (authenticate_user, get_current_active_user)
-from ..shared.initialize import initialize_application
+from ..shared.initialize import provision_tenant
 from ..shared.shared import get_sys_client, logger
+from ..shared.tenant_pool import tenant_pool
 
 auth_router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+ERR_USER_DUPLICATE = 1702
+
 
 @auth_router.post("/login")
 async def login(response: Response, form_data: OAuth2PasswordRequestForm = Depends()):
@@ -108,29 +113,53 @@ async def register(user: Annotated[UserRegister, Body()]):
 	client = get_sys_client()
 	sys_db = client.db(username="root", password=ARANGO_ROOT_PW)
 	logger.info("Checking for existing Username")
-	if sys_db.has_user(user.username):
+	if await run_in_threadpool(sys_db.has_user, user.username):
 		raise HTTPException(
 			status_code=status.HTTP_409_CONFLICT, detail="Username is already taken")
-	logger.info("Creating new User")
-	sys_db.create_user(
-		user.username, user.password, extra=dict(
-			email=user.extra.email, full_name=user.extra.full_name,
-
-		))
-	logger.info("Checking if database already exists")
-	if sys_db.has_database(user.username):
-		logger.info("User tried signing up with already existing username")
+	logger.info("Claiming pre-provisioned Database")
+	database = await run_in_threadpool(tenant_pool.claim, user.username)
+	claimed = database is not None
+	if database is None:
+		logger.info("Checking if database already exists")
+		if await run_in_threadpool(sys_db.has_database, user.username):
+			logger.info("User tried signing up with already existing username")
+			raise HTTPException(
+				status_code=status.HTTP_409_CONFLICT, detail="Username already registered", )
+		logger.info("Tenant pool empty, initializing Database")
+		await run_in_threadpool(provision_tenant, user.username)
+		database = user.username
+	user_created = False
+	try:
+		logger.info("Creating new User")
+		await run_in_threadpool(
+			sys_db.create_user, user.username, user.password, extra=dict(
+				email=user.extra.email, full_name=user.extra.full_name, database=database,
+
+			))
+		user_created = True
+		logger.info("Adding User to Database")
+		await run_in_threadpool(sys_db.update_permission, user.username, "rw", database)
+	except ArangoServerError as error:
+		# Hand the spare back, or drop the database provisioned on demand, e.g. when a
+		# concurrent registration took the username first.
+		logger.error(f"Registering {user.username} failed: {error}")
+		if user_created:
+			await run_in_threadpool(sys_db.delete_user, user.username, ignore_missing=True)
+		if claimed:
+			await run_in_threadpool(tenant_pool.release, database, user.username)
+		else:
+			await run_in_threadpool(sys_db.delete_database, database, ignore_missing=True)
+		if isinstance(error, UserCreateError) and error.error_code == ERR_USER_DUPLICATE:
+			raise HTTPException(
+				status_code=status.HTTP_409_CONFLICT, detail="Username is already taken")
 		raise HTTPException(
-			status_code=status.HTTP_409_CONFLICT, detail="Username already registered", )
-	logger.info("Initializing Database")
-	initialize_application(user.username)
-	logger.info("Adding User to newly created Database")
-	sys_db.update_permission(user.username, "rw", user.username)
+			status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Registration failed")
+	tenant_pool.refill_in_background()
 	user_graph = "Maingraph"
 
 	logger.info("Connecting to User Database")
 	arango_db_conn = client.db(
-		name=f"{user.username}", username=user.username, password=user.password)
+		name=database, username=user.username, password=user.password)
 	logger.info("Connected to User's Database")
 
 	return {
@@ -2,7 +2,7 @@ from datetime import UTC, datetime, timedelta
 from typing import Annotated, Any, Optional
 
 import arango.exceptions
-from arango import ArangoClient, JWTAuthError, ServerConnectionError
+from arango import JWTAuthError, ServerConnectionError
 from arango.database import StandardDatabase
 from arango.job import AsyncJob, BatchJob
 from fastapi import Depends, HTTPException
@@ -11,13 +11,15 @@ from jose import jwt
 from jose.exceptions import JWTClaimsError
 from passlib.context import CryptContext
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 from starlette.requests import Request
 from starlette.responses import Response
 
-from v1.config.config import ALGORITHM, BASE_DB_URL, CORS_ALLOWED_ORIGIN, DOMAIN, JWTSECRET, \
-	SECRET_KEY
+from v1.config.config import ALGORITHM, CORS_ALLOWED_ORIGIN, DOMAIN, JWTSECRET, SECRET_KEY
 from v1.models.models import User
-from v1.shared.shared import get_sys_client, get_sys_db, logger, read_auth_cookie
+from v1.shared.resilience import DatabaseUnavailable
+from v1.shared.shared import get_sys_client, get_sys_db, is_administrator, logger, read_auth_cookie, \
+	tenant_database
 
 oauth2_scheme = OAuth2PasswordBearer(
 	tokenUrl="auth/login",
@@ -103,12 +105,13 @@ async def get_user(username: str, ) -> dict[str, Any] | AsyncJob[dict[str, Any]]
 	:return: User information if the user is found, otherwise None.
 	:rtype: UserInDB or None
 	"""
-	db = get_sys_db()
+	db = await run_in_threadpool(get_sys_db)
 
-	if not db.has_user(username):
+	if not await run_in_threadpool(db.has_user, username):
 		raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-	logger.info(db.user(username))
-	return db.user(username)
+	user = await run_in_threadpool(db.user, username)
+	logger.info(user)
+	return user
 
 
 async def authenticate_user(username: str, password: str) -> str:
@@ -124,7 +127,8 @@ async def authenticate_user(username: str, password: str) -> str:
 	"""
 	try:
 
-		user_db = get_sys_client().db(username=username, password=password, auth_method="jwt")
+		user_db = await run_in_threadpool(
+			get_sys_client().db, username=username, password=password, auth_method="jwt")
 
 	except JWTAuthError as error:
 		logger.debug(error.__str__())
@@ -184,10 +188,13 @@ async def get_current_user(request: Request) -> User:
 		raise HTTPException(
 			status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication credentials",
 			headers={"WWW-Authenticate": "Bearer"}, )
+	except HTTPException:
+		raise
 	except Exception as e:
 		logger.error(e)
 		raise HTTPException(
-			status_code=status.HTTP_401_UNAUTHORIZED, detail=e.__dict__)
+			status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication credentials",
+			headers={"WWW-Authenticate": "Bearer"}, )
 
 
 async def get_current_active_user(current_user: Annotated[User, Depends(get_current_user)] ):
@@ -197,18 +204,33 @@ async def get_current_active_user(current_user: Annotated[User, Depends(get_curr
 	return current_user
 
 
+async def get_current_admin_user(
+		current_user: Annotated[User, Depends(get_current_active_user)]) -> User:
+	"""
+	Dependency restricting an endpoint to superusers and the users listed in `ADMIN_USERS`.
+	"""
+	if not is_administrator(current_user):
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN, detail="Administrator privileges required")
+	return current_user
+
+
 async def get_current_active_user_db(request: Request,
 									 current_user: Annotated[
 										 User, Depends(get_current_user)]) -> StandardDatabase:
 	auth_token: str = await read_auth_cookie(request)
 	logger.info(f"Fetching User Database for {current_user.username}")
 	try:
-		client = ArangoClient(hosts=BASE_DB_URL)
+		client = get_sys_client()
 		logger.info("Connected to ArangoHost")
-		db: StandardDatabase = client.db(name=current_user.username, user_token=auth_token)
+		db: StandardDatabase = client.db(name=tenant_database(current_user), user_token=auth_token)
 		logger.info("Connected to User Database")
 		return db
 	except arango.ArangoClientError as error:
-		raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error)
+		logger.error(f"Unable to connect {current_user.username} to their database: {error}")
+		raise HTTPException(
+			status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+			detail="Unable to connect to the database") from error
 	except ServerConnectionError as error:
-		raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error)
+		logger.error(f"Unable to connect {current_user.username} to their database: {error}")
+		raise DatabaseUnavailable() from error
@@ -18,6 +18,8 @@ BASE_DB_URL: str = os.environ.get("BASE_DB_URL", DEV_BASE_DB_URL)
 #
 PROD_BASE_URL: str = os.environ.get("PROD_BASE_URL", "https://0.0.0.0:8080")
 PROD_BASE_DB_URL: str = os.environ.get("PROD_BASE_DB_URL", "http://circusdb:8529")
+# The DB URLs accept a comma separated list of cluster coordinators.
+BASE_DB_HOSTS = [host.strip() for host in BASE_DB_URL.split(",") if host.strip()]
 
 PYTHONPATH = "./"
 JWTSECRET = os.environ.get("JWTSECRET")
@@ -29,3 +31,91 @@ ACCESS_TOKEN_EXPIRE_MINUTES = os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES", "100
 ARANGO_ROOT_PW = os.environ.get("ARANGO_ROOT_PW", None)  # Should run into error
 CORS_ALLOWED_ORIGIN = os.environ.get("CORS_ALLOWED_ORIGIN", None)
 DOMAIN = BASE_URL.split('://')[-1]
+# Seconds a coalesced read result is kept after the in-flight call finished. 0 disables caching.
+COALESCE_CACHE_TTL: float = float(os.environ.get("COALESCE_CACHE_TTL", "0"))
+# Seconds a user's resolved database permission is reused for coalescing decisions.
+PERMISSION_CACHE_TTL: float = float(os.environ.get("PERMISSION_CACHE_TTL", "30"))
+# Response compression (gzip/zstd). Level is passed to both codecs, so keep it within 1-9.
+COMPRESSION_LEVEL: int = int(os.environ.get("COMPRESSION_LEVEL", "5"))
+COMPRESSION_MIN_SIZE: int = int(os.environ.get("COMPRESSION_MIN_SIZE", "1024"))
+# Upper bound for inflated request bodies, guards bulk ingest against decompression bombs.
+MAX_DECOMPRESSED_BODY: int = int(os.environ.get("MAX_DECOMPRESSED_BODY", str(256 * 1024 * 1024)))
+# Comma separated usernames with access to administrative endpoints such as profiling.
+ADMIN_USERS = [name.strip() for name in os.environ.get("ADMIN_USERS", "root").split(",") if
+			   name.strip()]
+# Sampling profiler. Requests slower than the threshold are captured automatically, 0 disables
+# the continuous mode. On-demand profiles are requested by admins with `X-Profile: 1`. The
+# continuous mode runs for every request and samples far less often than on-demand profiles.
+PROFILER_SAMPLE_INTERVAL_MS: float = float(os.environ.get("PROFILER_SAMPLE_INTERVAL_MS", "10"))
+PROFILER_CONTINUOUS_INTERVAL_MS: float = float(
+	os.environ.get("PROFILER_CONTINUOUS_INTERVAL_MS", "200"))
+SLOW_REQUEST_THRESHOLD_MS: float = float(os.environ.get("SLOW_REQUEST_THRESHOLD_MS", "0"))
+PROFILE_BUFFER_SIZE: int = int(os.environ.get("PROFILE_BUFFER_SIZE", "50"))
+# Upper bound of vertices per adjacency request and AQL cursor batch size for streamed results.
+ADJACENCY_MAX_VERTICES: int = int(os.environ.get("ADJACENCY_MAX_VERTICES", "5000"))
+AQL_BATCH_SIZE: int = int(os.environ.get("AQL_BATCH_SIZE", "1000"))
+# Number of documents written per AQL query by the bulk write endpoints.
+BULK_CHUNK_SIZE: int = int(os.environ.get("BULK_CHUNK_SIZE", "500"))
+# Cross-database reporting: concurrent databases, timeout per database and rows kept per database.
+FANOUT_MAX_PARALLEL: int = int(os.environ.get("FANOUT_MAX_PARALLEL", "32"))
+FANOUT_DB_TIMEOUT: float = float(os.environ.get("FANOUT_DB_TIMEOUT", "10"))
+FANOUT_MAX_ROWS_PER_DB: int = int(os.environ.get("FANOUT_MAX_ROWS_PER_DB", "10000"))
+# Search: maximum page size and number of query terms expanded into prefix/fuzzy clauses.
+SEARCH_MAX_LIMIT: int = int(os.environ.get("SEARCH_MAX_LIMIT", "100"))
+SEARCH_MAX_TERMS: int = int(os.environ.get("SEARCH_MAX_TERMS", "8"))
+# Number of fully provisioned spare tenant databases kept for registrations. 0 disables the pool.
+TENANT_POOL_SIZE: int = int(os.environ.get("TENANT_POOL_SIZE", "2"))
+# Tenant dump and restore: collections read and document chunks imported concurrently.
+DUMP_PARALLELISM: int = int(os.environ.get("DUMP_PARALLELISM", "4"))
+RESTORE_PARALLELISM: int = int(os.environ.get("RESTORE_PARALLELISM", "4"))
+# Largest single record of a restored dump after decompression, in bytes.
+RESTORE_MAX_RECORD: int = int(os.environ.get("RESTORE_MAX_RECORD", str(64 * 1024 * 1024)))
+# Largest dump uploaded to a restore job, in bytes as sent.
+RESTORE_MAX_UPLOAD: int = int(os.environ.get("RESTORE_MAX_UPLOAD", str(4 * 1024 * 1024 * 1024)))
+# Seconds a tenant's schema catalog is trusted before its version is checked again.
+CATALOG_CHECK_INTERVAL: float = float(os.environ.get("CATALOG_CHECK_INTERVAL", "5"))
+# Time-bucketed aggregations: upper bound of buckets per query, cached rollup series per
+# process and seconds after which cached closed buckets are recomputed.
+ANALYTICS_MAX_BUCKETS: int = int(os.environ.get("ANALYTICS_MAX_BUCKETS", "10000"))
+ROLLUP_CACHE_SERIES: int = int(os.environ.get("ROLLUP_CACHE_SERIES", "256"))
+ROLLUP_CACHE_TTL: float = float(os.environ.get("ROLLUP_CACHE_TTL", "3600"))
+# Background jobs: worker threads per process, where results are written and seconds results
+# (and the job records) are kept after a job finished.
+JOB_WORKERS: int = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_RESULT_DIR: str = os.environ.get("JOB_RESULT_DIR", "/tmp/cortex-jobs")
+JOB_RESULT_TTL: int = int(os.environ.get("JOB_RESULT_TTL", "86400"))
+# Coordinator routing: "round_robin" or "least_outstanding", seconds between active health
+# checks, consecutive failures ejecting a coordinator and whether read-only queries may be
+# answered by shard followers.
+DB_ROUTING_STRATEGY: Literal["round_robin", "least_outstanding"] = os.environ.get(
+	"DB_ROUTING_STRATEGY", "least_outstanding")
+DB_HEALTH_CHECK_INTERVAL: float = float(os.environ.get("DB_HEALTH_CHECK_INTERVAL", "5"))
+DB_EJECT_AFTER_FAILURES: int = int(os.environ.get("DB_EJECT_AFTER_FAILURES", "3"))
+DB_READ_FROM_FOLLOWERS: bool = os.environ.get(
+	"DB_READ_FROM_FOLLOWERS", "false").lower() in ("1", "true", "yes")
+# Graph statistics: seconds between reconciliations against ArangoDB, entities listed as top
+# connected and seconds the top list may lag behind incremental updates.
+STATS_RECONCILE_INTERVAL: float = float(os.environ.get("STATS_RECONCILE_INTERVAL", "600"))
+STATS_TOP_K: int = int(os.environ.get("STATS_TOP_K", "20"))
+STATS_TOP_REFRESH: float = float(os.environ.get("STATS_TOP_REFRESH", "5"))
+# Seconds a user's effective object-level grants are cached. Membership changes made through the
+# API invalidate them right away.
+ACL_CACHE_TTL: float = float(os.environ.get("ACL_CACHE_TTL", "300"))
+# Call policy for ArangoDB: default time budget of a request in milliseconds (clients may lower it
+# with X-Request-Timeout, 0 disables deadlines) and seconds a single call may take at most.
+REQUEST_DEADLINE_MS: float = float(os.environ.get("REQUEST_DEADLINE_MS", "30000"))
+DB_CALL_TIMEOUT: float = float(os.environ.get("DB_CALL_TIMEOUT", "60"))
+# Retries of idempotent reads: attempts per call, base delay of the jittered exponential backoff
+# in milliseconds, and the budget shared by the process, i.e. retries allowed per call made plus
+# retries per second that are always allowed.
+DB_RETRY_ATTEMPTS: int = int(os.environ.get("DB_RETRY_ATTEMPTS", "2"))
+DB_RETRY_BACKOFF_MS: float = float(os.environ.get("DB_RETRY_BACKOFF_MS", "50"))
+DB_RETRY_BUDGET_RATIO: float = float(os.environ.get("DB_RETRY_BUDGET_RATIO", "0.1"))
+DB_RETRY_MIN_PER_SECOND: float = float(os.environ.get("DB_RETRY_MIN_PER_SECOND", "1"))
+# Circuit breakers per coordinator and per tenant: consecutive failures opening a circuit and
+# seconds until a single probe call may close it again.
+DB_BREAKER_FAILURES: int = int(os.environ.get("DB_BREAKER_FAILURES", "5"))
+DB_BREAKER_RESET: float = float(os.environ.get("DB_BREAKER_RESET", "10"))
+# Milliseconds after which an idempotent read is sent to a second coordinator as well, 0
+# disables hedging.
+DB_HEDGE_AFTER_MS: float = float(os.environ.get("DB_HEDGE_AFTER_MS", "0"))
@@ -4,19 +4,30 @@ from arango.database import StandardDatabase
 from fastapi import APIRouter
 from fastapi.params import Depends
 
-from v1.auth.utils import get_current_active_user_db
+from v1.auth.utils import get_current_active_user, get_current_active_user_db
+from v1.models.models import User
+from v1.shared.catalog import schema_catalog
+from v1.shared.coalesce import permission_scope
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
 
-graphs_router = APIRouter(prefix="/graphs", tags=["Graphs"])
+graphs_router = APIRouter(
+	prefix="/graphs", tags=["Graphs"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
 
 
 @graphs_router.get("", description="Fetch all accessible graphs")
-async def get_graphs(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)]) -> List[
+async def get_graphs(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					 current_user: Annotated[User, Depends(get_current_active_user)]) -> List[
 	dict]:
-	return db.graphs()
+	await permission_scope(current_user.username, db.name)
+	catalog = await schema_catalog.get(db)
+	return list(catalog.graphs.values())
 
 
 @graphs_router.get("/{graph_id}", description="Fetch specified graphs properties.")
 async def get_graph(graph_id: str,
-					db: Annotated[StandardDatabase, Depends(get_current_active_user_db)]) -> dict:
-
-	return db.graph(graph_id).properties()
+					db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					current_user: Annotated[User, Depends(get_current_active_user)]) -> dict:
+	await permission_scope(current_user.username, db.name)
+	catalog = await schema_catalog.get(db)
+	return catalog.require_graph(graph_id)
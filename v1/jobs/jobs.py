@@ -0,0 +1,123 @@
+import os
+from typing import Annotated, List
+
+from fastapi import APIRouter, Body, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from nanoid import generate
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+
+from v1.auth.utils import get_current_active_user
+from v1.config.config import RESTORE_MAX_UPLOAD
+from v1.jobs.models import Job, JobSubmission
+from v1.jobs.utils import job_scheduler, result_path, upload_path
+from v1.models.models import User
+from v1.shared.acl import get_principals
+from v1.shared.coalesce import permission_scope
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+from v1.shared.resilience import lift_deadline
+from v1.shared.shared import tenant_database
+
+jobs_router = APIRouter(
+	prefix="/jobs", tags=["Jobs"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
+
+
+@jobs_router.post(
+	"", status_code=status.HTTP_202_ACCEPTED, response_model=Job,
+	description="Run a dump of your tenant or an export of one collection in the background. "
+				"Poll the returned job for its status. Documents hidden from you by their ACL are "
+				"left out.")
+async def submit_job(current_user: Annotated[User, Depends(get_current_active_user)],
+					 principals: Annotated[List[str] | None, Depends(get_principals)],
+					 submission: Annotated[JobSubmission, Body()]):
+	database = tenant_database(current_user)
+	# Jobs run as root, the caller's access is checked here instead.
+	collection = submission.params.get("collection") if submission.kind == "export" else None
+	await permission_scope(
+		current_user.username, database, collection if isinstance(collection, str) else None)
+	return await run_in_threadpool(
+		job_scheduler.submit, database, current_user.username, submission.kind,
+		submission.params, principals=principals)
+
+
+@jobs_router.post(
+	"/restore", status_code=status.HTTP_202_ACCEPTED, response_model=Job,
+	description="Upload a dump produced by /tenants/dump or a dump job and restore it into your "
+				"tenant in the background. Uploads larger than the configured maximum are "
+				"rejected with 413. Documents hidden from you by their ACL are skipped, replaced "
+				"documents keep their ACL.")
+async def submit_restore(current_user: Annotated[User, Depends(get_current_active_user)],
+						 principals: Annotated[List[str] | None, Depends(get_principals)],
+						 request: Request):
+	# Uploads take as long as the client needs, the deadline would cut them off.
+	lift_deadline()
+	database = tenant_database(current_user)
+	# Checked before accepting the upload, the job itself runs as root.
+	if await permission_scope(current_user.username, database) != "rw":
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN, detail="Restoring requires write access")
+	too_large = HTTPException(
+		status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+		detail=f"Dump exceeds {RESTORE_MAX_UPLOAD} bytes")
+	content_length = request.headers.get("content-length", "")
+	if content_length.isdigit() and int(content_length) > RESTORE_MAX_UPLOAD:
+		raise too_large
+	job_id = generate(size=16)
+	path = upload_path(database, job_id)
+	await run_in_threadpool(os.makedirs, os.path.dirname(path), exist_ok=True)
+	size = 0
+	file = await run_in_threadpool(open, path, "wb")
+	try:
+		async for chunk in request.stream():
+			size += len(chunk)
+			if size > RESTORE_MAX_UPLOAD:
+				raise too_large
+			await run_in_threadpool(file.write, chunk)
+	except BaseException:
+		file.close()
+		os.remove(path)
+		raise
+	file.close()
+	return await run_in_threadpool(
+		job_scheduler.submit, database, current_user.username, "restore", {"size": size}, job_id,
+		principals)
+
+
+@jobs_router.get("", response_model=List[Job], description="List the jobs of your tenant")
+async def list_jobs(current_user: Annotated[User, Depends(get_current_active_user)]):
+	return await run_in_threadpool(job_scheduler.list, tenant_database(current_user))
+
+
+@jobs_router.get("/{job_id}", response_model=Job, description="Poll a job's status and progress")
+async def get_job(job_id: str, current_user: Annotated[User, Depends(get_current_active_user)]):
+	return await run_in_threadpool(job_scheduler.get, tenant_database(current_user), job_id)
+
+
+@jobs_router.get(
+	"/{job_id}/result", response_class=FileResponse,
+	description="Download the result of a succeeded job")
+async def get_job_result(job_id: str,
+						 current_user: Annotated[User, Depends(get_current_active_user)]):
+	database = tenant_database(current_user)
+	job = await run_in_threadpool(job_scheduler.get, database, job_id)
+	if job["status"] != "succeeded" or job.get("result") is None:
+		raise HTTPException(
+			status_code=status.HTTP_409_CONFLICT,
+			detail=f"Job is {job['status']}, there is no result to download")
+	path = result_path(database, job_id)
+	if not os.path.exists(path):
+		raise HTTPException(status_code=status.HTTP_410_GONE, detail="Job result expired")
+	return FileResponse(
+		path, media_type=job["result"]["media_type"], filename=job["result"]["filename"])
+
+
+@jobs_router.delete(
+	"/{job_id}", response_model=Job | None,
+	description="Cancel a queued or running job. Finished jobs are deleted with their result.")
+async def cancel_job(job_id: str,
+					 current_user: Annotated[User, Depends(get_current_active_user)]):
+	job = await run_in_threadpool(job_scheduler.cancel, tenant_database(current_user), job_id)
+	if job is None:
+		return Response(status_code=status.HTTP_204_NO_CONTENT)
+	return job
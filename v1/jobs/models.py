@@ -0,0 +1,42 @@
+from typing import Any, Dict, Literal
+
+from pydantic import BaseModel, Field
+
+JobKind = Literal["dump", "export", "restore"]
+JobStatus = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+
+
+class JobSubmission(BaseModel):
+	kind: Literal["dump", "export"] = Field(
+		..., description="`dump` the whole tenant, or `export` one collection as NDJSON. "
+						 "Restores are submitted through /jobs/restore.")
+	params: Dict[str, Any] = Field(
+		default_factory=dict, description="`collection` for exports.")
+
+
+class JobProgress(BaseModel):
+	done: int = 0
+	total: int | None = None
+
+
+class JobResult(BaseModel):
+	media_type: str
+	filename: str
+	size: int
+
+
+class Job(BaseModel):
+	id: str
+	kind: JobKind
+	status: JobStatus
+	owner: str
+	params: Dict[str, Any] = Field(default_factory=dict)
+	progress: JobProgress = Field(default_factory=JobProgress)
+	created: float
+	started: float | None = None
+	finished: float | None = None
+	expires: float | None = Field(None, description="When the result and the job are removed.")
+	error: str | None = None
+	result: JobResult | None = None
+	summary: Dict[str, Any] | None = Field(
+		None, description="Outcome of jobs without a result file, e.g. restore counts.")
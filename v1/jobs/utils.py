@@ -0,0 +1,386 @@
+"""
+Background jobs for operations outliving an HTTP request, e.g. dumps, exports and restores.
+
+Jobs run on a bounded thread pool of `JOB_WORKERS` threads per API worker. Their state and
+progress live in the `Jobs` collection of the system database, keyed by job and tagged with the
+tenant's database, so any API worker can answer status polls and tenants never see the
+bookkeeping in their own database; a TTL index removes finished jobs once their `expires`
+timestamp passed. Results are written to files below `JOB_RESULT_DIR`, which has to be shared
+between API workers running on different hosts, and are swept after `JOB_RESULT_TTL` seconds.
+
+Every process renews a heartbeat on its queued and running jobs every `HEARTBEAT_INTERVAL`
+seconds. A queued or running job whose heartbeat is older than `JOB_LEASE` seconds lost its
+process, e.g. in a restart, and is marked failed when it's next looked at.
+
+Cancellation is cooperative: a cancel request is recorded on the job and picked up by the
+running job at its next progress report.
+
+Jobs run with the root account, the submitter's token may expire long before a queued job
+starts. The submitter's permission on the tenant is therefore checked when the job is
+submitted, see `v1.jobs.jobs`.
+"""
+import gzip
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+from arango.database import StandardDatabase
+from fastapi import HTTPException
+from nanoid import generate
+from starlette import status
+
+from v1.analytics.utils import rollup_cache
+from v1.config.config import AQL_BATCH_SIZE, ARANGO_ROOT_PW, JOB_RESULT_DIR, JOB_RESULT_TTL, \
+	JOB_WORKERS
+from v1.shared.acl import acl_filter, principal_cache
+from v1.shared.catalog import schema_catalog
+from v1.shared.shared import get_sys_client, logger
+from v1.stats.utils import graph_stats
+from v1.tenants.utils import TenantRestorer, iter_dump
+
+JOBS_COLLECTION = "Jobs"
+# Seconds between progress writes, which are also the points where cancellation is noticed.
+PROGRESS_INTERVAL = 1.0
+# Seconds between heartbeats of a process's jobs, and after which a job without one is orphaned.
+HEARTBEAT_INTERVAL = 10.0
+JOB_LEASE = 60.0
+SWEEP_INTERVAL = 300
+READ_CHUNK_SIZE = 1 << 20
+
+REPORT_PROGRESS_AQL = """
+UPDATE @key WITH {progress: @progress, heartbeat: @now} IN @@jobs
+RETURN NEW.cancel_requested == true"""
+
+HEARTBEAT_AQL = """
+FOR key IN @keys
+	UPDATE key WITH {heartbeat: @now} IN @@jobs OPTIONS {ignoreErrors: true}"""
+
+# Conditional on the heartbeat, so a job renewed in the meantime is left alone.
+FAIL_ORPHANS_AQL = """
+FOR job IN @@jobs
+	FILTER job.database == @database AND job.status IN ["queued", "running"]
+	FILTER job.heartbeat < @stale
+	UPDATE job WITH {status: "failed", error: "Job was interrupted", finished: @now,
+		expires: @expires} IN @@jobs"""
+
+
+class JobCancelled(Exception):
+	pass
+
+
+class JobContext:
+	"""
+	Handed to a running job for reporting progress and noticing cancellation.
+	"""
+
+	def __init__(self, db: StandardDatabase, jobs_db: StandardDatabase, job_id: str):
+		"""
+		:param db: The tenant database the job works on.
+		:param jobs_db: The database keeping the job's state.
+		"""
+		self.db = db
+		self.jobs_db = jobs_db
+		self.job_id = job_id
+		self.cancelled = threading.Event()
+		self._reported = 0.0
+
+	def progress(self, done: int, total: int | None = None) -> None:
+		"""
+		Record progress, at most every `PROGRESS_INTERVAL` seconds.
+
+		:raise JobCancelled: If the job was cancelled in the meantime.
+		"""
+		self.check()
+		now = time.monotonic()
+		if now - self._reported < PROGRESS_INTERVAL:
+			return
+		self._reported = now
+		cancel_requested = next(self.jobs_db.aql.execute(REPORT_PROGRESS_AQL, bind_vars={
+			"@jobs"   : JOBS_COLLECTION, "key": self.job_id, "now": time.time(),
+			"progress": {"done": done, "total": total}
+		}))
+		if cancel_requested:
+			self.cancelled.set()
+		self.check()
+
+	def check(self) -> None:
+		if self.cancelled.is_set():
+			raise JobCancelled()
+
+
+def run_dump(ctx: JobContext, job: Dict[str, Any], path: str) -> Dict[str, Any]:
+	written = 0
+	dump = iter_dump(ctx.db, job.get("principals"))
+	try:
+		with open(path, "wb") as file:
+			for chunk in dump:
+				file.write(chunk)
+				written += len(chunk)
+				ctx.progress(written)
+	finally:
+		dump.close()
+	return {"progress": {"done": written, "total": written}, "result": {
+		"media_type": "application/gzip", "filename": f"{ctx.db.name}.ndjson.gz", "size": written
+	}}
+
+
+def run_export(ctx: JobContext, job: Dict[str, Any], path: str) -> Dict[str, Any]:
+	name = job["params"].get("collection")
+	if not isinstance(name, str) or not ctx.db.has_collection(name):
+		raise ValueError(f"Collection {name} not found")
+	principals = job.get("principals")
+	# The collection's count includes documents hidden from the submitter.
+	total = ctx.db.collection(name).count() if principals is None else None
+	cursor = ctx.db.aql.execute(
+		f"FOR doc IN @@collection FILTER {acl_filter('doc')} RETURN doc",
+		bind_vars={"@collection": name, "principals": principals}, stream=True,
+		batch_size=AQL_BATCH_SIZE)
+	done = 0
+	with gzip.open(path, "wt") as file:
+		for document in cursor:
+			file.write(json.dumps(document, separators=(",", ":")) + "\n")
+			done += 1
+			if done % AQL_BATCH_SIZE == 0:
+				ctx.progress(done, total)
+	return {"progress": {"done": done, "total": total}, "result": {
+		"media_type": "application/gzip", "filename": f"{name}.ndjson.gz",
+		"size": os.path.getsize(path)
+	}}
+
+
+def run_restore(ctx: JobContext, job: Dict[str, Any], path: str) -> Dict[str, Any]:
+	upload = upload_path(ctx.db.name, ctx.job_id)
+	restorer = TenantRestorer(ctx.db, job.get("principals"))
+	try:
+		total = os.path.getsize(upload)
+		done = 0
+		with open(upload, "rb") as file:
+			while chunk := file.read(READ_CHUNK_SIZE):
+				restorer.feed(chunk)
+				done += len(chunk)
+				ctx.progress(done, total)
+		summary = restorer.finish()
+	except BaseException:
+		restorer.abort()
+		raise
+	finally:
+		schema_catalog.invalidate(ctx.db.name)
+		rollup_cache.invalidate(ctx.db.name)
+		graph_stats.invalidate(ctx.db.name)
+		principal_cache.invalidate(ctx.db.name)
+		os.remove(upload)
+	return {"progress": {"done": total, "total": total}, "summary": summary}
+
+
+RUNNERS: Dict[str, Callable[[JobContext, Dict[str, Any], str], Dict[str, Any]]] = {
+	"dump": run_dump, "export": run_export, "restore": run_restore,
+}
+
+
+def upload_path(database: str, job_id: str) -> str:
+	return os.path.join(JOB_RESULT_DIR, database, f"{job_id}.upload")
+
+
+def result_path(database: str, job_id: str) -> str:
+	return os.path.join(JOB_RESULT_DIR, database, f"{job_id}.result")
+
+
+def _public(document: Dict[str, Any]) -> Dict[str, Any]:
+	return {"id": document["_key"], **{
+		key: value for key, value in document.items() if
+		not key.startswith("_") and
+		key not in ("database", "heartbeat", "cancel_requested", "principals")}}
+
+
+class JobScheduler:
+	"""
+	Runs jobs on a bounded thread pool and keeps their state in the system database's `Jobs`
+	collection.
+	"""
+
+	def __init__(self, workers: int = JOB_WORKERS, ttl: int = JOB_RESULT_TTL):
+		self.ttl = ttl
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+		# Registered before the job document is inserted, so its heartbeat is renewed from the
+		# start; the future is None until the job is handed to the pool.
+		self._running: Dict[str, Tuple[Future | None, JobContext]] = {}
+		self._jobs_db: StandardDatabase | None = None
+		self._heartbeat: threading.Thread | None = None
+		self._lock = threading.Lock()
+
+	def _jobs(self) -> StandardDatabase:
+		if self._jobs_db is None:
+			db = get_sys_client().db("_system", username="root", password=ARANGO_ROOT_PW)
+			if not db.has_collection(JOBS_COLLECTION):
+				db.create_collection(JOBS_COLLECTION)
+			jobs = db.collection(JOBS_COLLECTION)
+			jobs.add_index({"type": "ttl", "fields": ["expires"], "expireAfter": 0})
+			jobs.add_index({"type": "persistent", "fields": ["database", "created"]})
+			self._jobs_db = db
+		return self._jobs_db
+
+	def _document(self, database: str, job_id: str) -> Dict[str, Any]:
+		"""
+		:raise HTTPException: 404 if the tenant has no such job (anymore).
+		"""
+		document = self._jobs().collection(JOBS_COLLECTION).get(job_id)
+		if document is None or document.get("database") != database:
+			raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+		return document
+
+	def submit(self, database: str, owner: str, kind: str, params: Dict[str, Any],
+			   job_id: str | None = None, principals: List[str] | None = None) -> Dict[str, Any]:
+		"""
+		Record a job as queued and hand it to the pool.
+
+		:param job_id: Id reserved by the caller, e.g. to store an upload beforehand.
+		:param principals: Grants of the submitter at submission time, dumps and exports leave
+			out documents hidden from them and restores don't write them. None includes every
+			document.
+		:return: The job's public representation.
+		"""
+		jobs_db = self._jobs()
+		db = get_sys_client().db(database, username="root", password=ARANGO_ROOT_PW)
+		now = time.time()
+		document = {
+			"_key"    : job_id or generate(size=16), "database": database, "kind": kind,
+			"status"  : "queued", "owner": owner, "params": params,
+			"progress": {"done": 0, "total": None}, "created": now, "heartbeat": now,
+			"principals": principals,
+		}
+		ctx = JobContext(db, jobs_db, document["_key"])
+		with self._lock:
+			self._running[document["_key"]] = (None, ctx)
+			if self._heartbeat is None:
+				self._heartbeat = threading.Thread(
+					target=self._renew_heartbeats, name="job-heartbeat", daemon=True)
+				self._heartbeat.start()
+		try:
+			jobs_db.collection(JOBS_COLLECTION).insert(document)
+		except BaseException:
+			with self._lock:
+				self._running.pop(document["_key"], None)
+			raise
+		with self._lock:
+			future = self._executor.submit(self._run, ctx, document)
+			self._running[document["_key"]] = (future, ctx)
+		logger.info(f"Queued {kind} job {document['_key']} in {database}")
+		return _public(document)
+
+	def _finish(self, ctx: JobContext, **fields: Any) -> None:
+		now = time.time()
+		ctx.jobs_db.collection(JOBS_COLLECTION).update(
+			{"_key": ctx.job_id, "finished": now, "expires": now + self.ttl, **fields})
+
+	def _renew_heartbeats(self) -> None:
+		while True:
+			time.sleep(HEARTBEAT_INTERVAL)
+			with self._lock:
+				keys = list(self._running)
+			if not keys:
+				continue
+			try:
+				self._jobs().aql.execute(HEARTBEAT_AQL, bind_vars={
+					"@jobs": JOBS_COLLECTION, "keys": keys, "now": time.time()})
+			except Exception as error:
+				logger.error(f"Renewing the heartbeat of {len(keys)} jobs failed: {error}")
+
+	def _fail_orphans(self, database: str) -> None:
+		now = time.time()
+		self._jobs().aql.execute(FAIL_ORPHANS_AQL, bind_vars={
+			"@jobs"  : JOBS_COLLECTION, "database": database, "stale": now - JOB_LEASE,
+			"now"    : now, "expires": now + self.ttl})
+
+	def _run(self, ctx: JobContext, document: Dict[str, Any]) -> None:
+		path = result_path(ctx.db.name, ctx.job_id)
+		succeeded = False
+		try:
+			jobs = ctx.jobs_db.collection(JOBS_COLLECTION)
+			if jobs.get(ctx.job_id).get("cancel_requested"):
+				ctx.cancelled.set()
+			ctx.check()
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			jobs.update(
+				{"_key": ctx.job_id, "status": "running", "started": time.time()})
+			outcome = RUNNERS[document["kind"]](ctx, document, path)
+			self._finish(ctx, status="succeeded", **outcome)
+			succeeded = True
+			logger.info(f"Job {ctx.job_id} in {ctx.db.name} succeeded")
+		except JobCancelled:
+			self._finish(ctx, status="cancelled")
+			logger.info(f"Job {ctx.job_id} in {ctx.db.name} was cancelled")
+		except Exception as error:
+			logger.error(f"Job {ctx.job_id} in {ctx.db.name} failed: {error}")
+			self._finish(ctx, status="failed", error=str(getattr(error, "detail", error))[:500])
+		finally:
+			with self._lock:
+				self._running.pop(ctx.job_id, None)
+			if not succeeded and os.path.exists(path):
+				os.remove(path)
+
+	def get(self, database: str, job_id: str) -> Dict[str, Any]:
+		"""
+		:raise HTTPException: 404 if the tenant has no such job (anymore).
+		"""
+		document = self._document(database, job_id)
+		if (document["status"] in ("queued", "running")
+				and document.get("heartbeat", 0) < time.time() - JOB_LEASE):
+			self._fail_orphans(database)
+			document = self._document(database, job_id)
+		return _public(document)
+
+	def list(self, database: str) -> List[Dict[str, Any]]:
+		self._fail_orphans(database)
+		cursor = self._jobs().aql.execute(
+			"FOR job IN @@jobs FILTER job.database == @database SORT job.created DESC RETURN job",
+			bind_vars={"@jobs": JOBS_COLLECTION, "database": database})
+		return [_public(document) for document in cursor]
+
+	def cancel(self, database: str, job_id: str) -> Dict[str, Any] | None:
+		"""
+		Cancel a queued or running job. Finished jobs are deleted together with their result.
+
+		:return: The cancelled job, None if a finished job was deleted.
+		"""
+		job = self.get(database, job_id)
+		jobs = self._jobs().collection(JOBS_COLLECTION)
+		if job["status"] not in ("queued", "running"):
+			jobs.delete(job_id, ignore_missing=True)
+			path = result_path(database, job_id)
+			if os.path.exists(path):
+				os.remove(path)
+			return None
+		jobs.update({"_key": job_id, "cancel_requested": True})
+		with self._lock:
+			running = self._running.get(job_id)
+		if running is not None:
+			running[1].cancelled.set()
+		return self.get(database, job_id)
+
+	def sweep(self) -> None:
+		"""
+		Remove result and upload files older than the retention time.
+		"""
+		deadline = time.time() - self.ttl
+		for directory, _, files in os.walk(JOB_RESULT_DIR):
+			for name in files:
+				path = os.path.join(directory, name)
+				try:
+					if os.path.getmtime(path) < deadline:
+						os.remove(path)
+				except OSError as error:
+					logger.debug(error)
+
+	def sweep_in_background(self) -> None:
+		def loop():
+			while True:
+				self.sweep()
+				time.sleep(SWEEP_INTERVAL)
+
+		threading.Thread(target=loop, name="job-result-sweeper", daemon=True).start()
+
+
+job_scheduler = JobScheduler()
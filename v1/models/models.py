@@ -22,6 +22,7 @@ class UserExtra(BaseModel):
 	address: Address | None = None
 	birthday: date | None = None
 	organisations: List[str] |None = Field(None)
+	database: str | None = Field(None, description="Tenant database bound to the user.")
 
 
 class User(BaseModel):
@@ -115,6 +116,9 @@ class BaseObject(BaseModel):
 	key: str = Field(generate(), description="Unique Key.", alias="_key")
 	name: str = Field(generate(), description="Unique Name. Defaults to random NANOID.")
 	collection: str = Field("Objects", description="Collection name")
+	acl: List[str] | None = Field(
+		None, description="Ids of the users, teams, departments or organizations granted access. "
+						  "Visible to everyone with access to the database, if unset.")
 
 
 class BaseEdge(BaseObject):
@@ -3,11 +3,19 @@ from typing import Annotated, Any, Dict, List
 from arango.database import StandardDatabase
 from fastapi import APIRouter, Depends
 from fastapi.requests import Request
+from starlette.concurrency import run_in_threadpool
 
-from v1.auth.utils import get_current_active_user_db
+from v1.auth.utils import get_current_active_user, get_current_active_user_db
+from v1.models.models import User
 from v1.objects.nodes.nodes import nodes_router
+from v1.shared.acl import acl_filter, get_principals
+from v1.shared.catalog import require_collection, schema_catalog
+from v1.shared.coalesce import permission_scope
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
 
-collections_router = APIRouter(prefix="/collections", tags=["Collections"])
+collections_router = APIRouter(
+	prefix="/collections", tags=["Collections"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
 
 collections_router.include_router(nodes_router)
 
@@ -15,14 +23,21 @@ collections_router.include_router(nodes_router)
 @collections_router.get(
 	"", description="Fetch all accessible collections from the database")
 async def get_metadata(request: Request,
-					   db: Annotated[StandardDatabase, Depends(get_current_active_user_db)]):
-
-	return db.collections()
+					   db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					   current_user: Annotated[User, Depends(get_current_active_user)]):
+	await permission_scope(current_user.username, db.name)
+	catalog = await schema_catalog.get(db)
+	return list(catalog.collections.values())
 
 
 @collections_router.get(
 	"/{collection_id}", description="Fetch all documents from a specific collection")
 async def fetch_all_docs(collection_id: str,
-						 db: Annotated[StandardDatabase, Depends(get_current_active_user_db)]) -> \
+						 db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+						 principals: Annotated[List[str] | None, Depends(get_principals)]) -> \
 		List[Dict[str, Any]]:
-	return [doc for doc in db.collection(collection_id).all()]
+	await require_collection(db, collection_id)
+	cursor = await run_in_threadpool(
+		db.aql.execute, f"FOR doc IN @@collection FILTER {acl_filter('doc')} RETURN doc",
+		bind_vars={"@collection": collection_id, "principals": principals})
+	return await run_in_threadpool(list, cursor)
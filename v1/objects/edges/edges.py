@@ -1,9 +1,59 @@
-from fastapi import APIRouter
+import json
+from typing import Annotated, List
 
-edges_router = APIRouter(prefix="/edges", tags=["Edges"])
+from arango.database import StandardDatabase
+from fastapi import APIRouter, Body, Depends
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from v1.auth.utils import get_current_active_user, get_current_active_user_db
+from v1.config.config import AQL_BATCH_SIZE, DB_READ_FROM_FOLLOWERS
+from v1.objects.edges.models import Adjacency, AdjacencyQuery
+from v1.models.models import User
+from v1.objects.edges.utils import build_adjacency_query, core_graph_edge_collections
+from v1.shared.acl import get_principals
+from v1.shared.catalog import schema_catalog
+from v1.shared.coalesce import permission_scope
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+
+edges_router = APIRouter(
+	prefix="/edges", tags=["Edges"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
 
 
 @edges_router.get(
 	'/', description='Fetch metadata about the Relationship collections accessible to you')
-async def get_edges():
-	pass
+async def get_edges(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					current_user: Annotated[User, Depends(get_current_active_user)]) -> List[dict]:
+	await permission_scope(current_user.username, db.name)
+	catalog = await schema_catalog.get(db)
+	return [collection for collection in catalog.collections.values() if
+			collection["name"] in core_graph_edge_collections]
+
+
+@edges_router.post(
+	"/adjacency", response_model=List[Adjacency], response_model_exclude_none=True,
+	description="Fetch incoming and/or outgoing edges of many vertices with one AQL query")
+async def get_adjacency(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+						principals: Annotated[List[str] | None, Depends(get_principals)],
+						query: Annotated[AdjacencyQuery, Body()]):
+	aql, bind_vars = build_adjacency_query(query, principals)
+	if not query.stream:
+		cursor = await run_in_threadpool(
+			db.aql.execute, aql, bind_vars=bind_vars, allow_dirty_read=DB_READ_FROM_FOLLOWERS)
+		return await run_in_threadpool(list, cursor)
+
+	cursor = await run_in_threadpool(
+		db.aql.execute, aql, bind_vars=bind_vars, stream=True, batch_size=AQL_BATCH_SIZE,
+		allow_dirty_read=DB_READ_FROM_FOLLOWERS)
+
+	def lines():
+		# Also runs when the client disconnects, so the server-side cursor doesn't linger until
+		# its TTL expires.
+		try:
+			for row in cursor:
+				yield json.dumps(row) + "\n"
+		finally:
+			cursor.close(ignore_missing=True)
+
+	return StreamingResponse(lines(), media_type="application/x-ndjson")
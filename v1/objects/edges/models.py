@@ -1,7 +1,8 @@
-from typing import List
+from typing import List, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from v1.config.config import ADJACENCY_MAX_VERTICES
 from v1.models.models import BaseEdge
 
 
@@ -13,3 +14,25 @@ class GraphEdgeData(BaseModel):
 class GraphEdge(BaseEdge):
 	name: str
 	data: List[GraphEdgeData]
+
+
+class AdjacencyQuery(BaseModel):
+	vertices: List[str] = Field(
+		..., min_length=1, max_length=ADJACENCY_MAX_VERTICES,
+		description="Vertex ids (`Collection/key`) to expand.")
+	direction: Literal["outbound", "inbound", "any"] = Field(
+		"any", description="`any` returns outgoing and incoming edges in separate lists.")
+	edge_collections: List[str] | None = Field(
+		None, description="Edge collections of the core graph to use. Defaults to all of them.")
+	types: List[str] | None = Field(
+		None, description="Only return edges whose `name` is one of these types.")
+	limit: int | None = Field(
+		None, ge=1, description="Maximum number of edges per vertex and direction.")
+	stream: bool = Field(
+		False, description="Stream the result as newline delimited JSON, one vertex per line.")
+
+
+class Adjacency(BaseModel):
+	vertex: str
+	outbound: List[dict] | None = None
+	inbound: List[dict] | None = None
@@ -1,2 +1,80 @@
+import re
+from typing import Any, Dict, List, Tuple
 
+from fastapi import HTTPException
+from starlette import status
 
+from v1.objects.edges.models import AdjacencyQuery
+from v1.shared.acl import acl_filter
+from v1.shared.initialize import CORE_GRAPH
+
+VERTEX_ID_PATTERN = re.compile(r"^[A-Za-z0-9_\-]+/[^/]+$")
+
+core_graph_edge_collections = [definition["edge_collection"] for definition in CORE_GRAPH]
+
+
+def incident_edge_collections(vertex_collections: List[str]) -> List[str]:
+	"""
+	:return: Edge collections of the core graph whose edges may start or end in any of the
+		given vertex collections.
+	"""
+	return [
+		definition["edge_collection"] for definition in CORE_GRAPH if
+		set(vertex_collections) & set(
+			definition["from_vertex_collections"] + definition["to_vertex_collections"])]
+
+
+def validate_vertex_ids(vertices: List[str]) -> None:
+	invalid = [vertex for vertex in vertices if not VERTEX_ID_PATTERN.match(vertex)]
+	if invalid:
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+			detail=f"Invalid vertex ids: {invalid[:10]}")
+
+
+def build_adjacency_query(query: AdjacencyQuery, principals: List[str] | None = None) -> \
+		Tuple[str, Dict[str, Any]]:
+	"""
+	Build a single AQL query expanding all requested vertices at once. Every direction is a
+	depth-1 traversal over the selected edge collections, which is answered from the edge index
+	on `_from`/`_to` without touching the vertex documents.
+
+	:param query: The adjacency request.
+	:type query: AdjacencyQuery
+	:param principals: Principals of the caller, edges they can't see are left out.
+	:type principals: List[str] | None
+	:return: The AQL query string and its bind variables.
+	:rtype: Tuple[str, Dict[str, Any]]
+	"""
+	validate_vertex_ids(query.vertices)
+	edge_collections = query.edge_collections or core_graph_edge_collections
+	unknown = set(edge_collections) - set(core_graph_edge_collections)
+	if unknown:
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+			detail=f"Unknown edge collections: {sorted(unknown)}")
+
+	bind_vars: Dict[str, Any] = {
+		"vertices": list(dict.fromkeys(query.vertices)), "principals": principals}
+	collection_binds = []
+	for index, collection in enumerate(dict.fromkeys(edge_collections)):
+		bind_vars[f"@edge{index}"] = collection
+		collection_binds.append(f"@@edge{index}")
+	filters = f"\n\t\t\tFILTER {acl_filter('e')}"
+	if query.types is not None:
+		bind_vars["types"] = query.types
+		filters += "\n\t\t\tFILTER e.name IN @types"
+	if query.limit is not None:
+		bind_vars["limit"] = query.limit
+		filters += "\n\t\t\tLIMIT @limit"
+
+	directions = ["outbound", "inbound"] if query.direction == "any" else [query.direction]
+	subqueries = "".join(
+		f"""
+	LET {direction} = (
+		FOR v, e IN 1..1 {direction.upper()} vertex {", ".join(collection_binds)}{filters}
+			RETURN e)""" for direction in directions)
+	returned = ", ".join(directions)
+	return f"""
+FOR vertex IN @vertices{subqueries}
+	RETURN {{vertex, {returned}}}""", bind_vars
@@ -1,6 +1,6 @@
-from typing import List
+from typing import Dict, List, Literal
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 
 from v1.models.models import BaseObject
 
@@ -15,3 +15,45 @@ class GraphNode(BaseObject):
 	name: str
 	group: str
 	data: List[GraphNodeData]
+
+
+class NodePatch(BaseModel):
+	"""
+	Partial node update. Top-level and nested object attributes are merged into the stored
+	document, entries of `data` are merged by their `key`.
+	"""
+	model_config = ConfigDict(extra="allow")
+	name: str | None = None
+	group: str | None = None
+	data: List[GraphNodeData] | None = None
+
+
+class BulkPatchItem(BaseModel):
+	collection: str
+	key: str
+	rev: str | None = Field(
+		None, description="Expected `_rev`, the item conflicts otherwise. A missing document "
+						  "fails this precondition even with `upsert`.")
+	upsert: bool = Field(False, description="Insert the document if it doesn't exist.")
+	patch: NodePatch
+
+
+class BulkPatchResult(BaseModel):
+	collection: str
+	key: str
+	status: Literal["created", "updated", "conflict", "not_found", "precondition_failed", "error"]
+	rev: str | None = None
+	error: str | None = None
+
+
+class BulkDelete(BaseModel):
+	ids: List[str] = Field(..., min_length=1, description="Vertex ids, i.e. `collection/key`.")
+	dry_run: bool = Field(False, description="Only report what would be removed.")
+
+
+class CascadeDeleteResult(BaseModel):
+	dry_run: bool
+	vertices: Dict[str, List[str]] = Field(
+		default_factory=dict, description="Removed vertex ids per collection.")
+	edges: Dict[str, List[str]] = Field(
+		default_factory=dict, description="Removed incident edge ids per edge collection.")
@@ -1,19 +1,178 @@
-from typing import Annotated
+from collections import Counter, defaultdict
+from typing import Annotated, List, Tuple
 
 from arango.database import StandardDatabase
-from fastapi import APIRouter, Body, Depends
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Response
+from starlette import status
+from starlette.concurrency import run_in_threadpool
 
+from v1.analytics.utils import rollup_cache
 from v1.auth.utils import get_current_active_user, get_current_active_user_db
 from v1.models.models import User
-from v1.objects.nodes.models import GraphNode
+from v1.objects.edges.utils import validate_vertex_ids
+from v1.objects.nodes.models import BulkDelete, BulkPatchItem, BulkPatchResult, \
+	CascadeDeleteResult, GraphNode, NodePatch
+from v1.objects.nodes.utils import bulk_patch_nodes, cascade_delete, parse_if_match, patch_node, \
+	upsert_node
+from v1.shared.acl import get_principals, principal_cache
+from v1.shared.catalog import require_collection
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+from v1.stats.utils import graph_stats
 
-nodes_router = APIRouter(prefix="/nodes", tags=["Nodes"])
+nodes_router = APIRouter(
+	prefix="/nodes", tags=["Nodes"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
 
 
 @nodes_router.post("/",status_code=201)
 async def post_node(db: Annotated[StandardDatabase,Depends(get_current_active_user_db)],
 					node: GraphNode):
-	return db.collection(node.collection).insert(node.dict())
+	try:
+		result = await run_in_threadpool(db.collection(node.collection).insert, node.dict())
+	finally:
+		# After the write, a rollup computed meanwhile from the old data must not survive it.
+		rollup_cache.invalidate(db.name, node.collection)
+		principal_cache.invalidate_for(db.name, [node.collection])
+	graph_stats.record(db.name, {node.collection: 1})
+	return result
+
+
+@nodes_router.post("/bulk", status_code=201,
+				   description="Insert many nodes at once. Accepts JSON, MessagePack or CBOR "
+							   "bodies, optionally gzip/zstd compressed.")
+async def post_nodes(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					 nodes: Annotated[List[GraphNode], Body()]):
+	by_collection = defaultdict(list)
+	for node in nodes:
+		by_collection[node.collection].append(node.dict())
+	try:
+		results = {
+			collection: await run_in_threadpool(db.collection(collection).import_bulk, docs)
+			for collection, docs in by_collection.items()
+		}
+	finally:
+		for collection in by_collection:
+			rollup_cache.invalidate(db.name, collection)
+		principal_cache.invalidate_for(db.name, by_collection)
+	graph_stats.record(
+		db.name, {collection: result.get("created", 0) for collection, result in results.items()})
+	return results
+
+
+@nodes_router.patch(
+	"/{collection}/{key}",
+	description="Merge a partial update into a node. Send the node's `_rev` as If-Match to only "
+				"update it if it wasn't modified in the meantime.")
+async def patch_node_endpoint(collection: str, key: str, response: Response,
+							  db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+							  principals: Annotated[List[str] | None, Depends(get_principals)],
+							  patch: Annotated[NodePatch, Body()],
+							  if_match: Annotated[str | None, Header()] = None):
+	await require_collection(db, collection)
+	try:
+		node = await run_in_threadpool(
+			patch_node, db, collection, key, patch.model_dump(exclude_unset=True),
+			parse_if_match(if_match), principals)
+	finally:
+		rollup_cache.invalidate(db.name, collection)
+		principal_cache.invalidate_for(db.name, [collection])
+	response.headers["ETag"] = f'"{node["_rev"]}"'
+	return node
+
+
+@nodes_router.put(
+	"/{collection}/{key}",
+	description="Merge a partial update into a node or create it, if it doesn't exist. With "
+				"If-Match, the node has to exist with that revision.")
+async def upsert_node_endpoint(collection: str, key: str, response: Response,
+							   db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+							   principals: Annotated[List[str] | None, Depends(get_principals)],
+							   patch: Annotated[NodePatch, Body()],
+							   if_match: Annotated[str | None, Header()] = None):
+	await require_collection(db, collection)
+	try:
+		node, created = await run_in_threadpool(
+			upsert_node, db, collection, key, patch.model_dump(exclude_unset=True),
+			parse_if_match(if_match), principals)
+	finally:
+		rollup_cache.invalidate(db.name, collection)
+		principal_cache.invalidate_for(db.name, [collection])
+	response.headers["ETag"] = f'"{node["_rev"]}"'
+	response.status_code = 201 if created else 200
+	if created:
+		graph_stats.record(db.name, {collection: 1})
+	return node
+
+
+@nodes_router.post(
+	"/bulk-patch", response_model=List[BulkPatchResult], response_model_exclude_none=True,
+	description="Patch or upsert many nodes across collections. Revision conflicts are "
+				"reported per item.")
+async def bulk_patch(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					 principals: Annotated[List[str] | None, Depends(get_principals)],
+					 items: Annotated[List[BulkPatchItem], Body()]):
+	collections = {item.collection for item in items}
+	try:
+		results = await run_in_threadpool(bulk_patch_nodes, db, items, principals)
+	finally:
+		for collection in collections:
+			rollup_cache.invalidate(db.name, collection)
+		principal_cache.invalidate_for(db.name, collections)
+	graph_stats.record(db.name, Counter(
+		result.collection for result in results if result.status == "created"))
+	return results
+
+
+def _record_removal(database: str, result: CascadeDeleteResult,
+					removed_edges: List[Tuple[str, str, str]]) -> None:
+	principal_cache.invalidate_for(database, {edge[0] for edge in removed_edges})
+	graph_stats.record(
+		database, {collection: -len(ids) for collection, ids in result.vertices.items()},
+		removed_edges, edge_change=-1)
+
+
+@nodes_router.post(
+	"/bulk-delete", response_model=CascadeDeleteResult,
+	description="Remove many vertices together with all their edges in the core graph. Each "
+				"batch is removed in one transaction.")
+async def bulk_delete(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					  principals: Annotated[List[str] | None, Depends(get_principals)],
+					  request: Annotated[BulkDelete, Body()]):
+	validate_vertex_ids(request.ids)
+	collections = {vertex.split("/", 1)[0] for vertex in request.ids}
+	for collection in collections:
+		await require_collection(db, collection)
+	try:
+		result, removed_edges = await run_in_threadpool(
+			cascade_delete, db, request.ids, request.dry_run, principals)
+	finally:
+		if not request.dry_run:
+			for collection in collections:
+				rollup_cache.invalidate(db.name, collection)
+	if not request.dry_run:
+		_record_removal(db.name, result, removed_edges)
+	return result
+
+
+@nodes_router.delete(
+	"/{collection}/{key}", response_model=CascadeDeleteResult,
+	description="Remove a vertex together with all its edges in the core graph.")
+async def delete_node(collection: str, key: str,
+					  db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					  principals: Annotated[List[str] | None, Depends(get_principals)],
+					  dry_run: Annotated[bool, Query()] = False):
+	await require_collection(db, collection)
+	try:
+		result, removed_edges = await run_in_threadpool(
+			cascade_delete, db, [f"{collection}/{key}"], dry_run, principals)
+	finally:
+		if not dry_run:
+			rollup_cache.invalidate(db.name, collection)
+	if not result.vertices:
+		raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+	if not dry_run:
+		_record_removal(db.name, result, removed_edges)
+	return result
 
 
 @nodes_router.get("/{node_key}",response_model=GraphNode)
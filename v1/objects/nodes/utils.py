@@ -1,13 +1,350 @@
-from typing import Annotated, List
+from collections import defaultdict
+from typing import Annotated, Any, Dict, List, NoReturn, Tuple
 
 from arango.database import StandardDatabase
+from arango.exceptions import ArangoServerError
+from fastapi import HTTPException
 from fastapi.params import Depends
+from starlette import status
+from starlette.concurrency import run_in_threadpool
 
 from v1.auth.utils import get_current_active_user
+from v1.config.config import BULK_CHUNK_SIZE
 from v1.models.models import User
-from v1.shared.shared import get_sys_db
+from v1.objects.edges.utils import core_graph_edge_collections, incident_edge_collections, \
+	validate_vertex_ids
+from v1.objects.nodes.models import BulkPatchItem, BulkPatchResult, CascadeDeleteResult
+from v1.shared.acl import acl_filter, strip_grants
+from v1.shared.shared import get_available_databases, get_sys_db, is_administrator, logger
 
 
-async def get_user_accessible_dbs(current_user: Annotated[User, Depends(get_current_active_user)]):
-	db: StandardDatabase = get_sys_db()
-	# TODO: Implement later
+async def get_user_accessible_dbs(
+		current_user: Annotated[User, Depends(get_current_active_user)]) -> List[str]:
+	"""
+	Dependency returning the names of all databases the current user can read. Administrators
+	can read every database.
+	"""
+	if is_administrator(current_user):
+		db: StandardDatabase = get_sys_db()
+		databases = await run_in_threadpool(db.databases)
+		return [name for name in databases if name != "_system"]
+	return list(await run_in_threadpool(get_available_databases, current_user.username))
+
+
+def merge_data_aql(patch: str, current: str) -> str:
+	"""
+	AQL computing `changes`, the patch to apply to the stored document. Entries of `data` are
+	merged by their `key`: existing entries are updated in place, new ones are appended.
+
+	:param patch: AQL expression of the patch.
+	:param current: AQL expression of the stored document, may evaluate to null.
+	"""
+	return f"""
+	LET incoming = {patch}.data || []
+	LET stored = {current}.data || []
+	LET merged = APPEND(
+		(FOR entry IN stored
+			LET update = FIRST(FOR i IN incoming FILTER i.key == entry.key RETURN i)
+			RETURN update == null ? entry : MERGE(entry, update)),
+		(FOR i IN incoming FILTER i.key NOT IN stored[*].key RETURN i))
+	LET changes = MERGE(
+		UNSET({patch}, "_key", "_id", "_rev"), HAS({patch}, "data") ? {{data: merged}} : {{}})"""
+
+
+def patch_node_aql(check_rev: bool) -> str:
+	selector = "{_key: @key, _rev: @rev}" if check_rev else "{_key: @key}"
+	return f"""
+LET current = DOCUMENT(@@collection, @key)
+FILTER {acl_filter("current")}{merge_data_aql("@patch", "current")}
+UPDATE {selector} WITH changes IN @@collection
+OPTIONS {{ignoreRevs: {str(not check_rev).lower()}, mergeObjects: true}}
+RETURN NEW"""
+
+
+def upsert_node_aql(check_rev: bool) -> str:
+	changes = "MERGE(changes, {_rev: @rev})" if check_rev else "changes"
+	return f"""
+LET current = DOCUMENT(@@collection, @key)
+FILTER (@rev == null OR current != null) AND {acl_filter("current")}{merge_data_aql(
+	"@patch", "current")}
+UPSERT {{_key: @key}}
+INSERT MERGE(@patch, {{_key: @key}})
+UPDATE {changes} IN @@collection
+OPTIONS {{ignoreRevs: {str(not check_rev).lower()}, mergeObjects: true}}
+RETURN {{new: NEW, created: OLD == null}}"""
+
+
+# Items are read before any of them is written. Items failing their precondition are reported
+# instead of written; the `_rev` of the read is enforced on write, so a concurrent change
+# between read and write aborts the chunk, which `_patch_chunk` then retries. Documents hidden
+# from the caller are reported as not found and never written, not even by an upsert. Like a
+# single PUT with If-Match, an upsert expecting a revision of a missing document fails its
+# precondition instead of inserting.
+BULK_PATCH_AQL = f"""
+LET items = (
+	FOR item IN @items
+		LET current = DOCUMENT(@@collection, item.key)
+		LET hidden = !{acl_filter("current")}
+		RETURN MERGE(item, {{current: hidden ? null : current, hidden}}))
+LET written = (
+	FOR item IN items
+		FILTER !item.hidden
+		FILTER item.current != null ? (item.rev == null OR item.current._rev == item.rev) : (item.upsert AND item.rev == null){merge_data_aql("item.patch", "item.current")}
+		UPSERT {{_key: item.key}}
+		INSERT MERGE(item.patch, {{_key: item.key}})
+		UPDATE MERGE(changes, {{_rev: item.current._rev}}) IN @@collection
+		OPTIONS {{ignoreRevs: false, mergeObjects: true}}
+		RETURN {{key: item.key, rev: NEW._rev, status: OLD == null ? "created" : "updated"}})
+LET skipped = (
+	FOR item IN items
+		FILTER item.key NOT IN written[*].key
+		RETURN {{key: item.key, rev: item.current._rev,
+				status: item.current != null ? "conflict" :
+					(item.upsert AND item.rev != null AND !item.hidden ? "precondition_failed" :
+					 "not_found")}})
+RETURN APPEND(written, skipped)"""
+
+ERR_CONFLICT = 1200
+ERR_DOCUMENT_NOT_FOUND = 1202
+ERR_COLLECTION_NOT_FOUND = 1203
+
+
+def parse_if_match(if_match: str | None) -> str | None:
+	"""
+	:param if_match: Value of the If-Match header, i.e. a quoted `_rev` or `*`.
+	:return: The expected revision or None, if any revision is acceptable.
+	"""
+	if if_match is None or if_match.strip() == "*":
+		return None
+	return if_match.strip().removeprefix("W/").strip('"')
+
+
+def raise_for_write_error(error: ArangoServerError) -> NoReturn:
+	"""
+	Translate ArangoDB write errors into HTTP errors.
+	"""
+	if error.error_code == ERR_CONFLICT:
+		raise HTTPException(
+			status_code=status.HTTP_412_PRECONDITION_FAILED,
+			detail="Document was modified concurrently, revision does not match")
+	if error.error_code in (ERR_DOCUMENT_NOT_FOUND, ERR_COLLECTION_NOT_FOUND):
+		raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+	raise error
+
+
+def patch_node(db: StandardDatabase, collection: str, key: str, patch: Dict[str, Any],
+			   rev: str | None, principals: List[str] | None = None) -> Dict[str, Any]:
+	"""
+	Merge `patch` into a document with one round trip.
+
+	:param principals: Principals of the caller, documents they can't see aren't written and
+		`acl` isn't changed, see `strip_grants`.
+	:raise HTTPException: 404 if the document doesn't exist or is hidden from the caller, 412 if
+		`rev` doesn't match.
+	:return: The updated document.
+	"""
+	query = patch_node_aql(check_rev=rev is not None)
+	bind_vars = {
+		"@collection": collection, "key": key, "patch": strip_grants(patch, principals),
+		"principals" : principals}
+	if rev is not None:
+		bind_vars["rev"] = rev
+	try:
+		result = list(db.aql.execute(query, bind_vars=bind_vars))
+	except ArangoServerError as error:
+		raise_for_write_error(error)
+	if not result:
+		raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+	return result[0]
+
+
+def upsert_node(db: StandardDatabase, collection: str, key: str, patch: Dict[str, Any],
+				rev: str | None, principals: List[str] | None = None) -> \
+		Tuple[Dict[str, Any], bool]:
+	"""
+	Merge `patch` into a document, creating it if it doesn't exist, with one round trip. With
+	`rev` given, the document must exist with that revision.
+
+	:param principals: Principals of the caller, documents they can't see aren't written and
+		`acl` isn't changed, see `strip_grants`.
+	:raise HTTPException: 412 if `rev` doesn't match, 404 if the document is hidden from the
+		caller.
+	:return: The written document and whether it was created.
+	"""
+	query = upsert_node_aql(check_rev=rev is not None)
+	bind_vars = {
+		"@collection": collection, "key": key, "patch": strip_grants(patch, principals),
+		"rev"        : rev, "principals": principals}
+	try:
+		result = list(db.aql.execute(query, bind_vars=bind_vars))
+	except ArangoServerError as error:
+		raise_for_write_error(error)
+	if not result and rev is None:
+		raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+	if not result:
+		raise HTTPException(
+			status_code=status.HTTP_412_PRECONDITION_FAILED, detail="Document does not exist")
+	return result[0]["new"], result[0]["created"]
+
+
+def _patch_chunk(db: StandardDatabase, collection: str, chunk: List[BulkPatchItem],
+				 principals: List[str] | None) -> List[BulkPatchResult]:
+	"""
+	Write one chunk with one query. A concurrent change between read and write aborts the
+	query; the chunk is then retried once and, if it conflicts again, written item by item so
+	only the items actually changed concurrently are reported as conflicts.
+	"""
+	bind_vars = {
+		"@collection": collection, "items": [
+			{
+				"key"  : item.key, "rev": item.rev, "upsert": item.upsert,
+				"patch": strip_grants(item.patch.model_dump(exclude_unset=True), principals)
+			} for item in chunk], "principals": principals
+	}
+	for attempt in range(2):
+		try:
+			rows = next(db.aql.execute(BULK_PATCH_AQL, bind_vars=bind_vars))
+			return [BulkPatchResult(collection=collection, **row) for row in rows]
+		except ArangoServerError as error:
+			failure = error
+			if error.error_code != ERR_CONFLICT:
+				break
+			logger.info(f"Bulk patch chunk on {collection} conflicted (attempt {attempt + 1})")
+	else:
+		if len(chunk) > 1:
+			return [result for item in chunk
+					for result in _patch_chunk(db, collection, [item], principals)]
+	logger.error(f"Bulk patch chunk on {collection} failed: {failure}")
+	chunk_status = "conflict" if failure.error_code == ERR_CONFLICT else \
+		"not_found" if failure.error_code == ERR_COLLECTION_NOT_FOUND else "error"
+	return [BulkPatchResult(
+		collection=collection, key=item.key, status=chunk_status, error=failure.error_message)
+		for item in chunk]
+
+
+def bulk_patch_nodes(db: StandardDatabase, items: List[BulkPatchItem],
+					 principals: List[str] | None = None) -> List[BulkPatchResult]:
+	"""
+	Apply patches grouped by collection, one AQL query per chunk of `BULK_CHUNK_SIZE` items.
+	Preconditions are evaluated per item; a chunk failing as a whole reports all its items.
+	Items hidden from `principals` are reported as not found, and `acl` is dropped from the
+	patches unless `principals` is None.
+
+	:return: One result per item, in request order.
+	"""
+	by_collection: Dict[str, Dict[str, BulkPatchItem]] = defaultdict(dict)
+	duplicates: Dict[int, BulkPatchResult] = {}
+	for index, item in enumerate(items):
+		if item.key in by_collection[item.collection]:
+			duplicates[index] = BulkPatchResult(
+				collection=item.collection, key=item.key, status="error",
+				error="Duplicate item in request")
+			continue
+		by_collection[item.collection][item.key] = item
+
+	results: Dict[Tuple[str, str], BulkPatchResult] = {}
+	for collection, keyed_items in by_collection.items():
+		pending = list(keyed_items.values())
+		for start in range(0, len(pending), BULK_CHUNK_SIZE):
+			chunk = pending[start:start + BULK_CHUNK_SIZE]
+			for result in _patch_chunk(db, collection, chunk, principals):
+				results[(collection, result.key)] = result
+
+	return [duplicates.get(index) or results[(item.collection, item.key)] for index, item in
+			enumerate(items)]
+
+
+def build_cascade_delete_query(by_collection: Dict[str, List[str]], dry_run: bool,
+							   principals: List[str] | None = None) -> Tuple[str, Dict[str, Any]]:
+	"""
+	Build one AQL query removing vertices together with all their incident edges of the core
+	graph. Every edge collection is scanned once through its edge index for all vertices of the
+	batch, so the query count doesn't grow with the number of vertices or edge collections. As a
+	single query, the batch is removed in one transaction. Vertices hidden from the caller are
+	left untouched together with their edges.
+
+	:param by_collection: Keys of the vertices to remove per vertex collection.
+	:param dry_run: Only return the ids that would be removed.
+	:param principals: Principals of the caller.
+	:return: The query and its bind variables. The result lists removed vertex ids per
+		collection and `[id, from, to]` of removed edges per edge collection.
+	"""
+	bind_vars: Dict[str, Any] = {"principals": principals}
+	statements = []
+	for i, (collection, keys) in enumerate(by_collection.items()):
+		bind_vars[f"@vertices{i}"] = collection
+		bind_vars[f"keys{i}"] = keys
+		statements.append(
+			f"LET visible{i} = (FOR key IN @keys{i} LET doc = DOCUMENT(@@vertices{i}, key) "
+			f"FILTER doc != null AND {acl_filter('doc')} RETURN doc)")
+	visible = ", ".join(f"visible{i}[*]._id" for i in range(len(by_collection)))
+	statements.append(f"LET visible = FLATTEN([{visible}])")
+	edge_collections = incident_edge_collections(list(by_collection))
+	for i, edge_collection in enumerate(edge_collections):
+		bind_vars[f"@edges{i}"] = edge_collection
+		action = "RETURN [e._id, e._from, e._to]" if dry_run else \
+			f"REMOVE e IN @@edges{i} RETURN [OLD._id, OLD._from, OLD._to]"
+		statements.append(
+			f"LET edges{i} = (FOR e IN @@edges{i} FILTER e._from IN visible OR e._to IN visible "
+			f"{action})")
+	for i in range(len(by_collection)):
+		if dry_run:
+			action = "RETURN doc._id"
+		else:
+			action = f"REMOVE doc IN @@vertices{i} OPTIONS {{ignoreErrors: true}} RETURN OLD._id"
+		statements.append(f"LET vertices{i} = (FOR doc IN visible{i} {action})")
+	bind_vars["edge_collections"] = edge_collections
+	bind_vars["vertex_collections"] = list(by_collection)
+	edges = ", ".join(f"edges{i}" for i in range(len(edge_collections)))
+	vertices = ", ".join(f"vertices{i}" for i in range(len(by_collection)))
+	aql = "\n".join(statements) + f"""
+	RETURN {{
+		edges: ZIP(@edge_collections, [{edges}]),
+		vertices: ZIP(@vertex_collections, [{vertices}])
+	}}"""
+	return aql, bind_vars
+
+
+def cascade_delete(db: StandardDatabase, ids: List[str], dry_run: bool,
+				   principals: List[str] | None = None) -> \
+		Tuple[CascadeDeleteResult, List[Tuple[str, str, str]]]:
+	"""
+	Remove vertices and their incident core graph edges in batches of `BULK_CHUNK_SIZE`
+	vertices, one AQL query and transaction per batch.
+
+	:param ids: Vertex ids, duplicates are removed once.
+	:param principals: Principals of the caller, vertices they can't see are skipped.
+	:raise HTTPException: 422 for malformed ids or ids of edge documents.
+	:return: The result and the `(collection, from, to)` of every removed edge.
+	"""
+	ids = list(dict.fromkeys(ids))
+	validate_vertex_ids(ids)
+	edges = [vertex for vertex in ids if vertex.split("/", 1)[0] in core_graph_edge_collections]
+	if edges:
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+			detail=f"Not vertex ids: {edges[:10]}")
+
+	result = CascadeDeleteResult(dry_run=dry_run)
+	removed_edges: List[Tuple[str, str, str]] = []
+	for start in range(0, len(ids), BULK_CHUNK_SIZE):
+		by_collection: Dict[str, List[str]] = defaultdict(list)
+		for vertex in ids[start:start + BULK_CHUNK_SIZE]:
+			collection, key = vertex.split("/", 1)
+			by_collection[collection].append(key)
+		aql, bind_vars = build_cascade_delete_query(by_collection, dry_run, principals)
+		try:
+			removed = next(db.aql.execute(aql, bind_vars=bind_vars))
+		except ArangoServerError as error:
+			raise_for_write_error(error)
+		for collection, vertices in removed["vertices"].items():
+			if vertices:
+				result.vertices.setdefault(collection, []).extend(vertices)
+		for collection, edges in removed["edges"].items():
+			if edges:
+				result.edges.setdefault(collection, []).extend(edge[0] for edge in edges)
+				removed_edges.extend((collection, edge[1], edge[2]) for edge in edges)
+	if not dry_run:
+		logger.info(f"Removed {sum(map(len, result.vertices.values()))} vertices and "
+					f"{sum(map(len, result.edges.values()))} edges from {db.name}")
+	return result, removed_edges
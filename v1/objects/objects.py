@@ -1,6 +1,5 @@
 from typing import Annotated
 
-from arango import ArangoClient
 from arango.database import StandardDatabase
 from fastapi import APIRouter
 from fastapi.params import Depends
@@ -9,15 +8,21 @@ from starlette.requests import Request
 from v1.auth.utils import get_current_active_user, get_current_active_user_db
 from v1.models.models import User
 from v1.objects.collections.collections import collections_router
+from v1.objects.edges.edges import edges_router
 from v1.objects.models import CollectionInfo
 from v1.objects.nodes.layouts.layouts import layouts_router
 from v1.objects.nodes.nodes import nodes_router
-from v1.shared.shared import read_auth_cookie
+from v1.shared.catalog import schema_catalog
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+from v1.shared.shared import get_sys_client, read_auth_cookie, tenant_database
 
-objects_router = APIRouter(prefix="/objects", tags=["Objects"])
+objects_router = APIRouter(
+	prefix="/objects", tags=["Objects"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
 
 objects_router.include_router(layouts_router)
 objects_router.include_router(collections_router)
+objects_router.include_router(edges_router)
 
 
 
@@ -33,6 +38,6 @@ async def fetch_collection(auth_cookie: Annotated[str, Depends(read_auth_cookie)
 						   collection_id: str,
 						   current_user: Annotated[
 							   User, Depends(get_current_active_user)]) -> CollectionInfo:
-	client = ArangoClient(hosts="http://localhost:8529")
-	db = client.db(name=current_user.username, user_token=auth_cookie)
-	return CollectionInfo(**db.collection(collection_id).info())
+	db = get_sys_client().db(name=tenant_database(current_user), user_token=auth_cookie)
+	info = await schema_catalog.collection_details(db, collection_id, current_user.username)
+	return CollectionInfo(**info)
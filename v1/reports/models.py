@@ -0,0 +1,31 @@
+from typing import Any, Dict, List, Literal
+
+from pydantic import BaseModel, Field
+
+
+class FanOutQuery(BaseModel):
+	query: str = Field(..., description="Read-only AQL query executed in every database.")
+	bind_vars: Dict[str, Any] = Field(default_factory=dict)
+	databases: List[str] | None = Field(
+		None, description="Databases to query. Defaults to all databases accessible to you.")
+	sort_by: str | None = Field(None, description="Row attribute to sort the merged rows by.")
+	descending: bool = False
+	limit: int | None = Field(None, ge=1, description="Maximum number of merged rows.")
+	group_by: str | None = Field(None, description="Row attribute to group aggregates by.")
+	aggregates: Dict[str, Literal["count", "sum", "min", "max", "avg"]] = Field(
+		default_factory=dict, description="Aggregations over row attributes, e.g. "
+										   "`{\"total\": \"sum\"}`.")
+	timeout: float | None = Field(None, gt=0, description="Timeout per database in seconds.")
+
+
+class DatabaseOutcome(BaseModel):
+	status: Literal["ok", "timeout", "unavailable", "error"]
+	rows: int = 0
+	duration_ms: float
+	error: str | None = None
+
+
+class FanOutResult(BaseModel):
+	rows: List[Dict[str, Any]]
+	aggregates: Dict[str, Dict[str, Any]]
+	databases: Dict[str, DatabaseOutcome]
@@ -0,0 +1,57 @@
+from typing import Annotated, List
+
+from fastapi import APIRouter, Body, Depends, HTTPException
+from starlette import status
+
+from v1.auth.utils import get_current_active_user
+from v1.config.config import ARANGO_ROOT_PW
+from v1.models.models import User
+from v1.objects.nodes.utils import get_user_accessible_dbs
+from v1.reports.models import FanOutQuery, FanOutResult
+from v1.reports.utils import fan_out
+from v1.shared.acl import principal_cache
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+from v1.shared.shared import get_sys_client, is_administrator, read_auth_cookie
+
+reports_router = APIRouter(
+	prefix="/reports", tags=["Reports"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
+
+
+@reports_router.post(
+	"/query", response_model=FanOutResult,
+	description="Run a read-only AQL query in many tenant databases concurrently and merge the "
+				"results. Available to superusers, admins and organisation owners. Rows of "
+				"organisation owners are limited to documents their grants let them see.")
+async def query_databases(current_user: Annotated[User, Depends(get_current_active_user)],
+						  accessible: Annotated[List[str], Depends(get_user_accessible_dbs)],
+						  auth_token: Annotated[str, Depends(read_auth_cookie)],
+						  request: Annotated[FanOutQuery, Body()]):
+	administrator = is_administrator(current_user)
+	if not administrator and not current_user.extra.organisations:
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN,
+			detail="Reporting is limited to superusers, admins and organisation owners")
+	databases = request.databases or accessible
+	forbidden = set(databases) - set(accessible)
+	if forbidden:
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN,
+			detail=f"No access to databases: {sorted(forbidden)[:10]}")
+
+	client = get_sys_client()
+	if administrator:
+		def connect(name: str):
+			return client.db(name, username="root", password=ARANGO_ROOT_PW)
+
+		return await fan_out(connect, list(dict.fromkeys(databases)), request)
+
+	# Organisation owners query with their own token, ArangoDB enforces their grants and rows
+	# are filtered by the object-level grants they hold in each database.
+	def connect(name: str):
+		return client.db(name, user_token=auth_token)
+
+	def principals_of(db) -> List[str]:
+		return sorted(principal_cache.get(db, current_user.username))
+
+	return await fan_out(connect, list(dict.fromkeys(databases)), request, principals_of)
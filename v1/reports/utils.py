@@ -0,0 +1,241 @@
+import asyncio
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from arango.exceptions import ArangoError, ArangoServerError
+from fastapi import HTTPException
+from starlette import status
+
+from v1.config.config import AQL_BATCH_SIZE, DB_READ_FROM_FOLLOWERS, FANOUT_DB_TIMEOUT, \
+	FANOUT_MAX_PARALLEL, FANOUT_MAX_ROWS_PER_DB
+from v1.reports.models import DatabaseOutcome, FanOutQuery, FanOutResult
+from v1.shared.acl import acl_filter
+from v1.shared.resilience import DatabaseUnavailable, DeadlineExceeded
+from v1.shared.shared import logger
+
+# Types of the AST nodes of data-modification operations, as returned by the query parser.
+MODIFYING_NODES = {"insert", "update", "replace", "remove", "upsert"}
+# ArangoDB kills queries running longer than their `max_runtime` with this error.
+ERR_QUERY_KILLED = 1500
+# Errors in the query itself, e.g. syntax errors (1501) or bad bind parameters (1550-1553).
+QUERY_ERRORS = range(1501, 1600)
+
+fan_out_executor = ThreadPoolExecutor(max_workers=FANOUT_MAX_PARALLEL, thread_name_prefix="fanout")
+
+
+def _modifies_data(nodes: List[Dict[str, Any]]) -> bool:
+	return any(node.get("type") in MODIFYING_NODES or _modifies_data(node.get("subNodes", []))
+			   for node in nodes)
+
+
+def ensure_read_only(db: Any, query: str) -> None:
+	"""
+	Reject queries whose parsed AST contains a data-modification operation. Parsing does not
+	need the collections to exist, so any of the target databases can be asked.
+
+	:raise HTTPException: 422 if the query can't be parsed or modifies data.
+	:raise ArangoError: If the database can't be asked, e.g. it's missing or access is denied.
+	"""
+	try:
+		parsed = db.aql.validate(query)
+	except ArangoServerError as exc:
+		if exc.error_code not in QUERY_ERRORS:
+			raise
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid query: {exc}")
+	if _modifies_data(parsed.get("ast", [])):
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+			detail="Only read-only queries can be fanned out")
+
+
+class _SortKey:
+	"""
+	Orders rows by one attribute, missing values last, in either direction.
+	"""
+	__slots__ = ("value", "descending")
+
+	def __init__(self, value: Any, descending: bool):
+		self.value = value
+		self.descending = descending
+
+	def __lt__(self, other: "_SortKey") -> bool:
+		if self.value is None or other.value is None:
+			return self.value is not None and other.value is None
+		try:
+			return self.value > other.value if self.descending else self.value < other.value
+		except TypeError:
+			return str(self.value) < str(other.value)
+
+
+class _Inverted:
+	__slots__ = ("key",)
+
+	def __init__(self, key: _SortKey):
+		self.key = key
+
+	def __lt__(self, other: "_Inverted") -> bool:
+		return other.key < self.key
+
+
+class RowMerger:
+	"""
+	Merges rows of many databases as they arrive. With `limit` only the best `limit` rows are
+	kept in a heap; aggregates are folded in row by row.
+	"""
+
+	def __init__(self, request: FanOutQuery):
+		self.request = request
+		self._heap: List[Tuple[Any, int, Dict[str, Any]]] = []
+		self._rows: List[Dict[str, Any]] = []
+		self._seq = 0
+		self._aggregates: Dict[Any, Dict[str, List[float]]] = {}
+
+	def add(self, database: str, rows: List[Dict[str, Any]]) -> None:
+		for row in rows:
+			if not isinstance(row, dict):
+				row = {"value": row}
+			row = {**row, "_database": database}
+			self._aggregate(row)
+			if self.request.sort_by is None or self.request.limit is None:
+				self._rows.append(row)
+				continue
+			self._seq += 1
+			# Max-heap of the kept rows by inverting the order, the worst kept row on top.
+			entry = (_Inverted(_SortKey(row.get(self.request.sort_by), self.request.descending)),
+					 -self._seq, row)
+			if len(self._heap) < self.request.limit:
+				heapq.heappush(self._heap, entry)
+			elif self._heap[0][0] < entry[0]:
+				heapq.heapreplace(self._heap, entry)
+
+	def _aggregate(self, row: Dict[str, Any]) -> None:
+		if not self.request.aggregates:
+			return
+		group = row.get(self.request.group_by) if self.request.group_by else "*"
+		state = self._aggregates.setdefault(group if isinstance(group, (str, int, float, bool))
+											or group is None else str(group), {})
+		for field, operation in self.request.aggregates.items():
+			count, total, low, high = state.get(field, [0, 0.0, None, None])
+			value = row.get(field)
+			if operation == "count":
+				count += value is not None
+			elif isinstance(value, (int, float)) and not isinstance(value, bool):
+				count += 1
+				total += value
+				low = value if low is None else min(low, value)
+				high = value if high is None else max(high, value)
+			state[field] = [count, total, low, high]
+
+	def rows(self) -> List[Dict[str, Any]]:
+		if self.request.sort_by is None:
+			return self._rows[:self.request.limit] if self.request.limit else self._rows
+		if self.request.limit is None:
+			return sorted(
+				self._rows,
+				key=lambda row: _SortKey(row.get(self.request.sort_by), self.request.descending))
+		return [row for _, _, row in sorted(self._heap, reverse=True)]
+
+	def aggregates(self) -> Dict[str, Dict[str, Any]]:
+		result = {}
+		for group, state in self._aggregates.items():
+			values = {}
+			for field, operation in self.request.aggregates.items():
+				count, total, low, high = state.get(field, [0, 0.0, None, None])
+				values[field] = {
+					"count": count, "sum": total, "min": low, "max": high,
+					"avg"  : total / count if count else None
+				}[operation]
+			result[str(group)] = values
+		return result
+
+
+def _query_database(connect: Callable[[str], Any], database: str, request: FanOutQuery,
+					timeout: float,
+					principals_of: Callable[[Any], Iterable[str]] | None = None) -> List[Any]:
+	db = connect(database)
+	query, bind_vars = request.query, request.bind_vars
+	if principals_of is not None:
+		query = f"FOR row IN ({query}) FILTER {acl_filter('row')} RETURN row"
+		bind_vars = {**bind_vars, "principals": list(principals_of(db))}
+	cursor = db.aql.execute(
+		query, bind_vars=bind_vars, batch_size=AQL_BATCH_SIZE, stream=True,
+		max_runtime=timeout, allow_dirty_read=DB_READ_FROM_FOLLOWERS)
+	rows = []
+	for row in cursor:
+		rows.append(row)
+		if len(rows) >= FANOUT_MAX_ROWS_PER_DB:
+			cursor.close(ignore_missing=True)
+			break
+	return rows
+
+
+async def fan_out(connect: Callable[[str], Any], databases: List[str], request: FanOutQuery,
+				  principals_of: Callable[[Any], Iterable[str]] | None = None) -> FanOutResult:
+	"""
+	Run one AQL query in many databases concurrently, at most `FANOUT_MAX_PARALLEL` at a time,
+	and merge the rows while databases answer. The timeout per database is enforced by the
+	server through `max_runtime`, so time spent waiting for a worker does not count and no
+	worker keeps running after its database was given up.
+
+	:param connect: Callable returning a database connection for a database name.
+	:param databases: Names of the databases to query.
+	:param request: The query, merge and aggregation options.
+	:param principals_of: Callable returning the caller's principals in a database. If given,
+		rows are limited to those `acl_filter` admits.
+	:return: Merged rows, aggregates and the outcome per database.
+	"""
+	timeout = request.timeout or FANOUT_DB_TIMEOUT
+	loop = asyncio.get_running_loop()
+	for database in databases:
+		# Any database can parse the query, an unavailable one must not fail the whole report.
+		try:
+			await loop.run_in_executor(
+				fan_out_executor, lambda: ensure_read_only(connect(database), request.query))
+			break
+		except (DatabaseUnavailable, DeadlineExceeded) as exc:
+			logger.info(f"Fan-out query can't be checked in {database}: {exc.detail}")
+		except ArangoError as exc:
+			logger.info(f"Fan-out query can't be checked in {database}: {exc}")
+	else:
+		if databases:
+			raise DatabaseUnavailable()
+	semaphore = asyncio.Semaphore(FANOUT_MAX_PARALLEL)
+	merger = RowMerger(request)
+	outcomes: Dict[str, DatabaseOutcome] = {}
+
+	async def run(database: str) -> Tuple[str, List[Any] | None, DatabaseOutcome]:
+		async with semaphore:
+			start = time.perf_counter()
+			try:
+				rows = await loop.run_in_executor(
+					fan_out_executor, _query_database, connect, database, request, timeout,
+					principals_of)
+				return database, rows, DatabaseOutcome(
+					status="ok", rows=len(rows), duration_ms=(time.perf_counter() - start) * 1000)
+			except DeadlineExceeded:
+				outcome_status, error = "timeout", "Request deadline exceeded"
+			except DatabaseUnavailable as exc:
+				outcome_status, error = "unavailable", exc.detail
+			except ArangoError as exc:
+				if getattr(exc, "error_code", None) == ERR_QUERY_KILLED:
+					outcome_status, error = "timeout", f"No result within {timeout}s"
+				else:
+					outcome_status, error = "error", str(exc)
+			except Exception as exc:
+				# One failing database must not abort the report of all the others.
+				outcome_status, error = "error", f"{type(exc).__name__}: {exc}"
+			logger.info(f"Fan-out query on {database} failed: {error}")
+			return database, None, DatabaseOutcome(
+				status=outcome_status, duration_ms=(time.perf_counter() - start) * 1000,
+				error=error)
+
+	for next_done in asyncio.as_completed([run(database) for database in databases]):
+		database, rows, outcome = await next_done
+		outcomes[database] = outcome
+		if rows is not None:
+			merger.add(database, rows)
+
+	return FanOutResult(rows=merger.rows(), aggregates=merger.aggregates(), databases=outcomes)
@@ -1,11 +1,25 @@
 from fastapi import  APIRouter
 
+from v1.admin.admin import admin_router
+from v1.analytics.analytics import analytics_router
 from v1.auth.auth import auth_router
 from v1.graphs.graphs import graphs_router
+from v1.jobs.jobs import jobs_router
 from v1.objects.objects import objects_router
+from v1.reports.reports import reports_router
+from v1.search.search import search_router
+from v1.stats.stats import stats_router
+from v1.tenants.tenants import tenants_router
 
 router = APIRouter()
 
 router.include_router(auth_router)
 router.include_router(objects_router)
 router.include_router(graphs_router)
+router.include_router(admin_router)
+router.include_router(reports_router)
+router.include_router(search_router)
+router.include_router(tenants_router)
+router.include_router(analytics_router)
+router.include_router(jobs_router)
+router.include_router(stats_router)
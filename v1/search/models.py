@@ -0,0 +1,23 @@
+from typing import Any, Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class SearchHit(BaseModel):
+	id: str
+	collection: str
+	score: float
+	document: Dict[str, Any]
+
+
+class SearchFacets(BaseModel):
+	collections: Dict[str, int] = Field(default_factory=dict)
+	groups: Dict[str, int] = Field(default_factory=dict)
+
+
+class SearchResult(BaseModel):
+	hits: List[SearchHit]
+	facets: SearchFacets | None = Field(
+		None, description="Match counts, only computed for the first page.")
+	next_cursor: str | None = Field(
+		None, description="Pass as `cursor` to fetch the next page, null on the last page.")
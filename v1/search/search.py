@@ -0,0 +1,51 @@
+from typing import Annotated, List
+
+from arango.database import StandardDatabase
+from fastapi import APIRouter, Depends, Query
+from starlette.concurrency import run_in_threadpool
+
+from v1.auth.utils import get_current_active_user_db
+from v1.config.config import DB_READ_FROM_FOLLOWERS, SEARCH_MAX_LIMIT
+from v1.search.models import SearchFacets, SearchHit, SearchResult
+from v1.search.utils import build_search_query, encode_cursor
+from v1.shared.acl import get_principals
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+
+search_router = APIRouter(
+	prefix="/search", tags=["Search"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
+
+
+@search_router.get(
+	"", response_model=SearchResult,
+	description="Full-text search over customers, suppliers, products, modules, tasks and "
+				"events, ranked by relevance, with facet counts per collection and group.")
+async def search(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+				 principals: Annotated[List[str] | None, Depends(get_principals)],
+				 q: Annotated[str, Query(min_length=1)],
+				 collections: Annotated[List[str] | None, Query()] = None,
+				 group: str | None = None,
+				 prefix: bool = True,
+				 fuzzy: bool = False,
+				 limit: Annotated[int, Query(ge=1, le=SEARCH_MAX_LIMIT)] = 20,
+				 cursor: str | None = None):
+	aql, bind_vars = build_search_query(
+		q, collections, group, prefix, fuzzy, limit, cursor, principals)
+	result = await run_in_threadpool(lambda: next(db.aql.execute(
+		aql, bind_vars=bind_vars, allow_dirty_read=DB_READ_FROM_FOLLOWERS)))
+
+	rows = result["hits"]
+	next_cursor = None
+	if len(rows) > limit:
+		rows = rows[:limit]
+		next_cursor = encode_cursor(rows[-1]["score"], rows[-1]["doc"]["_id"])
+	facets = None
+	if result["facets"] is not None:
+		facets = SearchFacets(
+			collections={name: count for name, count in result["facets"]["collections"]},
+			groups={str(name): count for name, count in result["facets"]["groups"]})
+	return SearchResult(
+		hits=[SearchHit(
+			id=row["doc"]["_id"], collection=row["doc"]["_id"].split("/", 1)[0],
+			score=row["score"], document=row["doc"]) for row in rows], facets=facets,
+		next_cursor=next_cursor)
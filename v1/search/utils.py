@@ -0,0 +1,108 @@
+import base64
+import json
+import re
+import unicodedata
+from typing import Any, Dict, List, Tuple
+
+from fastapi import HTTPException
+from starlette import status
+
+from v1.config.config import SEARCH_MAX_TERMS
+from v1.shared.acl import acl_filter
+from v1.shared.initialize import SEARCH_ANALYZER, SEARCH_VIEW, search_colls
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+	"""
+	Split a query like the search analyzer does: lower-cased words without accents.
+	"""
+	normalized = unicodedata.normalize("NFKD", text.lower())
+	stripped = "".join(char for char in normalized if not unicodedata.combining(char))
+	return list(dict.fromkeys(WORD_PATTERN.findall(stripped)))[:SEARCH_MAX_TERMS]
+
+
+def encode_cursor(score: float, document_id: str) -> str:
+	return base64.urlsafe_b64encode(json.dumps([score, document_id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+	try:
+		score, document_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+		return float(score), str(document_id)
+	except (ValueError, TypeError) as error:
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from error
+
+
+def build_search_query(q: str, collections: List[str] | None, group: str | None, prefix: bool,
+					   fuzzy: bool, limit: int, cursor: str | None,
+					   principals: List[str] | None = None) -> Tuple[str, Dict[str, Any]]:
+	"""
+	Build the AQL for one result page. Hits are ranked by BM25 and paginated by keyset on
+	(score, _id), so deep pages cost the same as the first one. Facets are only counted for the
+	first page. Hits and facets only include documents visible to `principals`.
+
+	:return: The AQL query string and its bind variables.
+	"""
+	terms = tokenize(q)
+	if not terms:
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Query contains no words")
+	collections = collections or search_colls
+	unknown = set(collections) - set(search_colls)
+	if unknown:
+		raise HTTPException(
+			status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+			detail=f"Collections not searchable: {sorted(unknown)}")
+
+	bind_vars: Dict[str, Any] = {
+		"q"          : q, "analyzer": SEARCH_ANALYZER, "collections": collections,
+		"limit"      : limit + 1, "principals": principals,
+	}
+	clauses = ["BOOST(doc.name IN TOKENS(@q, @analyzer), 3)",
+			   "doc.data.value IN TOKENS(@q, @analyzer)"]
+	for index, term in enumerate(terms):
+		bind_vars[f"t{index}"] = term
+		if prefix:
+			clauses.append(f"BOOST(STARTS_WITH(doc.name, @t{index}), 1.5)")
+			clauses.append(f"STARTS_WITH(doc.data.value, @t{index})")
+		if fuzzy and len(term) > 3:
+			clauses.append(f"BOOST(LEVENSHTEIN_MATCH(doc.name, @t{index}, 1, true), 0.5)")
+	search = f"ANALYZER({' OR '.join(clauses)}, @analyzer)"
+	if group is not None:
+		bind_vars["group"] = group
+		search = f"({search}) AND doc.group == @group"
+
+	def search_clause(indent: str) -> str:
+		return f"FOR doc IN {SEARCH_VIEW}\n{indent}\tSEARCH {search}\n{indent}\t" \
+			   f"OPTIONS {{collections: @collections}}\n{indent}\tFILTER {acl_filter('doc')}"
+
+	page_search, nested_search = search_clause("\t"), search_clause("\t\t\t")
+	page_filter = ""
+	if cursor is not None:
+		bind_vars["after_score"], bind_vars["after_id"] = decode_cursor(cursor)
+		page_filter = "\n\t\tFILTER score < @after_score OR (score == @after_score AND " \
+					  "doc._id > @after_id)"
+	facets = "null" if cursor is not None else f"""{{
+		collections: (
+			{nested_search}
+				COLLECT collection = PARSE_IDENTIFIER(doc).collection WITH COUNT INTO n
+				RETURN [collection, n]),
+		groups: (
+			{nested_search}
+				FILTER doc.group != null
+				COLLECT grp = doc.group WITH COUNT INTO n
+				SORT n DESC
+				LIMIT 100
+				RETURN [grp, n])
+	}}"""
+	return f"""
+LET hits = (
+	{page_search}
+		LET score = BM25(doc){page_filter}
+		SORT score DESC, doc._id
+		LIMIT @limit
+		RETURN {{doc, score}})
+RETURN {{hits, facets: {facets}}}""", bind_vars
@@ -1,10 +1,10 @@
 from typing import Optional
 
-from arango import ArangoClient
 from arango.database import StandardDatabase
 from passlib.context import CryptContext
 
 from v1.config.config import ARANGO_ROOT_PW
+from v1.shared.shared import get_sys_client
 
 
 class AuthGuard:
@@ -44,7 +44,7 @@ class AuthGuard:
 
 	def _init_db(self):
 		# Not catching, exceptions should propagate from arango and be catched higher up.
-		self.db: StandardDatabase = ArangoClient(hosts="http://localhost:8529").db(
+		self.db: StandardDatabase = get_sys_client().db(
 			name=self.db_name, username=self.username, password=self.password, auth_method="jwt")
 
 	async def authenticate_basic(self):
@@ -0,0 +1,118 @@
+"""
+Object-level access control.
+
+Documents may carry an `acl`: a list of principal ids, i.e. ids of `Users`, `Teams`,
+`Departments` or `Organizations` documents. Documents without `acl` are visible to everyone with
+access to the database. A user's effective principals are derived from the membership edges:
+
+- the user's own `Users` document (`UserACL`) and every user they lead (`USER_LEADS`,
+  transitively),
+- teams and departments led by any of them (`USER_LEADS`),
+- departments they belong to (`DEPARTMENT_HAS`) and teams of departments they lead,
+- organizations owning any of those departments (`ORGANIZATION_HAS`).
+
+The set is computed with one AQL query per user and tenant, cached for `ACL_CACHE_TTL` seconds
+and dropped whenever membership edges are written through the API. Queries apply it through
+`acl_filter`, so checks cost no extra query per request or document. Superusers and admins
+bypass object-level ACLs.
+"""
+import time
+from typing import Annotated, Dict, FrozenSet, Iterable, List, Tuple
+
+from arango.database import StandardDatabase
+from fastapi import Depends
+from starlette.concurrency import run_in_threadpool
+
+from v1.auth.utils import get_current_active_user, get_current_active_user_db
+from v1.config.config import ACL_CACHE_TTL
+from v1.models.models import User
+from v1.shared.shared import is_administrator, logger
+
+MEMBERSHIP_EDGES = ("DEPARTMENT_HAS", "USER_LEADS", "ORGANIZATION_HAS")
+# Depth of leadership chains followed when collecting the users someone leads.
+MAX_LEAD_DEPTH = 5
+
+PRINCIPALS_AQL = f"""
+LET me = FIRST(FOR u IN Users FILTER u._key == @username OR u.username == @username
+	LIMIT 1 RETURN u._id)
+LET people = me == null ? [] : UNIQUE(APPEND([me], (
+	FOR v IN 1..{MAX_LEAD_DEPTH} OUTBOUND me USER_LEADS
+		FILTER IS_SAME_COLLECTION("Users", v) RETURN v._id)))
+LET led = (
+	FOR p IN people FOR v IN 1..1 OUTBOUND p USER_LEADS
+		FILTER !IS_SAME_COLLECTION("Users", v) RETURN v._id)
+LET led_departments = (FOR id IN led FILTER IS_SAME_COLLECTION("Departments", id) RETURN id)
+LET departments = UNIQUE(APPEND(led_departments, (
+	FOR p IN people FOR d IN 1..1 INBOUND p DEPARTMENT_HAS RETURN d._id)))
+LET teams = (
+	FOR d IN led_departments FOR t IN 1..1 OUTBOUND d DEPARTMENT_HAS
+		FILTER IS_SAME_COLLECTION("Teams", t) RETURN t._id)
+LET organizations = (FOR d IN departments FOR o IN 1..1 INBOUND d ORGANIZATION_HAS RETURN o._id)
+RETURN UNIQUE(UNION(people, led, departments, teams, organizations))"""
+
+
+def acl_filter(document: str) -> str:
+	"""
+	:param document: AQL variable of the document to check.
+	:return: AQL condition admitting the document for the principals bound as `@principals`,
+		a null binding admits every document.
+	"""
+	return f"(@principals == null OR {document}.acl == null OR {document}.acl ANY IN @principals)"
+
+
+def strip_grants(patch: Dict, principals: List[str] | None) -> Dict:
+	"""
+	Only users bypassing object-level ACLs may change who can see a document; everyone else's
+	patches are applied without `acl`.
+
+	:param principals: Principals of the caller, None for users bypassing object-level ACLs.
+	"""
+	if principals is None:
+		return patch
+	return {key: value for key, value in patch.items() if key != "acl"}
+
+
+class PrincipalCache:
+	def __init__(self, ttl: float = ACL_CACHE_TTL):
+		self.ttl = ttl
+		self._principals: Dict[Tuple[str, str], Tuple[float, FrozenSet[str]]] = {}
+
+	def get(self, db: StandardDatabase, username: str) -> FrozenSet[str]:
+		key = (db.name, username)
+		cached = self._principals.get(key)
+		if cached is not None and cached[0] > time.monotonic():
+			return cached[1]
+		principals = frozenset(next(db.aql.execute(
+			PRINCIPALS_AQL, bind_vars={"username": username})))
+		self._principals[key] = (time.monotonic() + self.ttl, principals)
+		return principals
+
+	def invalidate(self, database: str) -> None:
+		for key in [key for key in self._principals if key[0] == database]:
+			self._principals.pop(key, None)
+
+	def invalidate_for(self, database: str, collections: Iterable[str]) -> None:
+		"""
+		Drop a tenant's cached principals if any of the written collections holds membership
+		edges.
+		"""
+		if any(collection in MEMBERSHIP_EDGES for collection in collections):
+			logger.debug(f"Membership of {database} changed, dropping cached principals")
+			self.invalidate(database)
+
+
+principal_cache = PrincipalCache()
+
+
+async def get_principals(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+						 current_user: Annotated[User, Depends(get_current_active_user)]) -> \
+		List[str] | None:
+	"""
+	Dependency resolving the current user's effective principals for `acl_filter`.
+
+	:return: The principal ids, None for users bypassing object-level ACLs.
+	"""
+	if is_administrator(current_user):
+		return None
+	principals = await run_in_threadpool(principal_cache.get, db, current_user.username)
+	return sorted(principals)
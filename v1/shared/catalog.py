@@ -0,0 +1,166 @@
+"""
+In-memory schema catalog per tenant database.
+
+Collections and graphs of a tenant are loaded on first use and kept in memory; collection
+details and indexes are added lazily per collection. After `CATALOG_CHECK_INTERVAL` seconds the
+next access runs one AQL query returning collection ids and names plus the revisions of the
+graph definitions, and reloads only if that version differs. Schema changes made through the API
+invalidate the tenant's catalog right away.
+
+Index changes made outside the API are not covered by the version check, they are picked up on
+the next reload.
+"""
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from arango.database import StandardDatabase
+from fastapi import HTTPException
+from starlette import status
+
+from v1.config.config import CATALOG_CHECK_INTERVAL
+from v1.shared.coalesce import SingleFlight, permission_scope
+from v1.shared.shared import logger
+
+SCHEMA_VERSION_AQL = """
+RETURN {
+	collections: (FOR c IN COLLECTIONS() LET entry = CONCAT(c._id, ":", c.name) SORT entry
+				  RETURN entry),
+	graphs: (FOR g IN _graphs LET entry = CONCAT(g._key, ":", g._rev) SORT entry RETURN entry)
+}
+"""
+
+
+def _version(collections: List[str], graphs: List[str]) -> int:
+	# Sorted here as well, AQL may collate strings differently than Python compares them.
+	return hash((tuple(sorted(collections)), tuple(sorted(graphs))))
+
+
+@dataclass
+class TenantCatalog:
+	database: str
+	collections: Dict[str, Dict[str, Any]]
+	graphs: Dict[str, Dict[str, Any]]
+	version: int
+	checked: float = field(default_factory=time.monotonic)
+	details: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+	indexes: Dict[str, List[Dict[str, Any]]] = field(default_factory=dict)
+
+	def require_collection(self, name: str) -> Dict[str, Any]:
+		"""
+		:raise HTTPException: 404 if the tenant has no collection of that name.
+		:return: The collection's listing entry.
+		"""
+		collection = self.collections.get(name)
+		if collection is None:
+			raise HTTPException(
+				status_code=status.HTTP_404_NOT_FOUND, detail=f"Collection {name} not found")
+		return collection
+
+	def require_graph(self, name: str) -> Dict[str, Any]:
+		"""
+		:raise HTTPException: 404 if the tenant has no graph of that name.
+		:return: The graph's properties including its edge definitions.
+		"""
+		graph = self.graphs.get(name)
+		if graph is None:
+			raise HTTPException(
+				status_code=status.HTTP_404_NOT_FOUND, detail=f"Graph {name} not found")
+		return graph
+
+	def edge_collections(self) -> List[str]:
+		return [name for name, collection in self.collections.items() if
+				collection["type"] == "edge"]
+
+
+def _load(db: StandardDatabase) -> TenantCatalog:
+	collections = {collection["name"]: collection for collection in db.collections()}
+	graphs = {graph["name"]: {**graph, "key": graph["name"]} for graph in db.graphs()}
+	# Built from the same data the version check returns, so no extra call is needed.
+	version = _version(
+		[f"{c['id']}:{c['name']}" for c in collections.values()],
+		[f"{g['name']}:{g['revision']}" for g in graphs.values()])
+	logger.debug(f"Loaded schema catalog of {db.name}")
+	return TenantCatalog(
+		database=db.name, collections=collections, graphs=graphs, version=version)
+
+
+def _current_version(db: StandardDatabase) -> int:
+	result = next(db.aql.execute(SCHEMA_VERSION_AQL))
+	return _version(result["collections"], result["graphs"])
+
+
+class SchemaCatalog:
+	"""
+	Catalogs of all tenants, loaded and revalidated through single-flight calls so concurrent
+	requests of a tenant share one load or version check. Catalogs are shared by all users of a
+	tenant, so accessors serving per-collection data check the caller's permission first.
+	"""
+
+	def __init__(self, check_interval: float = CATALOG_CHECK_INTERVAL):
+		self.check_interval = check_interval
+		self._catalogs: Dict[str, TenantCatalog] = {}
+		self._flight = SingleFlight(cache_ttl=0)
+
+	async def get(self, db: StandardDatabase) -> TenantCatalog:
+		"""
+		:param db: Connection to the tenant database, used if the catalog has to be (re)loaded.
+		:type db: StandardDatabase
+		:return: The tenant's current catalog.
+		:rtype: TenantCatalog
+		"""
+		catalog = self._catalogs.get(db.name)
+		if catalog is not None:
+			if time.monotonic() - catalog.checked < self.check_interval:
+				return catalog
+			version = await self._flight.do((db.name, "version"), lambda: _current_version(db))
+			if version == catalog.version:
+				catalog.checked = time.monotonic()
+				return catalog
+		catalog = await self._flight.do((db.name, "load"), lambda: _load(db))
+		self._catalogs[db.name] = catalog
+		return catalog
+
+	async def collection_details(self, db: StandardDatabase, name: str,
+								 username: str) -> Dict[str, Any]:
+		"""
+		:raise HTTPException: 403 if `username` has no access to the collection, 404 for unknown
+			collections, without asking ArangoDB.
+		:return: The collection's properties as returned by `StandardCollection.info`.
+		"""
+		await permission_scope(username, db.name, name)
+		catalog = await self.get(db)
+		catalog.require_collection(name)
+		if name not in catalog.details:
+			catalog.details[name] = await self._flight.do(
+				(db.name, "details", name), db.collection(name).info)
+		return catalog.details[name]
+
+	async def collection_indexes(self, db: StandardDatabase, name: str,
+								 username: str) -> List[Dict[str, Any]]:
+		await permission_scope(username, db.name, name)
+		catalog = await self.get(db)
+		catalog.require_collection(name)
+		if name not in catalog.indexes:
+			catalog.indexes[name] = await self._flight.do(
+				(db.name, "indexes", name), db.collection(name).indexes)
+		return catalog.indexes[name]
+
+	def invalidate(self, database: str) -> None:
+		"""
+		Drop a tenant's catalog after a schema change, the next access reloads it.
+		"""
+		self._catalogs.pop(database, None)
+
+
+schema_catalog = SchemaCatalog()
+
+
+async def require_collection(db: StandardDatabase, name: str) -> Dict[str, Any]:
+	"""
+	Reject unknown collection names with 404 before they cost an ArangoDB round trip.
+
+	:return: The collection's listing entry.
+	"""
+	catalog = await schema_catalog.get(db)
+	return catalog.require_collection(name)
@@ -0,0 +1,112 @@
+"""
+Single-flight coalescing of identical concurrent read operations.
+
+Concurrent callers asking for the same resource of the same tenant share one in-flight
+ArangoDB call and its result. Keys always contain the caller's resolved permission on the
+tenant database (and collection, if given), so a result is only ever shared between callers
+holding the same grant.
+"""
+import asyncio
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from fastapi import HTTPException
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+
+from v1.config.config import COALESCE_CACHE_TTL, PERMISSION_CACHE_TTL
+from v1.shared.shared import get_sys_db, logger
+
+
+class SingleFlight:
+	"""
+	Deduplicates concurrent calls by key. The first caller (the leader) starts the blocking
+	function in the threadpool as a detached task, every caller including the leader awaits
+	that task. Results are optionally kept for `cache_ttl` seconds afterwards.
+	"""
+
+	def __init__(self, cache_ttl: float = COALESCE_CACHE_TTL):
+		self.cache_ttl = cache_ttl
+		self._in_flight: Dict[Hashable, asyncio.Future] = {}
+		self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+
+	async def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+		"""
+		:param key: Key identifying the operation, including tenant and permission scope.
+		:type key: Hashable
+		:param fn: Blocking zero-argument callable performing the upstream call.
+		:type fn: Callable[[], Any]
+		:return: The (possibly shared) result of `fn`.
+		"""
+		cached = self._cache.get(key)
+		if cached is not None:
+			if cached[0] > time.monotonic():
+				return cached[1]
+			del self._cache[key]
+
+		task = self._in_flight.get(key)
+		if task is not None:
+			logger.debug(f"Joining in-flight call for {key}")
+		else:
+			task = asyncio.ensure_future(self._run(key, fn))
+			# Mark the exception as retrieved in case every caller was cancelled meanwhile.
+			task.add_done_callback(lambda done: done.cancelled() or done.exception())
+			self._in_flight[key] = task
+		# Shielded, so a cancelled caller, the leader included, doesn't cancel the shared call.
+		return await asyncio.shield(task)
+
+	async def _run(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+		try:
+			result = await run_in_threadpool(fn)
+			if self.cache_ttl > 0:
+				self._cache[key] = (time.monotonic() + self.cache_ttl, result)
+			return result
+		finally:
+			self._in_flight.pop(key, None)
+
+	def invalidate(self, tenant: str) -> None:
+		"""
+		Drop all cached results of a tenant. Keys are expected to start with the tenant name.
+		"""
+		for key in [key for key in self._cache if isinstance(key, tuple) and key[0] == tenant]:
+			self._cache.pop(key, None)
+
+
+single_flight = SingleFlight()
+
+_permission_cache: Dict[Tuple[str, str, str | None], Tuple[float, str]] = {}
+
+
+def _resolve_permission(username: str, database: str, collection: str | None) -> str:
+	key = (username, database, collection)
+	cached = _permission_cache.get(key)
+	if cached is not None and cached[0] > time.monotonic():
+		return cached[1]
+	level = get_sys_db().permission(username, database, collection)
+	_permission_cache[key] = (time.monotonic() + PERMISSION_CACHE_TTL, level)
+	return level
+
+
+async def permission_scope(username: str, database: str, collection: str | None = None) -> str:
+	"""
+	Resolve the caller's permission level on a database (or collection) for use in coalescing
+	keys. Levels are cached for `PERMISSION_CACHE_TTL` seconds.
+
+	:raise HTTPException: 403 if the user has no access at all.
+	:return: The permission level, i.e. "rw" or "ro".
+	:rtype: str
+	"""
+	level = await run_in_threadpool(_resolve_permission, username, database, collection)
+	if level not in ("rw", "ro"):
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN, detail="No access to the requested resource")
+	return level
+
+
+async def coalesced(tenant: str, scope: str, resource: str, fn: Callable[[], Any],
+					*params: Hashable) -> Any:
+	"""
+	Convenience wrapper building the key `(tenant, scope, resource, *params)` for the shared
+	single-flight group.
+	"""
+	return await single_flight.do((tenant, scope, resource, *params), fn)
@@ -0,0 +1,368 @@
+"""
+Content negotiation for binary wire formats and transparent (de)compression.
+
+- `NegotiatedRoute` decodes MessagePack/CBOR request bodies and picks the response encoding
+  from the Accept header. Routers opt in with `route_class=NegotiatedRoute` and
+  `default_response_class=NegotiatedResponse`.
+- `CompressionMiddleware` compresses responses with zstd or gzip, chunk by chunk, so streamed
+  exports are compressed while they are produced.
+- `DecompressionMiddleware` inflates gzip/deflate/zstd encoded request bodies for bulk ingest.
+
+MessagePack, CBOR and zstd depend on optional packages and are only offered when installed.
+"""
+import json
+import zlib
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute
+from starlette import status
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from v1.config.config import COMPRESSION_LEVEL, COMPRESSION_MIN_SIZE, MAX_DECOMPRESSED_BODY
+
+try:
+	import msgpack
+except ImportError:  # pragma: no cover
+	msgpack = None
+try:
+	import cbor2
+except ImportError:  # pragma: no cover
+	cbor2 = None
+try:
+	import zstandard
+except ImportError:  # pragma: no cover
+	zstandard = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+CBOR_MEDIA_TYPE = "application/cbor"
+
+DECODERS: Dict[str, Callable[[bytes], Any]] = {}
+ENCODERS: Dict[str, Callable[[Any], bytes]] = {}
+if msgpack is not None:
+	DECODERS[MSGPACK_MEDIA_TYPE] = DECODERS["application/x-msgpack"] = msgpack.unpackb
+	ENCODERS[MSGPACK_MEDIA_TYPE] = msgpack.packb
+if cbor2 is not None:
+	DECODERS[CBOR_MEDIA_TYPE] = cbor2.loads
+	ENCODERS[CBOR_MEDIA_TYPE] = cbor2.dumps
+
+# Content types that are already compressed and must not be compressed again.
+COMPRESSED_MEDIA_TYPES = ("application/gzip", "application/zstd", "application/zip")
+
+response_media_type: ContextVar[str] = ContextVar("response_media_type", default=JSON_MEDIA_TYPE)
+
+
+def _parse_accept(value: str) -> List[Tuple[str, float]]:
+	"""
+	Parse an Accept or Accept-Encoding header into (token, quality) pairs, best first.
+	"""
+	parsed = []
+	for part in value.split(","):
+		token, *params = [item.strip() for item in part.split(";")]
+		quality = 1.0
+		for param in params:
+			if param.startswith("q="):
+				try:
+					quality = float(param[2:])
+				except ValueError:
+					quality = 0.0
+		if token:
+			parsed.append((token.lower(), quality))
+	return sorted(parsed, key=lambda item: item[1], reverse=True)
+
+
+def negotiate_media_type(accept: str | None) -> str:
+	"""
+	:param accept: Value of the Accept header.
+	:type accept: str | None
+	:return: The best supported response media type, JSON if nothing else matches.
+	:rtype: str
+	"""
+	if not accept:
+		return JSON_MEDIA_TYPE
+	for media_type, quality in _parse_accept(accept):
+		if quality <= 0:
+			continue
+		if media_type == JSON_MEDIA_TYPE or media_type in ("*/*", "application/*"):
+			return JSON_MEDIA_TYPE
+		if media_type in ENCODERS:
+			return media_type
+	return JSON_MEDIA_TYPE
+
+
+class NegotiatedResponse(JSONResponse):
+	"""
+	JSON response which renders MessagePack or CBOR instead, if the route negotiated it.
+	"""
+
+	def __init__(self, content: Any, *args, **kwargs):
+		self.media_type = response_media_type.get()
+		super().__init__(content, *args, **kwargs)
+
+	def render(self, content: Any) -> bytes:
+		encoder = ENCODERS.get(self.media_type)
+		if encoder is None:
+			return super().render(content)
+		return encoder(content)
+
+
+class NegotiatedRoute(APIRoute):
+	"""
+	Route accepting MessagePack/CBOR bodies in addition to JSON and answering in the encoding
+	requested by the client's Accept header. Responses carry `Vary: Accept`.
+	"""
+
+	def get_route_handler(self) -> Callable:
+		original_route_handler = super().get_route_handler()
+
+		async def negotiated_route_handler(request: Request):
+			content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+			decoder = DECODERS.get(content_type)
+			if decoder is not None:
+				raw_body = await request.body()
+				try:
+					payload = decoder(raw_body) if raw_body else None
+				except Exception as error:
+					raise HTTPException(
+						status_code=status.HTTP_400_BAD_REQUEST,
+						detail=f"Malformed {content_type} body") from error
+				scope = dict(request.scope)
+				headers = MutableHeaders(scope=scope)
+				headers["content-type"] = JSON_MEDIA_TYPE
+				request = Request(scope, request.receive)
+				# FastAPI reads the already decoded payload through request.json().
+				request._body = raw_body
+				if payload is not None:
+					request._json = payload
+			token = response_media_type.set(negotiate_media_type(request.headers.get("accept")))
+			try:
+				response = await original_route_handler(request)
+			finally:
+				response_media_type.reset(token)
+			# The body's media type depends on Accept, shared caches have to key on it.
+			response.headers.add_vary_header("Accept")
+			return response
+
+		return negotiated_route_handler
+
+
+class _GzipCompressor:
+	encoding = "gzip"
+
+	def __init__(self, level: int):
+		self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+	def compress(self, data: bytes, final: bool) -> bytes:
+		flush_mode = zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH
+		return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+
+class _ZstdCompressor:
+	encoding = "zstd"
+
+	def __init__(self, level: int):
+		self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+	def compress(self, data: bytes, final: bool) -> bytes:
+		flush_mode = zstandard.COMPRESSOBJ_FLUSH_FINISH if final else \
+			zstandard.COMPRESSOBJ_FLUSH_BLOCK
+		return self._compressor.compress(data) + self._compressor.flush(flush_mode)
+
+
+def _select_compressor(accept_encoding: str | None) -> Callable[[int], Any] | None:
+	supported = {"gzip": _GzipCompressor}
+	if zstandard is not None:
+		supported["zstd"] = _ZstdCompressor
+	for encoding, quality in _parse_accept(accept_encoding or ""):
+		if quality > 0 and encoding in supported:
+			return supported[encoding]
+	return None
+
+
+class CompressionMiddleware:
+	"""
+	Compresses responses according to Accept-Encoding (zstd preferred over gzip on equal
+	quality as listed by the client). Every body chunk is flushed, so chunked responses keep
+	streaming instead of being buffered until the end.
+	"""
+
+	def __init__(self, app: ASGIApp, minimum_size: int = COMPRESSION_MIN_SIZE,
+				 level: int = COMPRESSION_LEVEL):
+		self.app = app
+		self.minimum_size = minimum_size
+		self.level = level
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		compressor_class = _select_compressor(Headers(scope=scope).get("accept-encoding"))
+		if compressor_class is None:
+			await self.app(scope, receive, send)
+			return
+
+		start_message: Message | None = None
+		compressor = None
+		passthrough = False
+
+		async def send_compressed(message: Message) -> None:
+			nonlocal start_message, compressor, passthrough
+			if message["type"] == "http.response.start":
+				start_message = message
+				return
+			if message["type"] != "http.response.body":
+				await send(message)
+				return
+			body = message.get("body", b"")
+			more_body = message.get("more_body", False)
+			if start_message is not None:
+				headers = Headers(raw=start_message["headers"])
+				content_type = headers.get("content-type", "")
+				if ("content-encoding" in headers
+						or content_type.startswith(COMPRESSED_MEDIA_TYPES)
+						or (not more_body and len(body) < self.minimum_size)):
+					passthrough = True
+				else:
+					compressor = compressor_class(self.level)
+					response_headers = MutableHeaders(raw=start_message["headers"])
+					response_headers["Content-Encoding"] = compressor.encoding
+					response_headers.add_vary_header("Accept-Encoding")
+					del response_headers["Content-Length"]
+				await send(start_message)
+				start_message = None
+			if passthrough:
+				await send(message)
+				return
+			await send({
+				"type"     : "http.response.body", "body": compressor.compress(body, not more_body),
+				"more_body": more_body
+			})
+
+		await self.app(scope, receive, send_compressed)
+
+
+# A zstd block inflates to at most 128 KiB and takes at least 4 bytes, which bounds how far any
+# slice of input can inflate.
+ZSTD_MAX_RATIO = 1 << 15
+ZSTD_MIN_SLICE = 64
+
+
+class BoundedInflater:
+	"""
+	Incremental decompression producing at most about `max_length` bytes per call, so size
+	limits apply while inflating instead of after a whole chunk was inflated. Input that wasn't
+	inflated yet is kept and continued by the next call.
+	"""
+
+	def __init__(self, encoding: str):
+		self._zlib = None
+		self._zstd = None
+		self._tail = b""
+		if encoding in ("gzip", "x-gzip"):
+			self._zlib = zlib.decompressobj(31)
+		elif encoding == "deflate":
+			self._zlib = zlib.decompressobj()
+		elif encoding == "zstd" and zstandard is not None:
+			self._zstd = zstandard.ZstdDecompressor().decompressobj()
+		else:
+			raise ValueError(f"Unsupported encoding: {encoding}")
+
+	@property
+	def pending(self) -> bool:
+		"""
+		Whether input is left that the last call didn't inflate.
+		"""
+		if self._zlib is not None:
+			return bool(self._zlib.unconsumed_tail)
+		return bool(self._tail)
+
+	def inflate(self, data: bytes, max_length: int) -> bytes:
+		"""
+		:param data: Next compressed input, may be empty to continue pending input.
+		:param max_length: Output limit. zlib stops exactly there, zstd may exceed it by up to
+			`ZSTD_MIN_SLICE * ZSTD_MAX_RATIO` bytes.
+		"""
+		if self._zlib is not None:
+			return self._zlib.decompress(self._zlib.unconsumed_tail + data, max_length)
+		data = self._tail + data
+		output = bytearray()
+		position = 0
+		while position < len(data) and len(output) < max_length:
+			size = max(ZSTD_MIN_SLICE, (max_length - len(output)) // ZSTD_MAX_RATIO)
+			output += self._zstd.decompress(data[position:position + size])
+			position += size
+		self._tail = data[position:]
+		return bytes(output)
+
+	def flush(self) -> bytes:
+		"""
+		:return: Output buffered by the codec once all input was inflated.
+		"""
+		return self._zlib.flush() if self._zlib is not None and not self.pending else b""
+
+
+def _inflater_for(encoding: str) -> BoundedInflater | None:
+	try:
+		return BoundedInflater(encoding)
+	except ValueError:
+		return None
+
+
+class DecompressionMiddleware:
+	"""
+	Inflates request bodies sent with Content-Encoding gzip, deflate or zstd while they are
+	received. Bodies inflating beyond `max_size` bytes are rejected with 413 before more than
+	that is inflated.
+	"""
+
+	def __init__(self, app: ASGIApp, max_size: int = MAX_DECOMPRESSED_BODY):
+		self.app = app
+		self.max_size = max_size
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		encoding = Headers(scope=scope).get("content-encoding", "").strip().lower()
+		if not encoding or encoding == "identity":
+			await self.app(scope, receive, send)
+			return
+		inflater = _inflater_for(encoding)
+		if inflater is None:
+			response = JSONResponse(
+				status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+				content={"detail": f"Unsupported Content-Encoding: {encoding}"})
+			await response(scope, receive, send)
+			return
+
+		scope = dict(scope)
+		scope["headers"] = [(key, value) for key, value in scope["headers"] if
+							key not in (b"content-encoding", b"content-length")]
+		inflated = 0
+
+		async def receive_decompressed() -> Message:
+			nonlocal inflated
+			message = await receive()
+			if message["type"] != "http.request":
+				return message
+			remaining = self.max_size - inflated
+			try:
+				body = inflater.inflate(message.get("body", b""), remaining + 1)
+				if not message.get("more_body", False) and len(body) <= remaining:
+					body += inflater.flush()
+			except Exception as error:
+				raise HTTPException(
+					status_code=status.HTTP_400_BAD_REQUEST,
+					detail="Malformed compressed request body") from error
+			inflated += len(body)
+			if inflated > self.max_size or inflater.pending:
+				raise HTTPException(
+					status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+					detail="Decompressed request body too large")
+			return {**message, "body": body}
+
+		await self.app(scope, receive_decompressed, send)
@@ -1,4 +1,5 @@
 from arango.database import StandardDatabase
+from arango.exceptions import AnalyzerCreateError, ViewCreateError
 from starlette import status
 from starlette.exceptions import HTTPException
 
@@ -11,7 +12,7 @@ core_databases = ["main"]
 core_doc_colls = ["Customers", "Suppliers", "Products", "Modules", "RawMaterials", "Roles", "Users",
 				  "Teams", "Departments", "Events", "Objects", "Tasks", "Activities",
 				  "SalesOrders",
-				  "Organizations"
+				  "Organizations",
 				  "PurchaseOrders", "WorkOrders", "StockAreas", "Services"]
 core_edge_colls = ["EDGES", "MODULE_ASSEMBLES_INTO", "SUPPLIER_OFFERS", "CUSTOMER_BUYS",
 				   "USER_BUYS", "DEPARTMENT_HAS", "ORGANIZATION_HAS", "USER_IS", "USER_LEADS",
@@ -62,6 +63,83 @@ CORE_GRAPH = [{
 	"to_vertex_collections": ["Products", "Modules", "RawMaterials"]
 }, ]
 
+# Text-heavy collections covered by the search view.
+search_colls = ["Customers", "Suppliers", "Products", "Modules", "Tasks", "Events"]
+SEARCH_VIEW = "CoreSearch"
+SEARCH_ANALYZER = "core_text"
+# Lower-cased, accent-free word tokens. Stemming stays off so prefix and fuzzy matching work on
+# the words as typed.
+SEARCH_ANALYZER_PROPERTIES = {
+	"locale": "en", "case": "lower", "accent": False, "stemming": False, "stopwords": []
+}
+SEARCH_LINK = {
+	"includeAllFields": False, "fields": {
+		"name" : {"analyzers": [SEARCH_ANALYZER, "identity"]},
+		"group": {"analyzers": ["identity"]},
+		"data" : {"fields": {"value": {"analyzers": [SEARCH_ANALYZER]}}},
+	}
+}
+
+
+def ensure_search_view(db: StandardDatabase) -> None:
+	"""
+	Provision the search analyzer and the ArangoSearch view over `search_colls` in a tenant
+	database. Existing analyzers and views are left untouched.
+	@param db: Tenant database connection with administrative rights.
+	@type db: StandardDatabase
+	"""
+	analyzers = {analyzer["name"].split("::")[-1] for analyzer in db.analyzers()}
+	if SEARCH_ANALYZER not in analyzers:
+		try:
+			db.create_analyzer(
+				SEARCH_ANALYZER, "text", SEARCH_ANALYZER_PROPERTIES,
+				["frequency", "norm", "position"])
+			logger.info(f"Created analyzer {SEARCH_ANALYZER} in database {db.name}")
+		except AnalyzerCreateError as error:
+			logger.error(f"Unable to create analyzer {SEARCH_ANALYZER}: {error}")
+			return
+	if SEARCH_VIEW not in {view["name"] for view in db.views()}:
+		try:
+			db.create_arangosearch_view(
+				SEARCH_VIEW, properties={
+					"links": {collection: SEARCH_LINK for collection in search_colls}
+				})
+			logger.info(f"Created search view {SEARCH_VIEW} in database {db.name}")
+		except ViewCreateError as error:
+			logger.error(f"Unable to create search view {SEARCH_VIEW}: {error}")
+
+
+def provision_tenant(db_name: str) -> StandardDatabase:
+	"""
+	Create a tenant database with the core graph, collections and search view. Only touches the
+	given database, existing parts are kept.
+	@param db_name: Name of the tenant database.
+	@type db_name: str
+	@return: Connection to the tenant database with root credentials.
+	@rtype: StandardDatabase
+	"""
+	db = get_sys_db()
+	if not db.has_database(db_name):
+		db.create_database(db_name)
+		logger.info(f"Created database {db_name}")
+	tenant_db = get_sys_client().db(name=db_name, username="root", password=ARANGO_ROOT_PW)
+
+	if not tenant_db.has_graph("MainGraph"):
+		tenant_db.create_graph("MainGraph", edge_definitions=CORE_GRAPH)
+
+	# One listing instead of an existence check per collection.
+	existing = {collection["name"] for collection in tenant_db.collections()}
+	for coll in core_doc_colls:
+		if coll not in existing:
+			tenant_db.create_collection(coll)
+			logger.info(f"Created Document collection {coll} in database {db_name}")
+	for e_coll in core_edge_colls:
+		if e_coll not in existing:
+			tenant_db.create_collection(e_coll, edge=True)
+			logger.info(f"Created Edge collection {e_coll} in database {db_name}")
+	ensure_search_view(tenant_db)
+	return tenant_db
+
 
 def initialize_application(db_name: str = "main") -> None:
 	"""
@@ -71,12 +149,7 @@ def initialize_application(db_name: str = "main") -> None:
 	"""
 	logger.info(f"Configured DB Host for Cross Origins: {BASE_DB_URL}")
 	logger.info(f"Configured Backend Host Cross-Origins: {BASE_URL}")
-	client = get_sys_client()
 	db = get_sys_db()
-	if not db.has_database(db_name):
-		db.create_database(db_name)
-		logger.info(f"Created database {db_name}")
-	main_database = client.db(db_name, username="root", password=ARANGO_ROOT_PW, auth_method="jwt")
 
 	registered_users = db.users()
 
@@ -85,32 +158,11 @@ def initialize_application(db_name: str = "main") -> None:
 		if user["username"] == "root":
 			continue
 		logger.info(f"{user['username']} is registered")
-		if not db.has_database(user['username']):
-			db.create_database(user['username'])
-		db.update_permission(user['username'], "rw", user['username'])
-		user_db = client.db(name=user["username"], username="root", password=ARANGO_ROOT_PW)
-
-		if not user_db.has_graph("MainGraph"):
-			user_db.create_graph("MainGraph", edge_definitions=CORE_GRAPH)
-
-		for coll in core_doc_colls:
-			if not user_db.has_collection(coll):
-				user_db.create_collection(coll)
-				logger.info(f"Created Document collection {coll}")
-		for e_coll in core_edge_colls:
-			if not user_db.has_collection(e_coll):
-				user_db.create_collection(e_coll, edge=True)
-				logger.info(f"Created Edge collection {e_coll} in database {db_name}")
-
-	for node_col in core_doc_colls:
-
-		if not main_database.has_collection(node_col):
-			main_database.create_collection(node_col)
-			logger.info(f"Created {node_col} collection")
-	for edge_col in core_edge_colls:
-		if not main_database.has_collection(edge_col):
-			main_database.create_collection(edge_col, edge=True)
-			logger.info(f"Created {edge_col} collection")
+		user_db_name = (user.get("extra") or {}).get("database") or user["username"]
+		provision_tenant(user_db_name)
+		db.update_permission(user['username'], "rw", user_db_name)
+
+	provision_tenant(db_name)
 
 
 def create_org_db(user: User, db_name: str):
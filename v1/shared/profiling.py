@@ -0,0 +1,283 @@
+"""
+Opt-in request profiling.
+
+A single background thread samples the stacks of threads working on profiled requests: the
+event loop thread serving the request and any worker thread while it executes an ArangoDB call
+on behalf of it. Samples are kept as collapsed stacks (`frame;frame;frame count`), the input
+format of flamegraph.pl and speedscope. `TimedHTTPClient` records a timeline of all ArangoDB
+calls made during a profiled request.
+
+Profiles are captured
+- on demand, if an admin sends `X-Profile: 1` (or `?profile=1`),
+- automatically, if a request takes longer than `SLOW_REQUEST_THRESHOLD_MS`. These profiles
+  are sampled every `PROFILER_CONTINUOUS_INTERVAL_MS` only, as every request pays for them.
+Captured profiles are kept in a bounded ring buffer browsable through `/admin/profiles`.
+
+Samples of the event loop thread are shared by all requests in flight at the same time, so
+profiles of concurrent requests overlap there.
+"""
+import logging
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Set
+
+from arango.http import DefaultHTTPClient
+from arango.response import Response as ArangoResponse
+from jose import jwt
+from nanoid import generate
+from starlette.datastructures import Headers, MutableHeaders, QueryParams
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from v1.config.config import ADMIN_USERS, ALGORITHM, JWTSECRET, PROFILE_BUFFER_SIZE, \
+	PROFILER_CONTINUOUS_INTERVAL_MS, PROFILER_SAMPLE_INTERVAL_MS, SLOW_REQUEST_THRESHOLD_MS
+from v1.models.models import User
+
+# Not imported from v1.shared.shared, which builds its clients with TimedHTTPClient.
+logger = logging.getLogger("cortex_backend")
+
+MAX_STACK_DEPTH = 64
+
+
+@dataclass
+class ArangoCall:
+	offset_ms: float
+	duration_ms: float
+	method: str
+	endpoint: str
+	status_code: int | None
+
+
+@dataclass
+class RequestProfile:
+	id: str
+	method: str
+	path: str
+	on_demand: bool
+	interval: float = PROFILER_SAMPLE_INTERVAL_MS / 1000
+	started: float = field(default_factory=time.time)
+	duration_ms: float = 0.0
+	status_code: int | None = None
+	samples: Counter = field(default_factory=Counter)
+	arango_calls: List[ArangoCall] = field(default_factory=list)
+	threads: Set[int] = field(default_factory=set)
+	_start: float = field(default_factory=time.perf_counter, repr=False)
+	_next_sample: float = field(default=0.0, repr=False)
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"id"              : self.id, "method": self.method, "path": self.path,
+			"on_demand"       : self.on_demand, "started": self.started,
+			"duration_ms"     : round(self.duration_ms, 3), "status_code": self.status_code,
+			"sample_count"    : sum(self.samples.values()),
+			"arango_calls"    : len(self.arango_calls),
+			"arango_time_ms"  : round(sum(call.duration_ms for call in self.arango_calls), 3),
+		}
+
+	def collapsed(self) -> str:
+		"""
+		:return: Samples in collapsed stack format, one `stack count` line per distinct stack.
+		:rtype: str
+		"""
+		return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+current_profile: ContextVar[Optional[RequestProfile]] = ContextVar(
+	"current_profile", default=None)
+
+
+def _collapse(frame) -> str:
+	stack = []
+	while frame is not None and len(stack) < MAX_STACK_DEPTH:
+		code = frame.f_code
+		stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+		frame = frame.f_back
+	return ";".join(reversed(stack))
+
+
+class StackSampler:
+	"""
+	Samples the threads of every active profile at the profile's own interval.
+	"""
+
+	def __init__(self):
+		self._active: Dict[str, RequestProfile] = {}
+		self._lock = threading.Lock()
+		self._wakeup = threading.Event()
+		self._thread: threading.Thread | None = None
+
+	def start(self, profile: RequestProfile) -> None:
+		with self._lock:
+			self._active[profile.id] = profile
+			if self._thread is None or not self._thread.is_alive():
+				self._thread = threading.Thread(
+					target=self._run, name="stack-sampler", daemon=True)
+				self._thread.start()
+		self._wakeup.set()
+
+	def stop(self, profile: RequestProfile) -> None:
+		with self._lock:
+			self._active.pop(profile.id, None)
+
+	def _run(self) -> None:
+		while True:
+			# Cleared first, so a profile started from now on wakes the wait below.
+			self._wakeup.clear()
+			with self._lock:
+				profiles = list(self._active.values())
+			if not profiles:
+				self._wakeup.wait()
+				continue
+			now = time.perf_counter()
+			due = [profile for profile in profiles if profile._next_sample <= now]
+			frames = sys._current_frames() if due else {}
+			collapsed: Dict[int, str] = {}
+			for profile in due:
+				profile._next_sample = now + profile.interval
+				for thread_id in tuple(profile.threads):
+					frame = frames.get(thread_id)
+					if frame is None:
+						continue
+					if thread_id not in collapsed:
+						collapsed[thread_id] = _collapse(frame)
+					profile.samples[collapsed[thread_id]] += 1
+			del frames
+			self._wakeup.wait(max(0.0, min(p._next_sample for p in profiles) - time.perf_counter()))
+
+
+class ProfileStore:
+	"""
+	Bounded ring buffer of captured profiles, the oldest profile is dropped first.
+	"""
+
+	def __init__(self, size: int):
+		self._profiles: Deque[RequestProfile] = deque(maxlen=size)
+		self._lock = threading.Lock()
+
+	def add(self, profile: RequestProfile) -> None:
+		with self._lock:
+			self._profiles.append(profile)
+
+	def list(self) -> List[RequestProfile]:
+		with self._lock:
+			return list(reversed(self._profiles))
+
+	def get(self, profile_id: str) -> RequestProfile | None:
+		with self._lock:
+			return next((p for p in self._profiles if p.id == profile_id), None)
+
+
+sampler = StackSampler()
+profile_store = ProfileStore(PROFILE_BUFFER_SIZE)
+
+
+class TimedHTTPClient(DefaultHTTPClient):
+	"""
+	python-arango HTTP client recording every call into the active request profile. The calling
+	thread is attached to the profile for the duration of the call, so the sampler sees blocking
+	ArangoDB calls executed in the threadpool.
+	"""
+
+	def send_request(self, session, method: str, url: str, *args, **kwargs) -> ArangoResponse:
+		profile = current_profile.get()
+		if profile is None:
+			return super().send_request(session, method, url, *args, **kwargs)
+		thread_id = threading.get_ident()
+		attached = thread_id not in profile.threads
+		if attached:
+			profile.threads.add(thread_id)
+		start = time.perf_counter()
+		status_code = None
+		try:
+			response = super().send_request(session, method, url, *args, **kwargs)
+			status_code = response.status_code
+			return response
+		finally:
+			end = time.perf_counter()
+			if attached:
+				profile.threads.discard(thread_id)
+			profile.arango_calls.append(ArangoCall(
+				offset_ms=(start - profile._start) * 1000, duration_ms=(end - start) * 1000,
+				method=method.upper(), endpoint=url.split("://", 1)[-1].split("/", 1)[-1],
+				status_code=status_code))
+
+
+def _is_administrator(username: str) -> bool:
+	# Imported here, v1.shared.shared builds its clients on top of this module.
+	from v1.shared.shared import get_sys_db, is_administrator
+	try:
+		return is_administrator(User(**get_sys_db().user(username)))
+	except Exception as error:
+		logger.debug(error)
+		return False
+
+
+async def _requested_by_admin(scope: Scope) -> bool:
+	headers = Headers(scope=scope)
+	flag = headers.get("x-profile") or QueryParams(scope.get("query_string", b"")).get("profile")
+	if flag not in ("1", "true"):
+		return False
+	token = cookie_parser(headers.get("cookie", "")).get("authToken")
+	if not token:
+		return False
+	try:
+		username = jwt.decode(token, JWTSECRET, algorithms=[ALGORITHM]).get("preferred_username")
+	except Exception as error:
+		logger.debug(error)
+		return False
+	if not username:
+		return False
+	# Users listed in ADMIN_USERS are known without asking the database.
+	return username in ADMIN_USERS or await run_in_threadpool(_is_administrator, username)
+
+
+class ProfilingMiddleware:
+	"""
+	Attaches a `RequestProfile` to requests that are profiled on demand or, if the continuous
+	mode is enabled, to every request, keeping only those slower than the threshold.
+	"""
+
+	def __init__(self, app: ASGIApp, threshold_ms: float = SLOW_REQUEST_THRESHOLD_MS):
+		self.app = app
+		self.threshold_ms = threshold_ms
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		on_demand = await _requested_by_admin(scope)
+		if not on_demand and self.threshold_ms <= 0:
+			await self.app(scope, receive, send)
+			return
+
+		profile = RequestProfile(
+			id=generate(size=12), method=scope["method"], path=scope["path"], on_demand=on_demand,
+			interval=(PROFILER_SAMPLE_INTERVAL_MS if on_demand else
+					  PROFILER_CONTINUOUS_INTERVAL_MS) / 1000)
+		profile.threads.add(threading.get_ident())
+
+		async def send_with_profile(message: Message) -> None:
+			if message["type"] == "http.response.start":
+				profile.status_code = message["status"]
+				if on_demand:
+					MutableHeaders(raw=message["headers"])["X-Profile-Id"] = profile.id
+			await send(message)
+
+		token = current_profile.set(profile)
+		sampler.start(profile)
+		try:
+			await self.app(scope, receive, send_with_profile)
+		finally:
+			sampler.stop(profile)
+			current_profile.reset(token)
+			profile.duration_ms = (time.perf_counter() - profile._start) * 1000
+			if on_demand or profile.duration_ms >= self.threshold_ms:
+				profile_store.add(profile)
+				logger.info(
+					f"Captured profile {profile.id} for {profile.method} {profile.path} "
+					f"({profile.duration_ms:.1f} ms)")
@@ -0,0 +1,493 @@
+"""
+Call policy for all ArangoDB access.
+
+`ResilientHTTPClient` sits below every python-arango client created by `get_sys_client` and
+decides how each HTTP call is made:
+
+- Deadlines: `DeadlineMiddleware` gives every request a time budget (`REQUEST_DEADLINE_MS`,
+  lowered by the client's `X-Request-Timeout` header). Calls are sent with the remaining budget
+  as timeout and fail with 504 once it is used up. The deadline ends when the response starts,
+  so streamed bodies are only bound by the per-call timeout `DB_CALL_TIMEOUT`.
+- Retries: idempotent reads (GET/HEAD and AQL cursors without data modification) failing with a
+  connection error, a timeout or 503 are retried on another coordinator after a jittered
+  exponential backoff. Writes are only retried if the connection was never established. All
+  retries draw from one `RetryBudget`, so retries can't multiply the load of a struggling
+  database.
+- Circuit breakers: per coordinator and per tenant database. A circuit opens after
+  `DB_BREAKER_FAILURES` consecutive failures and fails calls with 503 right away until a probe
+  call succeeds `DB_BREAKER_RESET` seconds later.
+- Hedging: with `DB_HEDGE_AFTER_MS` set and several coordinators, an idempotent read still
+  pending after that delay is sent to a second coordinator as well; the first answer wins.
+
+Calls made on the event loop's thread, instead of through `run_in_threadpool`, are retried
+without backoff delay and never hedged, waiting there would stall every other request.
+
+Failures surface as `DatabaseUnavailable` (503) or `DeadlineExceeded` (504) without exposing
+upstream error details. Both are `HTTPException`s, not `ArangoError`s; code handling database
+errors of several databases at once has to catch them as well.
+"""
+import asyncio
+import contextvars
+import logging
+import math
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, \
+	TimeoutError as FutureTimeout, wait
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+import requests
+from arango.http import DefaultHTTPAdapter
+from arango.response import Response as ArangoResponse
+from fastapi import HTTPException
+from requests import Session
+from starlette import status
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from urllib3.exceptions import NewConnectionError
+
+from v1.config.config import DB_BREAKER_FAILURES, DB_BREAKER_RESET, DB_CALL_TIMEOUT, \
+	DB_HEDGE_AFTER_MS, DB_RETRY_ATTEMPTS, DB_RETRY_BACKOFF_MS, DB_RETRY_BUDGET_RATIO, \
+	DB_RETRY_MIN_PER_SECOND, REQUEST_DEADLINE_MS
+from v1.shared.routing import CoordinatorPool, RoutingHTTPClient
+
+# Not imported from v1.shared.shared, which builds its clients with ResilientHTTPClient.
+logger = logging.getLogger("cortex_backend")
+
+UNAVAILABLE_STATUS = (503, 504)
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, requests.exceptions.RetryError)
+# Data modification keywords of AQL. Queries mentioning them, even in strings or bind variables,
+# are conservatively treated as writes.
+WRITE_KEYWORDS = re.compile(rb"\b(INSERT|UPDATE|REPLACE|REMOVE|UPSERT)\b", re.IGNORECASE)
+TENANT_PATTERN = re.compile(r"^/_db/([^/]+)/")
+MAX_BACKOFF_MS = 1000
+HEDGE_WORKERS = 64
+
+
+class DatabaseUnavailable(HTTPException):
+	def __init__(self, detail: str = "Database temporarily unavailable",
+				 retry_after: float | None = None):
+		headers = {"Retry-After": str(math.ceil(retry_after))} if retry_after else None
+		super().__init__(
+			status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail, headers=headers)
+
+
+class DeadlineExceeded(HTTPException):
+	def __init__(self):
+		super().__init__(
+			status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+			detail="Request deadline exceeded while waiting for the database")
+
+
+@dataclass
+class Deadline:
+	at: float | None
+
+	def remaining(self) -> float | None:
+		return None if self.at is None else self.at - time.monotonic()
+
+
+request_deadline: ContextVar[Optional[Deadline]] = ContextVar("request_deadline", default=None)
+# Timeout of the call currently sent by this thread, read by `ResilientHTTPClient`.
+_attempt_timeout: ContextVar[Optional[float]] = ContextVar("attempt_timeout", default=None)
+
+
+def remaining_time() -> float | None:
+	"""
+	:return: Seconds left until the current request's deadline, None without a deadline.
+	"""
+	deadline = request_deadline.get()
+	return None if deadline is None else deadline.remaining()
+
+
+def lift_deadline() -> None:
+	"""
+	Remove the deadline of the current request, for endpoints that legitimately run for long,
+	like uploads.
+	"""
+	deadline = request_deadline.get()
+	if deadline is not None:
+		deadline.at = None
+
+
+class DeadlineMiddleware:
+	"""
+	Sets the deadline of each request to `default_ms` or, if lower, the client's
+	`X-Request-Timeout` in milliseconds.
+	"""
+
+	def __init__(self, app: ASGIApp, default_ms: float = REQUEST_DEADLINE_MS):
+		self.app = app
+		self.default_ms = default_ms
+
+	async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+		if scope["type"] != "http":
+			await self.app(scope, receive, send)
+			return
+		budget_ms = self.default_ms
+		try:
+			requested = float(Headers(scope=scope).get("x-request-timeout", "0"))
+		except ValueError:
+			requested = 0
+		if requested > 0:
+			budget_ms = min(budget_ms, requested) if budget_ms > 0 else requested
+		if budget_ms <= 0:
+			await self.app(scope, receive, send)
+			return
+
+		deadline = Deadline(at=time.monotonic() + budget_ms / 1000)
+
+		async def send_committed(message: Message) -> None:
+			if message["type"] == "http.response.start":
+				deadline.at = None
+			await send(message)
+
+		token = request_deadline.set(deadline)
+		try:
+			await self.app(scope, receive, send_committed)
+		finally:
+			request_deadline.reset(token)
+
+
+class RetryBudget:
+	"""
+	Token bucket limiting retries (and hedged calls) to `ratio` per call made plus
+	`minimum_per_second`.
+	"""
+
+	def __init__(self, ratio: float = DB_RETRY_BUDGET_RATIO,
+				 minimum_per_second: float = DB_RETRY_MIN_PER_SECOND):
+		self.ratio = ratio
+		self.minimum_per_second = minimum_per_second
+		self.capacity = max(10.0, minimum_per_second * 10)
+		self._tokens = self.capacity
+		self._updated = time.monotonic()
+		self._lock = threading.Lock()
+
+	def _refill(self) -> None:
+		now = time.monotonic()
+		self._tokens = min(
+			self.capacity, self._tokens + (now - self._updated) * self.minimum_per_second)
+		self._updated = now
+
+	def deposit(self) -> None:
+		with self._lock:
+			self._refill()
+			self._tokens = min(self.capacity, self._tokens + self.ratio)
+
+	def withdraw(self) -> bool:
+		with self._lock:
+			self._refill()
+			if self._tokens < 1:
+				return False
+			self._tokens -= 1
+			return True
+
+
+@dataclass
+class _Circuit:
+	failures: int = 0
+	opened: float | None = None
+	probing: float | None = None
+
+
+class CircuitBreakers:
+	"""
+	Consecutive failure counting circuit breakers by key. Only keys with recent failures are
+	kept. A probe that never reports back is given up after `reset` seconds.
+	"""
+
+	def __init__(self, failures: int = DB_BREAKER_FAILURES, reset: float = DB_BREAKER_RESET):
+		self.failures = failures
+		self.reset = reset
+		self._circuits: Dict[Hashable, _Circuit] = {}
+		self._lock = threading.Lock()
+
+	def allow(self, key: Hashable) -> bool:
+		"""
+		:return: Whether a call may be made. Once an open circuit's reset time passed, a single
+			probe call is allowed.
+		"""
+		with self._lock:
+			circuit = self._circuits.get(key)
+			if circuit is None or circuit.opened is None:
+				return True
+			now = time.monotonic()
+			if now - circuit.opened < self.reset:
+				return False
+			if circuit.probing is not None and now - circuit.probing < self.reset:
+				return False
+			circuit.probing = now
+			return True
+
+	def record(self, key: Hashable, ok: bool | None) -> None:
+		"""
+		:param ok: Outcome of the call, None if it says nothing about the key's health.
+		"""
+		with self._lock:
+			circuit = self._circuits.get(key)
+			if ok is None:
+				if circuit is not None:
+					circuit.probing = None
+				return
+			if ok:
+				if circuit is not None:
+					if circuit.opened is not None:
+						logger.info(f"Closed circuit of {key}")
+					del self._circuits[key]
+				return
+			if circuit is None:
+				circuit = self._circuits[key] = _Circuit()
+			circuit.failures += 1
+			circuit.probing = None
+			if circuit.opened is not None or circuit.failures >= self.failures:
+				if circuit.opened is None:
+					logger.warning(f"Opened circuit of {key} after {circuit.failures} failures")
+				circuit.opened = time.monotonic()
+
+	def retry_after(self, key: Hashable) -> float:
+		with self._lock:
+			circuit = self._circuits.get(key)
+			if circuit is None or circuit.opened is None:
+				return 0
+			return max(0.0, self.reset - (time.monotonic() - circuit.opened))
+
+
+retry_budget = RetryBudget()
+circuit_breakers = CircuitBreakers()
+_hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS, thread_name_prefix="db-hedge")
+
+
+def is_idempotent(method: str, path: str, data: Any) -> bool:
+	"""
+	:param path: Request path below the coordinator's URL.
+	:param data: Request body as sent by python-arango.
+	:return: Whether sending the call twice can't change data, i.e. reads and read-only AQL.
+	"""
+	method = method.lower()
+	if method in ("get", "head", "options"):
+		return True
+	if method != "post" or not path.split("?", 1)[0].endswith("/_api/cursor"):
+		return False
+	if isinstance(data, str):
+		data = data.encode()
+	return isinstance(data, bytes) and not WRITE_KEYWORDS.search(data)
+
+
+def _on_event_loop() -> bool:
+	"""
+	:return: Whether the calling thread runs an asyncio event loop.
+	"""
+	try:
+		asyncio.get_running_loop()
+	except RuntimeError:
+		return False
+	return True
+
+
+def _never_sent(error: Exception) -> bool:
+	"""
+	:return: Whether the call failed before a connection was established, so it is safe to
+		send it again.
+	"""
+	if isinstance(error, requests.ConnectTimeout):
+		return True
+	reason = getattr(error.args[0], "reason", None) if error.args else None
+	return isinstance(reason, NewConnectionError)
+
+
+@dataclass
+class _Call:
+	method: str
+	path: str
+	tenant: str | None
+	args: tuple
+	kwargs: dict
+
+
+class ResilientHTTPClient(RoutingHTTPClient):
+	"""
+	HTTP client applying the call policy of this module. Sessions for other coordinators are
+	created on demand, so retries and hedged calls can be sent to any of them.
+	"""
+
+	def __init__(self, pool: CoordinatorPool, budget: RetryBudget = retry_budget,
+				 breakers: CircuitBreakers = circuit_breakers,
+				 hedge_after_ms: float = DB_HEDGE_AFTER_MS, **kwargs):
+		kwargs.setdefault("request_timeout", DB_CALL_TIMEOUT)
+		# Retries are made here, with backoff and budget, instead of by urllib3.
+		kwargs["retry_attempts"] = 0
+		super().__init__(pool, **kwargs)
+		self.budget = budget
+		self.breakers = breakers
+		self.hedge_after = hedge_after_ms / 1000
+		self._sessions: Dict[int, Session] = {}
+		self._sessions_lock = threading.Lock()
+
+	@property
+	def request_timeout(self) -> float | None:
+		timeout = _attempt_timeout.get()
+		return self._request_timeout if timeout is None else timeout
+
+	@request_timeout.setter
+	def request_timeout(self, value: float | None) -> None:
+		self._request_timeout = value
+
+	def create_session(self, host: str) -> Session:
+		adapter = DefaultHTTPAdapter(
+			connection_timeout=self._request_timeout, pool_connections=self._pool_connections,
+			pool_maxsize=self._pool_maxsize, pool_timeout=self._pool_timeout, max_retries=0)
+		session = Session()
+		session.mount("https://", adapter)
+		session.mount("http://", adapter)
+		return session
+
+	def _session(self, index: int) -> Session:
+		with self._sessions_lock:
+			session = self._sessions.get(index)
+			if session is None:
+				session = self._sessions[index] = self.create_session(
+					self.pool.coordinators[index].url)
+			return session
+
+	def _host_key(self, index: int) -> Hashable:
+		return "host", self.pool.coordinators[index].url
+
+	def _select(self, preferred: int, tried: Set[int]) -> int:
+		"""
+		:return: The preferred coordinator, unless it was tried already or its circuit is open,
+			another one otherwise.
+		:raise DatabaseUnavailable: If the circuits of all coordinators are open.
+		"""
+		exclude = set(tried)
+		candidate = preferred if preferred not in tried else self.pool.pick(exclude)
+		for _ in range(len(self.pool.coordinators)):
+			if self.breakers.allow(self._host_key(candidate)):
+				return candidate
+			exclude.add(candidate)
+			candidate = self.pool.pick(exclude)
+		raise DatabaseUnavailable(retry_after=self.breakers.retry_after(self._host_key(preferred)))
+
+	def _attempt(self, index: int, call: _Call, timeout: float | None,
+				 shortened: bool) -> ArangoResponse:
+		token = _attempt_timeout.set(timeout)
+		try:
+			response = super().send_request(
+				self._session(index), call.method, self.pool.coordinators[index].url + call.path,
+				*call.args, **call.kwargs)
+		except RETRYABLE_ERRORS as error:
+			# A timeout cut short by the request's deadline says nothing about the database.
+			healthy = None if shortened and isinstance(error, requests.Timeout) else False
+			self.breakers.record(self._host_key(index), healthy)
+			if call.tenant is not None:
+				self.breakers.record(("tenant", call.tenant), healthy)
+			raise
+		finally:
+			_attempt_timeout.reset(token)
+		healthy = response.status_code not in UNAVAILABLE_STATUS
+		self.breakers.record(self._host_key(index), healthy or response.status_code != 503)
+		if call.tenant is not None:
+			self.breakers.record(("tenant", call.tenant), healthy)
+		return response
+
+	def _submit(self, fn: Callable[..., ArangoResponse], *args) -> Future:
+		# Every thread needs its own copy of the context, e.g. for the request profile.
+		return _hedge_executor.submit(contextvars.copy_context().run, fn, *args)
+
+	def _hedged(self, primary: int, tried: Set[int], call: _Call, timeout: float | None,
+				shortened: bool) -> ArangoResponse:
+		first = self._submit(self._attempt, primary, call, timeout, shortened)
+		try:
+			return first.result(timeout=self.hedge_after)
+		except FutureTimeout:
+			pass
+		secondary = self.pool.pick(tried | {primary})
+		if secondary == primary or not self.breakers.allow(self._host_key(secondary)) or \
+				not self.budget.withdraw():
+			return first.result()
+		logger.debug(f"Hedging {call.method.upper()} {call.path} to "
+					 f"{self.pool.coordinators[secondary].url}")
+		remaining = remaining_time()
+		if remaining is not None and timeout is not None:
+			timeout = min(timeout, remaining)
+		pending = {first, self._submit(self._attempt, secondary, call, timeout, shortened)}
+		response, error = None, None
+		while pending:
+			done, pending = wait(pending, return_when=FIRST_COMPLETED)
+			for future in done:
+				if future.exception() is not None:
+					error = error or future.exception()
+					continue
+				response = future.result()
+				if response.status_code not in UNAVAILABLE_STATUS:
+					return response
+		if response is not None:
+			return response
+		raise error
+
+	def send_request(self, session, method: str, url: str, *args, **kwargs) -> ArangoResponse:
+		index = self.pool.index_of(url)
+		if index is None:
+			return super().send_request(session, method, url, *args, **kwargs)
+		with self._sessions_lock:
+			self._sessions.setdefault(index, session)
+		path = url[len(self.pool.coordinators[index].url):]
+		tenant = TENANT_PATTERN.match(path)
+		call = _Call(method, path, tenant.group(1) if tenant else None, args, kwargs)
+		idempotent = is_idempotent(method, path, kwargs.get("data"))
+		on_loop = _on_event_loop()
+		hedge = idempotent and self.hedge_after > 0 and len(self.pool.coordinators) > 1 and \
+			not on_loop
+
+		remaining = remaining_time()
+		if remaining is not None and remaining <= 0:
+			raise DeadlineExceeded()
+		if call.tenant is not None and not self.breakers.allow(("tenant", call.tenant)):
+			raise DatabaseUnavailable(
+				retry_after=self.breakers.retry_after(("tenant", call.tenant)))
+		self.budget.deposit()
+		tried: Set[int] = set()
+		attempt = 0
+		while True:
+			index = self._select(index, tried)
+			timeout, shortened = self._request_timeout, False
+			remaining = remaining_time()
+			if remaining is not None and (timeout is None or remaining < timeout):
+				if remaining <= 0:
+					raise DeadlineExceeded()
+				timeout, shortened = remaining, True
+			failure: Exception | None = None
+			try:
+				if hedge:
+					response = self._hedged(index, tried, call, timeout, shortened)
+				else:
+					response = self._attempt(index, call, timeout, shortened)
+			except RETRYABLE_ERRORS as error:
+				failure = error
+			else:
+				if response.status_code not in UNAVAILABLE_STATUS:
+					return response
+
+			retryable = idempotent or (failure is not None and _never_sent(failure))
+			if retryable and attempt < DB_RETRY_ATTEMPTS and self.budget.withdraw():
+				delay = 0 if on_loop else random.uniform(0, min(
+					MAX_BACKOFF_MS, DB_RETRY_BACKOFF_MS * 2 ** attempt)) / 1000
+				remaining = remaining_time()
+				if remaining is None or remaining > delay:
+					logger.debug(f"Retrying {method.upper()} {path} in {delay * 1000:.0f} ms")
+					if delay:
+						time.sleep(delay)
+					tried.add(index)
+					attempt += 1
+					continue
+			if failure is None:
+				logger.warning(f"{method.upper()} {path} answered {response.status_code}")
+				raise DatabaseUnavailable()
+			if shortened and isinstance(failure, requests.Timeout):
+				raise DeadlineExceeded() from failure
+			logger.error(f"{method.upper()} {path} failed: {failure}")
+			raise DatabaseUnavailable() from failure
@@ -0,0 +1,197 @@
+"""
+Client side load balancing across ArangoDB cluster coordinators.
+
+`BASE_DB_URL` may list several coordinators. Every python-arango client shares the module's
+`CoordinatorPool`, which picks a coordinator per request (round robin or least outstanding
+requests), ejects coordinators after `DB_EJECT_AFTER_FAILURES` consecutive connection failures
+or 503 responses and re-admits them once their availability endpoint answers again. Requests
+failing on one coordinator are retried on the next one (see `v1.shared.resilience`), so losing a
+coordinator only costs the failed attempt.
+
+Read-only queries pass `allow_dirty_read=DB_READ_FROM_FOLLOWERS` to let the coordinator answer
+them from shard followers as well.
+"""
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import List, Optional, Set
+
+import requests
+from arango.resolver import HostResolver
+from arango.response import Response as ArangoResponse
+
+from v1.config.config import BASE_DB_HOSTS, DB_EJECT_AFTER_FAILURES, DB_HEALTH_CHECK_INTERVAL, \
+	DB_ROUTING_STRATEGY
+from v1.shared.profiling import TimedHTTPClient
+
+# Not imported from v1.shared.shared, which builds its clients with RoutingHTTPClient.
+logger = logging.getLogger("cortex_backend")
+
+HEALTH_ENDPOINT = "/_admin/server/availability"
+HEALTH_CHECK_TIMEOUT = 2
+
+
+@dataclass
+class Coordinator:
+	url: str
+	outstanding: int = 0
+	failures: int = 0
+	healthy: bool = True
+
+
+class CoordinatorPool:
+	"""
+	Health and load of the configured coordinators, shared by all clients of the process.
+	"""
+
+	def __init__(self, hosts: List[str], strategy: str = DB_ROUTING_STRATEGY,
+				 eject_after: int = DB_EJECT_AFTER_FAILURES,
+				 check_interval: float = DB_HEALTH_CHECK_INTERVAL):
+		self.coordinators = [Coordinator(url=host.rstrip("/")) for host in hosts]
+		self.strategy = strategy
+		self.eject_after = eject_after
+		self.check_interval = check_interval
+		self._turn = itertools.count()
+		self._lock = threading.Lock()
+		self._checker: threading.Thread | None = None
+
+	@property
+	def hosts(self) -> List[str]:
+		return [coordinator.url for coordinator in self.coordinators]
+
+	def index_of(self, url: str) -> int | None:
+		for index, coordinator in enumerate(self.coordinators):
+			if url.startswith(coordinator.url + "/") or url == coordinator.url:
+				return index
+		return None
+
+	def pick(self, exclude: Optional[Set[int]] = None) -> int:
+		"""
+		:param exclude: Coordinators that already failed for the current request.
+		:return: Index of the coordinator for the next attempt. Ejected coordinators are only
+			used if no healthy one is left.
+		"""
+		exclude = exclude or set()
+		with self._lock:
+			candidates = [index for index, coordinator in enumerate(self.coordinators) if
+						  coordinator.healthy and index not in exclude]
+			if not candidates:
+				candidates = [index for index in range(len(self.coordinators)) if
+							  index not in exclude] or list(range(len(self.coordinators)))
+			turn = next(self._turn)
+			if self.strategy == "least_outstanding":
+				# Rotating the start keeps ties distributed instead of piling on the first host.
+				rotated = candidates[turn % len(candidates):] + candidates[:turn % len(candidates)]
+				return min(rotated, key=lambda index: self.coordinators[index].outstanding)
+			return candidates[turn % len(candidates)]
+
+	def begin(self, index: int) -> None:
+		with self._lock:
+			self.coordinators[index].outstanding += 1
+
+	def end(self, index: int, ok: bool) -> None:
+		with self._lock:
+			coordinator = self.coordinators[index]
+			coordinator.outstanding -= 1
+			if ok:
+				coordinator.failures = 0
+				return
+			coordinator.failures += 1
+			if coordinator.healthy and coordinator.failures >= self.eject_after:
+				coordinator.healthy = False
+				logger.warning(f"Ejected coordinator {coordinator.url} after "
+							   f"{coordinator.failures} failures")
+
+	def check(self) -> None:
+		"""
+		Probe every coordinator's availability endpoint. Ejected coordinators answering again
+		are re-admitted, failing ones count towards their ejection.
+		"""
+		for index, coordinator in enumerate(self.coordinators):
+			try:
+				available = requests.get(
+					coordinator.url + HEALTH_ENDPOINT, timeout=HEALTH_CHECK_TIMEOUT).ok
+			except requests.RequestException:
+				available = False
+			if not available:
+				self.begin(index)
+				self.end(index, False)
+				continue
+			with self._lock:
+				coordinator.failures = 0
+				if not coordinator.healthy:
+					coordinator.healthy = True
+					logger.info(f"Re-admitted coordinator {coordinator.url}")
+
+	def start_health_checks(self) -> None:
+		"""
+		Run `check` every `check_interval` seconds in a daemon thread, if there is more than one
+		coordinator to choose from.
+		"""
+		if len(self.coordinators) < 2 or self.check_interval <= 0:
+			return
+		if self._checker is not None and self._checker.is_alive():
+			return
+
+		def loop():
+			while True:
+				time.sleep(self.check_interval)
+				try:
+					self.check()
+				except Exception as error:
+					logger.error(f"Coordinator health check failed: {error}")
+
+		self._checker = threading.Thread(target=loop, name="coordinator-health", daemon=True)
+		self._checker.start()
+
+
+class PoolHostResolver(HostResolver):
+	"""
+	python-arango host resolver delegating the choice to a `CoordinatorPool`. Clients have to be
+	created with the pool's hosts in the pool's order.
+	"""
+
+	def __init__(self, pool: CoordinatorPool):
+		super().__init__(len(pool.coordinators))
+		self.pool = pool
+
+	def get_host_index(self, indexes_to_filter: Optional[Set[int]] = None) -> int:
+		return self.pool.pick(indexes_to_filter)
+
+
+class RoutingHTTPClient(TimedHTTPClient):
+	"""
+	HTTP client tracking outstanding requests and failures per coordinator. With several
+	coordinators, failed connection attempts and 503 responses aren't retried on the same host;
+	python-arango moves on to the next coordinator instead.
+	"""
+
+	def __init__(self, pool: CoordinatorPool, **kwargs):
+		if len(pool.coordinators) > 1:
+			kwargs.setdefault("retry_attempts", 0)
+		super().__init__(**kwargs)
+		self.pool = pool
+
+	def send_request(self, session, method: str, url: str, *args, **kwargs) -> ArangoResponse:
+		index = self.pool.index_of(url)
+		if index is None:
+			return super().send_request(session, method, url, *args, **kwargs)
+		self.pool.begin(index)
+		ok = False
+		try:
+			response = super().send_request(session, method, url, *args, **kwargs)
+			ok = response.status_code != 503
+			return response
+		except requests.exceptions.RetryError as error:
+			if len(self.pool.coordinators) < 2:
+				raise
+			# A 503 rejected by urllib3's retry policy, let python-arango try the next host.
+			raise requests.ConnectionError(error) from error
+		finally:
+			self.pool.end(index, ok)
+
+
+coordinator_pool = CoordinatorPool(BASE_DB_HOSTS)
+
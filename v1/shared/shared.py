@@ -1,14 +1,15 @@
 import logging
-from typing import Annotated
+from typing import Dict
 
 from arango import ArangoClient
 from arango.database import StandardDatabase
 from fastapi import HTTPException, Request
-from fastapi.params import Depends
 from starlette import status
 
-from v1.config.config import ARANGO_ROOT_PW, BASE_DB_URL
+from v1.config.config import ADMIN_USERS, ARANGO_ROOT_PW
 from v1.models.models import User
+from v1.shared.resilience import ResilientHTTPClient
+from v1.shared.routing import PoolHostResolver, coordinator_pool
 
 
 def get_sys_client() -> ArangoClient:
@@ -17,7 +18,9 @@ def get_sys_client() -> ArangoClient:
 	@return:
 	@rtype:
 	"""
-	return ArangoClient(hosts=BASE_DB_URL)
+	return ArangoClient(
+		hosts=coordinator_pool.hosts, host_resolver=PoolHostResolver(coordinator_pool),
+		http_client=ResilientHTTPClient(coordinator_pool))
 
 
 def get_sys_db() -> StandardDatabase:
@@ -34,10 +37,30 @@ def get_sys_db() -> StandardDatabase:
 	return db
 
 
+def is_administrator(user: User) -> bool:
+	"""
+	:return: Whether the user is a superuser or configured as administrator via `ADMIN_USERS`.
+	:rtype: bool
+	"""
+	return user.is_superuser or user.username in ADMIN_USERS
+
+
+def tenant_database(user: User) -> str:
+	"""
+	:param user: The user whose tenant database is requested.
+	:type user: User
+	:return: Name of the user's tenant database. Users registered from the tenant pool are bound
+		to a database via `extra.database`, older users own a database named after them.
+	:rtype: str
+	"""
+	return user.extra.database or user.username
+
+
 async def get_current_user_db(request: Request, ):
 	"""
-	Dependency used for connecting a user to the main database.
-	TODO: Implement Access-control for multi-tenancy.
+	Dependency used for connecting a user to the main database. ArangoDB enforces access per
+	database with the user's token, access to single documents is enforced by the `acl` filters
+	of `v1.shared.acl`.
 	@param request:
 	@type request:
 	@return:
@@ -88,12 +111,18 @@ async def read_auth_cookie(request: Request) -> str | None:
 	return None
 
 
-async def get_available_databases(request: Request, current_user: Annotated[User, Depends()]):
+def get_available_databases(username: str) -> Dict[str, str]:
 	"""
-	Guard function to check whether the database is accessible to the user trying to access it.
-	@param request: The request object. Passed to function automatically if declared inside a
-		FastAPI Dependency inside a function signature.
-	@type request: Request
-	@return: Dict[str,Any]
+	Guard function to check which databases are accessible to a user.
+	@param username: The user's name.
+	@type username: str
+	@return: Names of all databases the user can read, mapped to the permission level.
+	@rtype: Dict[str, str]
 	"""
-	raise NotImplementedError
+	available = {}
+	for name, permission in get_sys_db().permissions(username).items():
+		# With `full` permissions, levels are nested next to the collection permissions.
+		level = permission.get("permission") if isinstance(permission, dict) else permission
+		if name not in ("_system", "*") and level in ("rw", "ro"):
+			available[name] = level
+	return available
@@ -0,0 +1,178 @@
+"""
+Pool of pre-provisioned tenant databases.
+
+Registration claims a spare database instead of provisioning one, which makes it independent of
+the number of existing users and collections. ArangoDB can't rename databases, so a claimed
+spare keeps its generated name and is bound to the user through `extra.database` of the user
+record. The pool's bookkeeping lives in the `TenantPool` collection of the `_system` database,
+so several API workers can share one pool. A lease document in the same collection keeps
+workers of different processes from refilling the pool at the same time.
+"""
+import threading
+import time
+import uuid
+
+from arango.exceptions import ArangoServerError
+from nanoid import generate
+
+from v1.config.config import TENANT_POOL_SIZE
+from v1.shared.initialize import provision_tenant
+from v1.shared.shared import get_sys_db, logger
+
+POOL_COLLECTION = "TenantPool"
+SPARE_PREFIX = "tenant_"
+SPARE_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+REFILL_LEASE = "refill-lease"
+# A refill not finished within this time is assumed dead and its lease may be taken over.
+REFILL_LEASE_MS = 15 * 60 * 1000
+ERR_CONFLICT = 1200
+ERR_UNIQUE_CONSTRAINT_VIOLATED = 1210
+
+CLAIM_SPARE_AQL = """
+FOR spare IN @@pool
+	FILTER spare.state == "spare"
+	SORT spare.created
+	LIMIT 1
+	UPDATE spare WITH {state: "claimed", owner: @owner, claimed: DATE_NOW()} IN @@pool
+	OPTIONS {ignoreRevs: false}
+	RETURN NEW._key"""
+
+RELEASE_SPARE_AQL = """
+FOR spare IN @@pool
+	FILTER spare._key == @database AND spare.state == "claimed" AND spare.owner == @owner
+	UPDATE spare WITH {state: "spare", owner: null, claimed: null} IN @@pool
+	OPTIONS {keepNull: false}
+	RETURN NEW._key"""
+
+ACQUIRE_LEASE_AQL = """
+UPSERT {_key: @lease}
+INSERT {_key: @lease, state: "lease", holder: @holder, expires: DATE_NOW() + @ttl}
+UPDATE OLD.expires < DATE_NOW() ? {holder: @holder, expires: DATE_NOW() + @ttl} : {}
+IN @@pool
+OPTIONS {ignoreRevs: false}
+RETURN NEW.holder == @holder"""
+
+RELEASE_LEASE_AQL = """
+FOR lease IN @@pool
+	FILTER lease._key == @lease AND lease.holder == @holder
+	REMOVE lease IN @@pool"""
+
+COUNT_SPARES_AQL = """
+RETURN LENGTH(FOR spare IN @@pool FILTER spare.state == "spare" RETURN 1)"""
+
+
+class TenantPool:
+	"""
+	Keeps `size` spare tenant databases provisioned and hands them out to new users.
+	"""
+
+	def __init__(self, size: int = TENANT_POOL_SIZE):
+		self.size = size
+		self._refill_lock = threading.Lock()
+		self._collection_ready = False
+
+	def _pool_db(self):
+		db = get_sys_db()
+		if not self._collection_ready:
+			if not db.has_collection(POOL_COLLECTION):
+				db.create_collection(POOL_COLLECTION)
+			self._collection_ready = True
+		return db
+
+	def claim(self, owner: str, attempts: int = 3) -> str | None:
+		"""
+		Atomically claim a spare database. Concurrent claims of the same spare conflict on its
+		revision; the loser retries with the next spare.
+
+		@param owner: Username the database is claimed for.
+		@type owner: str
+		@return: Name of the claimed database or None, if the pool is empty.
+		@rtype: str | None
+		"""
+		if self.size <= 0:
+			return None
+		db = self._pool_db()
+		for _ in range(attempts):
+			try:
+				claimed = list(db.aql.execute(
+					CLAIM_SPARE_AQL, bind_vars={"@pool": POOL_COLLECTION, "owner": owner}))
+			except ArangoServerError as error:
+				if error.error_code == ERR_CONFLICT:
+					continue
+				logger.error(f"Unable to claim a spare tenant database: {error}")
+				return None
+			if claimed:
+				logger.info(f"Claimed spare tenant database {claimed[0]} for {owner}")
+				return claimed[0]
+			return None
+		return None
+
+	def release(self, database: str, owner: str) -> None:
+		"""
+		Return a claimed database to the pool, e.g. when the registration it was claimed for
+		failed. Only a database still claimed by `owner` is released.
+
+		@param database: Name of the claimed database.
+		@param owner: Username the database was claimed for.
+		"""
+		try:
+			released = list(self._pool_db().aql.execute(RELEASE_SPARE_AQL, bind_vars={
+				"@pool": POOL_COLLECTION, "database": database, "owner": owner
+			}))
+		except ArangoServerError as error:
+			logger.error(f"Unable to release tenant database {database}: {error}")
+			return
+		if released:
+			logger.info(f"Released tenant database {database} claimed for {owner}")
+
+	def _acquire_lease(self, db, holder: str) -> bool:
+		try:
+			return next(db.aql.execute(ACQUIRE_LEASE_AQL, bind_vars={
+				"@pool": POOL_COLLECTION, "lease": REFILL_LEASE, "holder": holder,
+				"ttl"  : REFILL_LEASE_MS
+			}))
+		except ArangoServerError as error:
+			# A concurrent worker inserted or renewed the lease first.
+			if error.error_code in (ERR_CONFLICT, ERR_UNIQUE_CONSTRAINT_VIOLATED):
+				return False
+			raise
+
+	def refill(self) -> None:
+		"""
+		Provision spares until the pool holds `size` of them. The thread lock keeps one refill
+		per process; the lease document in the pool collection keeps one refill across all
+		processes sharing the pool.
+		"""
+		if self.size <= 0 or not self._refill_lock.acquire(blocking=False):
+			return
+		holder = uuid.uuid4().hex
+		leased = False
+		try:
+			db = self._pool_db()
+			leased = self._acquire_lease(db, holder)
+			if not leased:
+				return
+			spares = next(db.aql.execute(COUNT_SPARES_AQL, bind_vars={"@pool": POOL_COLLECTION}))
+			for _ in range(self.size - spares):
+				name = SPARE_PREFIX + generate(SPARE_ALPHABET, 16)
+				provision_tenant(name)
+				db.collection(POOL_COLLECTION).insert(
+					{"_key": name, "state": "spare", "created": time.time()})
+				logger.info(f"Provisioned spare tenant database {name}")
+		except Exception as error:
+			logger.error(f"Refilling the tenant pool failed: {error}")
+		finally:
+			if leased:
+				try:
+					db.aql.execute(RELEASE_LEASE_AQL, bind_vars={
+						"@pool": POOL_COLLECTION, "lease": REFILL_LEASE, "holder": holder
+					})
+				except ArangoServerError as error:
+					logger.error(f"Unable to release the tenant pool refill lease: {error}")
+			self._refill_lock.release()
+
+	def refill_in_background(self) -> None:
+		threading.Thread(target=self.refill, name="tenant-pool-refill", daemon=True).start()
+
+
+tenant_pool = TenantPool()
@@ -0,0 +1,18 @@
+from typing import Dict, List
+
+from pydantic import BaseModel, Field
+
+
+class ConnectedEntity(BaseModel):
+	id: str
+	degree: int
+
+
+class GraphStats(BaseModel):
+	vertices: Dict[str, int] = Field(..., description="Documents per vertex collection.")
+	edges: Dict[str, int] = Field(..., description="Edges per relation of the core graph.")
+	degree_histogram: Dict[str, int] = Field(
+		..., description="Vertices per degree range, ranges are powers of two.")
+	top_connected: List[ConnectedEntity]
+	reconciled: float = Field(..., description="When the figures were last reconciled.")
+	updated: float = Field(..., description="When the figures last changed.")
@@ -0,0 +1,33 @@
+from typing import Annotated
+
+from arango.database import StandardDatabase
+from fastapi import APIRouter, Depends
+from starlette import status
+
+from v1.auth.utils import get_current_active_user, get_current_active_user_db
+from v1.models.models import User
+from v1.shared.coalesce import permission_scope
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+from v1.stats.models import GraphStats
+from v1.stats.utils import graph_stats
+
+stats_router = APIRouter(
+	prefix="/stats", tags=["Statistics"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
+
+
+@stats_router.get(
+	"", response_model=GraphStats,
+	responses={status.HTTP_202_ACCEPTED: {"description": "The statistics are still loading."}},
+	description="Counts per collection and relation, the degree histogram and the most connected "
+				"entities of your tenant, maintained in memory. The first request starts loading "
+				"them and is answered with 202 until they are ready.")
+async def get_stats(db: Annotated[StandardDatabase, Depends(get_current_active_user_db)],
+					current_user: Annotated[User, Depends(get_current_active_user)]):
+	await permission_scope(current_user.username, db.name)
+	statistics = graph_stats.get(db.name)
+	if not statistics.loaded:
+		return NegotiatedResponse(
+			{"detail": "Statistics are loading, retry shortly"},
+			status_code=status.HTTP_202_ACCEPTED, headers={"Retry-After": "5"})
+	return statistics.snapshot()
@@ -0,0 +1,300 @@
+"""
+Materialised graph statistics per tenant.
+
+Counts per collection, edge counts per core graph relation, the degree of every connected
+vertex and a degree histogram are loaded from ArangoDB by a background thread once first
+requested, then kept up to date by the API's write paths. The same thread reconciles every
+loaded tenant against ArangoDB every `STATS_RECONCILE_INTERVAL` seconds, which also repairs
+drift caused by writes bypassing the API. Reads are served from a snapshot that is only rebuilt
+after a change; the list of top connected entities is refreshed at most every
+`STATS_TOP_REFRESH` seconds.
+"""
+import heapq
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from arango.database import StandardDatabase
+
+from v1.config.config import ARANGO_ROOT_PW, STATS_RECONCILE_INTERVAL, STATS_TOP_K, \
+	STATS_TOP_REFRESH
+from v1.objects.edges.utils import core_graph_edge_collections
+from v1.shared.shared import get_sys_client, logger
+
+DEGREES_AQL = """
+FOR e IN @@edges
+	FOR vertex IN [e._from, e._to]
+	COLLECT id = vertex WITH COUNT INTO degree
+	RETURN [id, degree]"""
+
+
+def degree_bucket(degree: int) -> str:
+	"""
+	:return: Label of the power of two range containing the degree, e.g. "4-7".
+	"""
+	if degree <= 1:
+		return str(degree)
+	low = 1 << (degree.bit_length() - 1)
+	return f"{low}-{2 * low - 1}"
+
+
+class TenantStatistics:
+	def __init__(self, database: str, vertices: Counter, edges: Counter, degrees: Counter,
+				 loaded: bool = True):
+		"""
+		:param loaded: False for a placeholder whose figures are still being loaded.
+		"""
+		self.database = database
+		self.vertices = vertices
+		self.edges = edges
+		self.degrees = degrees
+		self.histogram = Counter(degree_bucket(degree) for degree in degrees.values())
+		self.loaded = loaded
+		self.reconciled = self.updated = time.time()
+		# Journal positions at which a scan counted a collection and read an edge collection's
+		# degrees, changes journaled before them are part of the scan.
+		self.counted_at: Dict[str, int] = {}
+		self.degrees_at: Dict[str, int] = {}
+		self._lock = threading.Lock()
+		self._snapshot: Dict[str, Any] | None = None
+		self._top: list = []
+		self._top_refreshed = 0.0
+		self._top_dirty = True
+		# Changes applied while a reconciliation scans the database, in order, replayed onto its
+		# result as far as the scan didn't see them.
+		self._journal: List[Tuple[Dict[str, int], Dict[str, int], List[Tuple[str, str, int]]]] \
+			| None = None
+
+	def _set_degree(self, vertex: str, change: int) -> None:
+		old = self.degrees.get(vertex, 0)
+		new = max(old + change, 0)
+		if old:
+			self.histogram[degree_bucket(old)] -= 1
+		if new:
+			self.degrees[vertex] = new
+			self.histogram[degree_bucket(new)] += 1
+		else:
+			self.degrees.pop(vertex, None)
+
+	def apply(self, vertices: Dict[str, int] | None = None, edges: Dict[str, int] | None = None,
+			  degrees: Iterable[Tuple[str, str, int]] = ()) -> None:
+		"""
+		Apply changes, all given as deltas: documents per collection, edges per relation and
+		degree changes as `(edge collection, vertex id, change)`.
+		"""
+		degrees = list(degrees)
+		with self._lock:
+			if self._journal is not None:
+				self._journal.append((dict(vertices or {}), dict(edges or {}), degrees))
+			self._apply(vertices, edges, degrees)
+
+	def _apply(self, vertices: Dict[str, int] | None, edges: Dict[str, int] | None,
+			   degrees: List[Tuple[str, str, int]]) -> None:
+		for collection, change in (vertices or {}).items():
+			self.vertices[collection] = max(self.vertices[collection] + change, 0)
+		for collection, change in (edges or {}).items():
+			self.edges[collection] = max(self.edges[collection] + change, 0)
+		for _, vertex, change in degrees:
+			self._set_degree(vertex, change)
+			self._top_dirty = True
+		self._snapshot = None
+		self.updated = time.time()
+
+	def begin_reconcile(self) -> None:
+		"""
+		Start journaling changes, call before scanning the database for `finish_reconcile`.
+		"""
+		with self._lock:
+			self._journal = []
+
+	def journal_position(self) -> int:
+		"""
+		:return: Number of changes journaled since `begin_reconcile`. A scan records it right
+			before reading a collection, the changes journaled until then are part of what it
+			reads.
+		"""
+		with self._lock:
+			return len(self._journal or ())
+
+	def finish_reconcile(self, scanned: "TenantStatistics | None") -> None:
+		"""
+		Take over the counts of a scan started after `begin_reconcile`. The changes journaled
+		since then are replayed under the same lock `apply` uses, each collection's only from
+		the journal position the scan read it at, so changes are neither lost nor counted twice.
+		Writes are recorded after they happened, a write racing with the read of its collection
+		may still be counted twice until the next reconciliation.
+
+		:param scanned: Result of the scan, None if it failed.
+		"""
+		with self._lock:
+			journal, self._journal = self._journal, None
+			if scanned is None:
+				return
+			self.vertices, self.edges = scanned.vertices, scanned.edges
+			self.degrees, self.histogram = scanned.degrees, scanned.histogram
+			for position, (vertices, edges, degrees) in enumerate(journal or []):
+				self._apply(
+					{name: change for name, change in vertices.items() if
+					 position >= scanned.counted_at.get(name, 0)},
+					{name: change for name, change in edges.items() if
+					 position >= scanned.counted_at.get(name, 0)},
+					[change for change in degrees if
+					 position >= scanned.degrees_at.get(change[0], 0)])
+			self.loaded = True
+			self.reconciled = scanned.reconciled
+			self._snapshot = None
+			self._top_dirty = True
+
+	def snapshot(self) -> Dict[str, Any]:
+		with self._lock:
+			now = time.monotonic()
+			if self._top_dirty and now - self._top_refreshed >= STATS_TOP_REFRESH:
+				self._top = [
+					{"id": vertex, "degree": degree} for vertex, degree in
+					heapq.nlargest(STATS_TOP_K, self.degrees.items(), key=lambda item: item[1])]
+				self._top_refreshed = now
+				self._top_dirty = False
+				self._snapshot = None
+			if self._snapshot is None:
+				connected = sum(self.histogram.values())
+				histogram = {"0": max(sum(self.vertices.values()) - connected, 0)}
+				histogram.update(
+					(bucket, count) for bucket, count in
+					sorted(self.histogram.items(), key=lambda item: int(item[0].split("-")[0]))
+					if count)
+				self._snapshot = {
+					"vertices"        : dict(self.vertices), "edges": dict(self.edges),
+					"degree_histogram": histogram, "top_connected": self._top,
+					"reconciled"      : self.reconciled, "updated": self.updated,
+				}
+			return self._snapshot
+
+
+def load_statistics(db: StandardDatabase,
+					journal_position: Callable[[], int] = lambda: 0) -> TenantStatistics:
+	"""
+	Compute the statistics of a tenant from scratch: one count per collection and one scan per
+	core graph edge collection.
+
+	:param journal_position: `TenantStatistics.journal_position` of the statistics being
+		reconciled, recorded before reading each collection.
+	"""
+	vertices, edges, degrees = Counter(), Counter(), Counter()
+	counted_at, degrees_at = {}, {}
+	for collection in db.collections():
+		if collection["system"]:
+			continue
+		counted_at[collection["name"]] = journal_position()
+		count = db.collection(collection["name"]).count()
+		if collection["type"] == "edge":
+			if collection["name"] in core_graph_edge_collections:
+				edges[collection["name"]] = count
+		else:
+			vertices[collection["name"]] = count
+	for edge_collection in edges:
+		degrees_at[edge_collection] = journal_position()
+		for vertex, degree in db.aql.execute(
+				DEGREES_AQL, bind_vars={"@edges": edge_collection}, stream=True):
+			degrees[vertex] += degree
+	statistics = TenantStatistics(db.name, vertices, edges, degrees)
+	statistics.counted_at, statistics.degrees_at = counted_at, degrees_at
+	return statistics
+
+
+class GraphStatistics:
+	"""
+	Statistics of all tenants that were requested at least once in this process.
+	"""
+
+	def __init__(self, reconcile_interval: float = STATS_RECONCILE_INTERVAL):
+		self.reconcile_interval = reconcile_interval
+		self._tenants: Dict[str, TenantStatistics] = {}
+		self._lock = threading.Lock()
+		self._wake = threading.Event()
+		self._reconciler: threading.Thread | None = None
+
+	def get(self, database: str) -> TenantStatistics:
+		"""
+		:return: The tenant's statistics. On the first request a placeholder that isn't
+			`loaded` yet, the background thread loads the figures.
+		"""
+		statistics = self._tenants.get(database)
+		if statistics is None:
+			with self._lock:
+				statistics = self._tenants.setdefault(database, TenantStatistics(
+					database, Counter(), Counter(), Counter(), loaded=False))
+			self.reconcile_in_background()
+			self._wake.set()
+		return statistics
+
+	def record(self, database: str, vertices: Dict[str, int] | None = None,
+			   edges: Iterable[Tuple[str, str, str]] = (), edge_change: int = 1) -> None:
+		"""
+		Record writes of a tenant. Tenants never requested are skipped, they are
+		computed from the database once requested.
+
+		:param vertices: Change of the document count per collection.
+		:param edges: `(collection, from, to)` of inserted or, with `edge_change=-1`, removed
+			edges.
+		"""
+		statistics = self._tenants.get(database)
+		if statistics is None:
+			return
+		edge_counts: Counter = Counter()
+		degrees = []
+		for collection, from_id, to_id in edges:
+			edge_counts[collection] += edge_change
+			degrees.extend(
+				((collection, from_id, edge_change), (collection, to_id, edge_change)))
+		statistics.apply(vertices, edge_counts, degrees)
+
+	def invalidate(self, database: str) -> None:
+		"""
+		Drop a tenant's statistics after bulk changes, e.g. a restore.
+		"""
+		self._tenants.pop(database, None)
+
+	def reconcile(self) -> None:
+		"""
+		Load the tenants requested since the last run and rescan every loaded tenant whose
+		statistics are older than `reconcile_interval`, if reconciliation is enabled. This runs
+		in a background thread outside of any request, so there is no user token to connect
+		with; like the other maintenance threads it uses the root account, and it only reads
+		counts and edge endpoints.
+		"""
+		for database in list(self._tenants):
+			statistics = self._tenants.get(database)
+			if statistics is None or statistics.loaded and (
+					self.reconcile_interval <= 0 or
+					time.time() - statistics.reconciled < self.reconcile_interval):
+				continue
+			statistics.begin_reconcile()
+			scanned = None
+			try:
+				db = get_sys_client().db(database, username="root", password=ARANGO_ROOT_PW)
+				scanned = load_statistics(db, statistics.journal_position)
+			except Exception as error:
+				logger.error(f"Loading graph statistics of {database} failed: {error}")
+			finally:
+				statistics.finish_reconcile(scanned)
+
+	def reconcile_in_background(self) -> None:
+		with self._lock:
+			if self._reconciler is not None and self._reconciler.is_alive():
+				return
+
+			def loop():
+				while True:
+					# Woken early by tenants requested for the first time.
+					self._wake.wait(
+						min(self.reconcile_interval, 60) if self.reconcile_interval > 0 else 60)
+					self._wake.clear()
+					self.reconcile()
+
+			self._reconciler = threading.Thread(
+				target=loop, name="graph-stats-reconciler", daemon=True)
+			self._reconciler.start()
+
+
+graph_stats = GraphStatistics()
@@ -0,0 +1,95 @@
+import time
+from typing import Annotated, List
+
+from arango.database import StandardDatabase
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette import status
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+from v1.analytics.utils import rollup_cache
+from v1.auth.utils import get_current_active_user
+from v1.config.config import ARANGO_ROOT_PW
+from v1.models.models import User
+from v1.shared.acl import get_principals, principal_cache
+from v1.shared.catalog import schema_catalog
+from v1.shared.encoding import NegotiatedResponse, NegotiatedRoute
+from v1.shared.resilience import lift_deadline
+from v1.shared.shared import get_sys_client, get_sys_db, is_administrator, read_auth_cookie, \
+	tenant_database
+from v1.stats.utils import graph_stats
+from v1.tenants.utils import TenantRestorer, iter_dump
+
+tenants_router = APIRouter(
+	prefix="/tenants", tags=["Tenants"], route_class=NegotiatedRoute,
+	default_response_class=NegotiatedResponse)
+
+
+def _connect(current_user: User, auth_token: str | None, database: str | None,
+			 create: bool = False) -> StandardDatabase:
+	"""
+	Connect to the caller's own tenant database, or, for admins, to any database. Admins
+	restoring into a database that doesn't exist yet get it created.
+	"""
+	own_database = tenant_database(current_user)
+	if database is None or database == own_database:
+		return get_sys_client().db(own_database, user_token=auth_token)
+	if not is_administrator(current_user):
+		raise HTTPException(
+			status_code=status.HTTP_403_FORBIDDEN,
+			detail="Only admins may dump or restore other tenants")
+	if database == "_system":
+		raise HTTPException(
+			status_code=status.HTTP_400_BAD_REQUEST, detail="The system database can't be used")
+	sys_db = get_sys_db()
+	if not sys_db.has_database(database):
+		if not create:
+			raise HTTPException(
+				status_code=status.HTTP_404_NOT_FOUND, detail=f"Database {database} not found")
+		sys_db.create_database(database)
+	return get_sys_client().db(database, username="root", password=ARANGO_ROOT_PW)
+
+
+@tenants_router.get(
+	"/dump", response_class=StreamingResponse,
+	description="Stream a gzip compressed dump of your tenant database. Admins may dump any "
+				"tenant by name. Documents hidden from you by their ACL are left out.")
+async def dump_tenant(current_user: Annotated[User, Depends(get_current_active_user)],
+					  auth_token: Annotated[str, Depends(read_auth_cookie)],
+					  principals: Annotated[List[str] | None, Depends(get_principals)],
+					  database: Annotated[str | None, Query()] = None):
+	db = await run_in_threadpool(_connect, current_user, auth_token, database)
+	filename = f"{db.name}-{time.strftime('%Y%m%dT%H%M%S')}.ndjson.gz"
+	return StreamingResponse(
+		iterate_in_threadpool(iter_dump(db, principals)), media_type="application/gzip",
+		headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+@tenants_router.post(
+	"/restore",
+	description="Restore a dump produced by /tenants/dump into your tenant database, or, for "
+				"admins, into any tenant by name. Documents with existing keys are replaced, "
+				"except documents hidden from you by their ACL, which are skipped. Replaced "
+				"documents keep their ACL unless you are an admin.")
+async def restore_tenant(current_user: Annotated[User, Depends(get_current_active_user)],
+						 auth_token: Annotated[str, Depends(read_auth_cookie)],
+						 principals: Annotated[List[str] | None, Depends(get_principals)],
+						 request: Request, database: Annotated[str | None, Query()] = None):
+	# Restores run as long as the upload does, the deadline would cut them off.
+	lift_deadline()
+	db = await run_in_threadpool(_connect, current_user, auth_token, database, True)
+	restorer = await run_in_threadpool(TenantRestorer, db, principals)
+	try:
+		async for chunk in request.stream():
+			if chunk:
+				# Blocks while all import slots are taken, which stops reading the upload.
+				await run_in_threadpool(restorer.feed, chunk)
+		return await run_in_threadpool(restorer.finish)
+	except BaseException:
+		restorer.abort()
+		raise
+	finally:
+		schema_catalog.invalidate(db.name)
+		rollup_cache.invalidate(db.name)
+		graph_stats.invalidate(db.name)
+		principal_cache.invalidate(db.name)
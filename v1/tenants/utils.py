@@ -0,0 +1,296 @@
+"""
+Streaming dump and restore of tenant databases.
+
+A dump is a gzip compressed stream of newline delimited JSON records:
+
+- `{"type": "header", ...}` once, first,
+- `{"type": "collection", "name", "edge", "indexes"}` per collection,
+- `{"type": "graph", "name", "edge_definitions", "orphan_collections"}` per graph,
+- `{"type": "documents", "collection", "documents": [...]}` per cursor batch, interleaved
+  between collections as they are read in parallel,
+- `{"type": "end", ...}` once, last. A stream without it is truncated.
+"""
+import json
+import queue
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Tuple
+
+from arango.database import StandardDatabase
+from fastapi import HTTPException
+from starlette import status
+
+from v1.config.config import AQL_BATCH_SIZE, COMPRESSION_LEVEL, DUMP_PARALLELISM, \
+	RESTORE_MAX_RECORD, RESTORE_PARALLELISM
+from v1.shared.acl import acl_filter
+from v1.shared.encoding import BoundedInflater
+from v1.shared.initialize import ensure_search_view
+from v1.shared.shared import logger
+
+DUMP_FORMAT_VERSION = 1
+DUMP_DOCUMENTS_AQL = f"""
+FOR doc IN @@collection
+	FILTER {acl_filter("doc")}
+	RETURN UNSET(doc, "_id", "_rev")"""
+# Restores by users bound by object-level ACLs skip documents hidden from them and keep the
+# `acl` of the documents they replace, like `strip_grants` does for patches.
+RESTORE_DOCUMENTS_AQL = f"""
+LET visible = (
+	FOR doc IN @documents
+		LET current = DOCUMENT(@@collection, doc._key)
+		FILTER current == null OR {acl_filter("current")}
+		RETURN current == null ? doc :
+			MERGE(UNSET(doc, "acl"), HAS(current, "acl") ? {{acl: current.acl}} : {{}}))
+LET written = (
+	FOR doc IN visible
+		INSERT doc INTO @@collection OPTIONS {{overwriteMode: "replace", ignoreErrors: true}}
+		RETURN OLD == null)
+RETURN {{
+	created: LENGTH(written[* FILTER CURRENT]), updated: LENGTH(written[* FILTER !CURRENT]),
+	errors: LENGTH(visible) - LENGTH(written), skipped: LENGTH(@documents) - LENGTH(visible)}}"""
+
+# python-arango reports index attributes in snake_case, index creation expects the HTTP API's
+# camelCase names. Some attributes are passed through unchanged by the installed version and
+# converted by others, both spellings are accepted.
+INDEX_ATTRIBUTES = {
+	"type"          : "type", "fields": "fields", "name": "name", "unique": "unique",
+	"sparse"        : "sparse", "deduplicate": "deduplicate", "expiry_time": "expireAfter",
+	"min_length"    : "minLength", "geo_json": "geoJson", "estimates": "estimates",
+	"stored_values" : "storedValues", "storedValues": "storedValues",
+	"cache_enabled" : "cacheEnabled", "cacheEnabled": "cacheEnabled",
+	"legacy_polygons": "legacyPolygons", "legacyPolygons": "legacyPolygons",
+}
+# Decompressed bytes handed to the record parser at a time.
+INFLATE_PIECE = 1024 * 1024
+_DONE = object()
+
+
+def _line(record: Dict[str, Any]) -> bytes:
+	return json.dumps(record, separators=(",", ":")).encode() + b"\n"
+
+
+def _index_definitions(indexes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+	return [
+		{INDEX_ATTRIBUTES[key]: value for key, value in index.items() if key in INDEX_ATTRIBUTES}
+		for index in indexes if index.get("type") not in ("primary", "edge")]
+
+
+def iter_dump(db: StandardDatabase, principals: List[str] | None = None) -> Iterator[bytes]:
+	"""
+	Produce the compressed dump of a database chunk by chunk. Collections are read by
+	`DUMP_PARALLELISM` worker threads through streaming cursors; a bounded queue between the
+	workers and the compressor applies backpressure, so memory stays constant regardless of the
+	database size. Closing the iterator stops the workers.
+
+	:param db: Connection to the database to dump.
+	:type db: StandardDatabase
+	:param principals: Grants of the caller, documents hidden from them are left out of the
+		dump. None dumps every document.
+	:return: Iterator of gzip compressed chunks.
+	:rtype: Iterator[bytes]
+	"""
+	compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+	collections = [collection for collection in db.collections() if not collection["system"]]
+
+	yield compressor.compress(_line({
+		"type"    : "header", "version": DUMP_FORMAT_VERSION, "database": db.name,
+		"created" : time.time()
+	}))
+	for collection in collections:
+		yield compressor.compress(_line({
+			"type"   : "collection", "name": collection["name"],
+			"edge"   : collection["type"] == "edge",
+			"indexes": _index_definitions(db.collection(collection["name"]).indexes())
+		}))
+	for graph in db.graphs():
+		properties = db.graph(graph["name"]).properties()
+		yield compressor.compress(_line({
+			"type"              : "graph", "name": graph["name"],
+			"edge_definitions"  : properties.get("edge_definitions", []),
+			"orphan_collections": properties.get("orphan_collections", [])
+		}))
+
+	batches: queue.Queue = queue.Queue(maxsize=DUMP_PARALLELISM * 2)
+	cancelled = threading.Event()
+
+	def put(item: Any) -> bool:
+		while not cancelled.is_set():
+			try:
+				batches.put(item, timeout=0.5)
+				return True
+			except queue.Full:
+				continue
+		return False
+
+	def read_collection(name: str) -> None:
+		try:
+			cursor = db.aql.execute(
+				DUMP_DOCUMENTS_AQL, bind_vars={"@collection": name, "principals": principals},
+				stream=True, batch_size=AQL_BATCH_SIZE)
+			while not cancelled.is_set():
+				documents = list(cursor.batch())
+				if documents and not put(_line(
+						{"type": "documents", "collection": name, "documents": documents})):
+					break
+				cursor.batch().clear()
+				if not cursor.has_more():
+					break
+				cursor.fetch()
+			put(_DONE)
+		except Exception as error:
+			put(error)
+
+	executor = ThreadPoolExecutor(max_workers=DUMP_PARALLELISM, thread_name_prefix="dump")
+	try:
+		for collection in collections:
+			executor.submit(read_collection, collection["name"])
+		remaining = len(collections)
+		while remaining:
+			item = batches.get()
+			if item is _DONE:
+				remaining -= 1
+				continue
+			if isinstance(item, Exception):
+				raise item
+			chunk = compressor.compress(item)
+			if chunk:
+				yield chunk
+		yield compressor.compress(_line({"type": "end", "collections": len(collections)}))
+		yield compressor.flush()
+		logger.info(f"Dumped {len(collections)} collections of database {db.name}")
+	finally:
+		cancelled.set()
+		executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _counts() -> Dict[str, int]:
+	return {"created": 0, "updated": 0, "errors": 0, "skipped": 0}
+
+
+class TenantRestorer:
+	"""
+	Incremental restore of a dump into a database. Feed the compressed dump chunk by chunk;
+	document batches are imported by `RESTORE_PARALLELISM` worker threads while the stream is
+	still being received. Indexes and graphs are created after all data is loaded.
+	"""
+
+	def __init__(self, db: StandardDatabase, principals: List[str] | None = None):
+		"""
+		:param principals: Principals of the user restoring, documents hidden from them are
+			skipped and the `acl` of replaced documents is kept. None restores every document
+			as dumped.
+		"""
+		self.db = db
+		self.principals = principals
+		self._inflater = BoundedInflater("gzip")
+		self._buffer = b""
+		self._executor = ThreadPoolExecutor(
+			max_workers=RESTORE_PARALLELISM, thread_name_prefix="restore")
+		self._slots = threading.BoundedSemaphore(RESTORE_PARALLELISM * 2)
+		self._futures: List[Tuple[str, Future]] = []
+		self._existing = {collection["name"] for collection in db.collections()}
+		self._indexes: Dict[str, List[Dict[str, Any]]] = {}
+		self._graphs: List[Dict[str, Any]] = []
+		self._complete = False
+		self.summary: Dict[str, Dict[str, int]] = {}
+
+	def feed(self, chunk: bytes) -> None:
+		"""
+		Inflate and parse one chunk of the dump, `INFLATE_PIECE` bytes at a time, so a highly
+		compressed chunk never inflates into memory at once.
+		"""
+		try:
+			self._consume(self._inflater.inflate(chunk, INFLATE_PIECE))
+			while self._inflater.pending:
+				self._consume(self._inflater.inflate(b"", INFLATE_PIECE))
+		except zlib.error as error:
+			raise HTTPException(
+				status_code=status.HTTP_400_BAD_REQUEST, detail="Dump is not gzip compressed") \
+				from error
+
+	def _consume(self, data: bytes) -> None:
+		*lines, self._buffer = (self._buffer + data).split(b"\n")
+		if len(self._buffer) > RESTORE_MAX_RECORD:
+			raise HTTPException(
+				status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+				detail=f"Dump record exceeds {RESTORE_MAX_RECORD} bytes")
+		for line in lines:
+			if not line:
+				continue
+			try:
+				record = json.loads(line)
+			except ValueError as error:
+				raise HTTPException(
+					status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed dump record") \
+					from error
+			self._handle(record)
+
+	def _handle(self, record: Dict[str, Any]) -> None:
+		record_type = record.get("type")
+		if record_type == "header":
+			if record.get("version") != DUMP_FORMAT_VERSION:
+				raise HTTPException(
+					status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+					detail=f"Unsupported dump version {record.get('version')}")
+		elif record_type == "collection":
+			name = record["name"]
+			if name not in self._existing:
+				self.db.create_collection(name, edge=record.get("edge", False))
+				self._existing.add(name)
+			self._indexes[name] = record.get("indexes", [])
+			self.summary.setdefault(name, _counts())
+		elif record_type == "graph":
+			self._graphs.append(record)
+		elif record_type == "documents":
+			self._slots.acquire()
+			future = self._executor.submit(
+				self._import, record["collection"], record["documents"])
+			future.add_done_callback(lambda _: self._slots.release())
+			self._futures.append((record["collection"], future))
+		elif record_type == "end":
+			self._complete = True
+
+	def _import(self, collection: str, documents: List[Dict[str, Any]]) -> Dict[str, int]:
+		if self.principals is None:
+			return self.db.collection(collection).import_bulk(
+				documents, on_duplicate="replace", halt_on_error=False)
+		return next(self.db.aql.execute(RESTORE_DOCUMENTS_AQL, bind_vars={
+			"@collection": collection, "documents": documents, "principals": self.principals}))
+
+	def abort(self) -> None:
+		self._executor.shutdown(wait=False, cancel_futures=True)
+
+	def finish(self) -> Dict[str, Any]:
+		"""
+		Wait for outstanding imports, then create indexes, graphs and the search view.
+
+		:return: Per collection counts of created, updated, failed and skipped documents.
+		"""
+		self._consume(self._inflater.flush())
+		try:
+			for collection, future in self._futures:
+				result = future.result()
+				counts = self.summary.setdefault(collection, _counts())
+				for name in counts:
+					counts[name] += result.get(name, 0)
+		finally:
+			self._executor.shutdown(wait=True)
+		# Every record ends with a newline, a remainder is a record cut off mid-way.
+		if not self._complete or self._buffer.strip():
+			raise HTTPException(
+				status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+				detail="Dump is truncated, data was imported partially")
+		for name, indexes in self._indexes.items():
+			collection = self.db.collection(name)
+			for index in indexes:
+				collection.add_index(index)
+		for graph in self._graphs:
+			if not self.db.has_graph(graph["name"]):
+				self.db.create_graph(
+					graph["name"], edge_definitions=graph["edge_definitions"],
+					orphan_collections=graph["orphan_collections"])
+		ensure_search_view(self.db)
+		logger.info(f"Restored {len(self.summary)} collections into database {self.db.name}")
+		return {"database": self.db.name, "collections": self.summary}